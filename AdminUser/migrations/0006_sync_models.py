@@ -0,0 +1,40 @@
+# Generated by Django 2.2.28 on 2026-10-19 20:22
+
+from django.db import migrations, models
+import django.utils.timezone
+import timezone_field.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('AdminUser', '0005_auto_20210506_1856'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='adminprofile',
+            name='active',
+        ),
+        migrations.RemoveField(
+            model_name='adminprofile',
+            name='image',
+        ),
+        migrations.AddField(
+            model_name='adminprofile',
+            name='joined',
+            field=models.DateField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='adminprofile',
+            name='timezone',
+            field=timezone_field.fields.TimeZoneField(default='Asia/Kolkata'),
+            preserve_default=False,
+        ),
+        migrations.AlterField(
+            model_name='adminprofile',
+            name='name',
+            field=models.CharField(max_length=100),
+        ),
+    ]
@@ -3,6 +3,7 @@ from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 
 from base.models import Batch,Slot
+from base.authentication import profile_cache
 from StudentUser.models import StudentProfile
 from FacultyUser.models import FacultyProfile
 
@@ -44,6 +45,8 @@ class BatchToggleMixin:
                 {'status': 1, 'data': f'All Batches are already {keyword}!'}, status=status.HTTP_200_OK)
 
         allBatches.update(active=action)
+        #Cached student profiles carry their batch.
+        profile_cache.invalidate(('admin', request.profile.id))
 
         return Response({'status': 1, 'data': f'{found} batches {keyword}!'}, status=status.HTTP_200_OK)
 
@@ -1,11 +1,13 @@
 import uuid
 
 from django.db import models
+from django.db.models.signals import post_save,post_delete
 from django.contrib.auth import get_user_model
 
 from timezone_field import TimeZoneField
 
 from trackr import settings
+from base import authentication
 
 
 class AdminProfile(models.Model):
@@ -26,7 +28,9 @@ class AdminProfile(models.Model):
                         user_type=CustomUser.ADMIN)
 
         adminProfile = cls.objects.create(name=name,user=user,timezone=timezone)
-        Activity.objects.create(user=user,text='You Signed up with an ADMIN Account.')
+        Activity.log(user=user,text='You Signed up with an ADMIN Account.')
         return adminProfile
 
 
+post_save.connect(authentication.invalidate_admin,sender=AdminProfile)
+post_delete.connect(authentication.invalidate_admin,sender=AdminProfile)
@@ -12,9 +12,9 @@ from FacultyUser.models import FacultyProfile
 from StudentUser.models import StudentProfile
 from .models import AdminProfile
 from base.utils import (PasswordMinLengthValidator, unique_email_validator,
-                        get_image,get_weekday)
+                        get_avatar,get_weekday)
 from base.serializers import AdminSlotDisplaySerializer
-from base import response
+from base import metrics, response
 
 
 
@@ -57,7 +57,7 @@ class FacultySerializer(serializers.ModelSerializer):
 
     def get_image(self, instance):      
         request = self.context.get('request')
-        return instance.get_profile_image(request,thumbnail=True)
+        return instance.get_profile_image(request,avatar_size=64)
 
     def create(self,validated_data):
         email = validated_data.pop('email',None)
@@ -123,17 +123,27 @@ class FacultyDetailSerializer(serializers.ModelSerializer):
 
     def get_image(self, instance):      
         request = self.context.get('request')
-        return instance.get_profile_image(request,thumbnail=True)
+        return instance.get_profile_image(request,avatar_size=128)
 
     def get_joined(self,instance):
         return instance.joined and instance.joined.strftime('%d %b %Y')
 
     def get_assignedClasses(self,instance):
-        allTaughtSlots = instance.teaches_in.order_by('weekday','start_time')   
+        #Prefetched (with their batches) by FacultyView.
+        if hasattr(instance,'ordered_slots'):
+            allTaughtSlots = instance.ordered_slots
+        else:
+            allTaughtSlots = instance.teaches_in.select_related('batch').order_by('weekday','start_time')
         return FacultySlotSerializer(allTaughtSlots,many=True).data
 
     def get_assignedBatches(self,instance):
-        allTaughtBatches = instance.assignedBatches()
+        if hasattr(instance,'ordered_slots'):
+            taughtBatches = {}
+            for slot in instance.ordered_slots:
+                taughtBatches.setdefault(slot.batch_id,slot.batch)
+            allTaughtBatches = [taughtBatches[batchId] for batchId in sorted(taughtBatches)]
+        else:
+            allTaughtBatches = instance.assignedBatches()
         return FacultyBatchSerializer(allTaughtBatches,many=True).data    
 
 
@@ -300,7 +310,7 @@ class BatchDetailSerializer(serializers.ModelSerializer):
         return instance.getAssignedFaculties().count()
 
     def get_weekdayData(self,instance):
-        all_slots = instance.connected_slots.select_related('faculty')\
+        all_slots = instance.connected_slots.select_related('faculty__user')\
             .order_by('weekday','start_time')
         
         return all_slots.serialize_and_group_by_weekday(serializer = AdminSlotDisplaySerializer,
@@ -323,7 +333,7 @@ class BatchFacultySerializer(serializers.ModelSerializer):
 
     def get_image(self,instance):
         request = self.context.get('request')
-        return get_image(request,instance.user.thumbnail)
+        return instance.get_profile_image(request,avatar_size=32)
 
 
 class BatchListDetailSerializer(serializers.ModelSerializer):
@@ -346,14 +356,14 @@ class BatchListDetailSerializer(serializers.ModelSerializer):
     assignedFaculties = serializers.SerializerMethodField()
 
     def get_totalFaculties(self, instance):
-        return instance.getAssignedFaculties().count()
+        return len(instance.get_assigned_faculties_list())
 
     def get_created(self,instance):
         return instance.created.strftime('%d %b %Y')
 
     def get_assignedFaculties(self,instance):
-        queryset = instance.getAssignedFaculties()
-        return BatchFacultySerializer(queryset,context=self.context,many=True).data
+        faculties = instance.get_assigned_faculties_list()
+        return BatchFacultySerializer(faculties,context=self.context,many=True).data
 
 
 class BatchSlotSerializer(serializers.ModelSerializer):
@@ -382,7 +392,7 @@ class BatchStudentSerializer(serializers.ModelSerializer):
 
     def get_image(self,instance):
         request = self.context.get('request')
-        return get_image(request,instance.user.thumbnail)
+        return get_avatar(request,instance.user,32)
 
 
 class BatchDeletePreviewSerializer(serializers.ModelSerializer):
@@ -414,11 +424,56 @@ class StudentDetailSerializer(serializers.ModelSerializer):
 
     def get_image(self, instance):
         request = self.context.get('request')
-        return get_image(request,instance.user.thumbnail)
+        return get_avatar(request,instance.user,64)
 
     def get_joined(self,instance):
         return instance.joined.strftime('%d %b %Y')
 
+""" Search Serializers """
+
+class SearchFacultySerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = FacultyProfile
+        fields = ['id','name','email','status','image']
+
+    id = serializers.CharField(source='uuid')
+    email = serializers.CharField(source='user.email',default=None)
+    image = serializers.SerializerMethodField()
+
+    def get_image(self, instance):
+        request = self.context.get('request')
+        return instance.get_profile_image(request,avatar_size=32)
+
+
+class SearchStudentSerializer(StudentDetailSerializer):
+
+    class Meta(StudentDetailSerializer.Meta):
+        fields = StudentDetailSerializer.Meta.fields + ['batch','batchId']
+
+    batch = serializers.CharField(source='batch.title')
+    batchId = serializers.CharField(source='batch.uuid')
+
+
+class SearchBatchSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = Batch
+        fields = ['id','title','isActive','totalStudents']
+
+    id = serializers.CharField(source='uuid')
+    isActive = serializers.BooleanField(source='active')
+    totalStudents = serializers.IntegerField(source='total_students')
+
+
+class SearchSlotSerializer(BatchSlotSerializer):
+
+    class Meta(BatchSlotSerializer.Meta):
+        fields = ['id'] + BatchSlotSerializer.Meta.fields + ['batch']
+
+    id = serializers.CharField(source='uuid')
+    batch = serializers.CharField(source='batch.title')
+
 """ Broadcast Serializers """
 
 class BroadcastTargetSerializer(serializers.ModelSerializer):
@@ -431,9 +486,9 @@ class BroadcastTargetSerializer(serializers.ModelSerializer):
     value = serializers.CharField(source='uuid')
 
     def get_label(self, instance):
-        totalStudents = instance.students_count
-        totalFaculties = instance.getAssignedFaculties()\
-                            .filter(status=FacultyProfile.VERIFIED).count()
+        #Annotated by Batch.objects.with_broadcast_counts()
+        totalStudents = instance.student_count
+        totalFaculties = instance.faculties_count
         return f'{instance.title} , {totalStudents} students , {totalFaculties} faculties'
 
 
@@ -454,8 +509,8 @@ class BroadcastSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         text, sender, receivers = itemgetter('text', 'sender', 'receivers')(validated_data)
         broadcast = Broadcast.objects.create(sender=sender,text=text)
-        print("\n",receivers,"\n")
         broadcast.receivers.add(*receivers)       
+        metrics.BROADCAST_RECEIVERS.observe(len(receivers), sender='admin')
         return broadcast
 
     #TODO:Common : Move to model
@@ -486,9 +541,9 @@ class BroadcastSerializer(serializers.ModelSerializer):
                 status=FacultyProfile.VERIFIED)
 
             if self.filter_by_batch:
-                allFaculties = allFaculties.filter(slots__batch=batch).distinct()
+                allFaculties = allFaculties.filter(assignments__batch=batch)
 
-            allFaculties = [faculty.user.id for faculty in allFaculties]
+            allFaculties = list(allFaculties.values_list('user', flat=True))
             receivers.extend(allFaculties)
 
         #Add all the relevant students receivers
@@ -497,8 +552,8 @@ class BroadcastSerializer(serializers.ModelSerializer):
                 allStudents = list(batch.student_profiles.values_list('user', flat=True))
             else:               
                 allBatches = user.batch_set.values_list('id')
-                allStudents = [student.user.id 
-                for student in StudentProfile.objects.filter(batch__in=allBatches)]
+                allStudents = list(StudentProfile.objects.filter(batch__in=allBatches)
+                                   .values_list('user', flat=True))
                 
             receivers.extend(allStudents)
 
@@ -1,7 +1,9 @@
 from datetime import time
 from json import loads
 
+from django.db import connection
 from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from rest_framework.test import APIRequestFactory,force_authenticate,APIClient
@@ -10,7 +12,8 @@ from rest_framework.authtoken.models import Token
 from . import views as AdminView
 from .models import AdminProfile
 from FacultyUser.models import FacultyProfile
-from base.models import Batch,Slot
+from StudentUser.models import StudentProfile
+from base.models import Batch,CustomUser,Slot
 from base import response as ApiResponse
 
 
@@ -305,3 +308,179 @@ class AdminSlotHandling(TransactionTestCase):
         self.assertEqual(Slot.objects.all().count(),3)
 
         
+
+
+
+class AdminListQueries(TransactionTestCase):
+    """
+    List endpoints should take the same number of queries regardless of the page size.
+    """
+
+    def setUp(self):
+        self.admin = AdminProfile.create_profile(name='admin',email='admin@test.com',
+                                                 password='password',timezone='Asia/Kolkata')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin.user)
+        self.batchCount = 0
+
+    def add_batch(self,faculties,students):
+        self.batchCount += 1
+        batch = Batch.objects.create(title=f'batch{self.batchCount}',admin=self.admin)
+        for index in range(faculties):
+            user = CustomUser.objects.create_user(f'faculty{self.batchCount}_{index}@test.com','password',
+                                                  user_type=CustomUser.FACULTY)
+            faculty = FacultyProfile.objects.create(name=f'faculty{self.batchCount}_{index}',
+                                                    admin=self.admin,user=user)
+            #Two slots per faculty, the faculty should still be listed once.
+            for weekday in range(2):
+                Slot.create_slot(batch=batch,faculty=faculty,title=f'slot{weekday}',weekday=weekday,
+                                 start_time=time(hour=8+index),end_time=time(hour=9+index))
+        for index in range(students):
+            user = CustomUser.objects.create_user(f'student{self.batchCount}_{index}@test.com','password',
+                                                  user_type=CustomUser.STUDENT)
+            StudentProfile.objects.create(user=user,name=f'student{index}',batch=batch)
+
+    def get_list(self,url,**params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url,params)
+        self.assertEqual(response.status_code,200)
+        return response.data,len(queries)
+
+    def test_batch_list(self):
+        url = reverse('admin-batch-detailed-list')
+        self.add_batch(faculties=1,students=1)
+        _,expected = self.get_list(url)
+
+        self.add_batch(faculties=3,students=4)
+        self.add_batch(faculties=2,students=0)
+        data,total = self.get_list(url)
+        self.assertEqual(total,expected)
+
+        batches = {batch['title']:batch for batch in data['results']}
+        self.assertEqual(batches['batch2']['totalStudents'],4)
+        self.assertEqual(batches['batch2']['totalClasses'],6)
+        self.assertEqual(batches['batch2']['totalFaculties'],3)
+        self.assertEqual([faculty['name'] for faculty in batches['batch2']['assignedFaculties']],
+                         ['faculty2_0','faculty2_1','faculty2_2'])
+        self.assertEqual(batches['batch3']['totalStudents'],0)
+
+    def test_faculty_detail_list(self):
+        url = reverse('admin-faculty')
+        self.add_batch(faculties=1,students=2)
+        _,expected = self.get_list(url,detail='true')
+
+        self.add_batch(faculties=4,students=3)
+        #Same faculty teaching in a second batch.
+        otherBatch = Batch.objects.create(title='other',admin=self.admin)
+        faculty = FacultyProfile.objects.get(name='faculty2_0')
+        Slot.create_slot(batch=otherBatch,faculty=faculty,title='other',weekday=0,
+                         start_time=time(hour=6),end_time=time(hour=7))
+        data,total = self.get_list(url,detail='true')
+        self.assertEqual(total,expected)
+
+        faculties = {faculty['name']:faculty for faculty in data['results']}
+        self.assertEqual(len(faculties),5)
+        classes = faculties['faculty2_0']['assignedClasses']
+        self.assertEqual([(slot['weekday'],slot['batch']) for slot in classes],
+                         [('Monday','other'),('Monday','batch2'),('Tuesday','batch2')])
+        self.assertEqual(faculties['faculty2_0']['assignedBatches'],
+                         [{'title':'batch2','totalStudents':3},{'title':'other','totalStudents':0}])
+
+    def test_broadcast_targets(self):
+        url = reverse('admin-broadcast-target')
+        self.add_batch(faculties=1,students=1)
+        _,expected = self.get_list(url)
+
+        self.add_batch(faculties=2,students=3)
+        #Faculties that haven't joined yet can't receive broadcasts.
+        invited = FacultyProfile.objects.create(name='invited',admin=self.admin)
+        Slot.create_slot(batch=Batch.objects.get(title='batch2'),faculty=invited,title='invited',
+                         weekday=3,start_time=time(hour=8),end_time=time(hour=9))
+        data,total = self.get_list(url)
+        self.assertEqual(total,expected)
+
+        labels = [target['label'] for target in data['data']]
+        self.assertEqual(labels,['Everyone , 4 students, 3 faculties','All Faculties (3)','All Students (4)',
+                                 'batch2 , 3 students , 2 faculties','batch1 , 1 students , 1 faculties'])
+
+
+class AdminSearch(TransactionTestCase):
+
+    def setUp(self):
+        self.admin = AdminProfile.create_profile(name='admin',email='admin@test.com',
+                                                 password='password',timezone='Asia/Kolkata')
+        other = AdminProfile.create_profile(name='other',email='other@test.com',
+                                            password='password',timezone='Asia/Kolkata')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin.user)
+
+        self.batch = Batch.objects.create(title='Physics Morning',admin=self.admin)
+        Batch.objects.create(title='Chemistry Evening',admin=self.admin)
+        Batch.objects.create(title='Physics Evening',admin=other)
+
+        for name,email in (('John Smith','jsmith@test.com'),('Jane Doe','john.doe@test.com'),
+                           ('Mark Johnson','mark@test.com')):
+            user = CustomUser.objects.create_user(email,'password',user_type=CustomUser.STUDENT)
+            StudentProfile.objects.create(user=user,name=name,batch=self.batch)
+        FacultyProfile.objects.create(name='John Other',admin=other)
+        FacultyProfile.objects.create(name='Johnny Walker',admin=self.admin)
+
+    def search(self,url,query):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url,{'q':query})
+        self.assertEqual(response.status_code,200)
+        self.assertTrue(any('search_' in query['sql'] for query in queries))
+        return [item.get('name',item.get('title')) for item in response.data['results']]
+
+    def test_ranked_student_search(self):
+        url = reverse('admin-list-students',args=[self.batch.uuid])
+        #Name matches outrank email matches, 'ohnso' only matches via trigrams.
+        self.assertEqual(self.search(url,'john'),['John Smith','Mark Johnson','Jane Doe'])
+        self.assertEqual(self.search(url,'jo sm'),['John Smith'])
+        self.assertEqual(self.search(url,'ohnso'),['Mark Johnson'])
+        self.assertEqual(self.search(url,'zzz'),[])
+
+    def test_index_follows_changes(self):
+        url = reverse('admin-list-students',args=[self.batch.uuid])
+        student = StudentProfile.objects.get(name='John Smith')
+        student.name = 'Albert Smith'
+        student.save()
+        self.assertEqual(self.search(url,'albert'),['Albert Smith'])
+
+        student.user.email = 'albert@test.com'
+        student.user.save()
+        self.assertEqual(self.search(url,'albert@test'),['Albert Smith'])
+
+        student.user.delete()
+        self.assertEqual(self.search(url,'albert'),[])
+
+    def test_scoped_to_admin(self):
+        self.assertEqual(self.search(reverse('admin-batch-detailed-list'),'phys'),['Physics Morning'])
+        self.assertEqual(self.search(reverse('admin-faculty'),'john'),['Johnny Walker'])
+
+    def test_unified_search(self):
+        faculty = FacultyProfile.objects.get(name='Johnny Walker')
+        Slot.create_slot(batch=self.batch,faculty=faculty,title='Johnson Lab',weekday=0,
+                         start_time=time(hour=8),end_time=time(hour=9))
+        url = reverse('admin-search')
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url,{'q':'john'})
+        #One query per result type (plus auth), regardless of the number of batches.
+        self.assertLessEqual(len(queries),6)
+        results = [(item['type'],item.get('name',item.get('title'))) for item in response.data['data']]
+        self.assertEqual(set(results),{('student','John Smith'),('student','Mark Johnson'),('student','Jane Doe'),
+                                       ('faculty','Johnny Walker'),('slot','Johnson Lab')})
+        #Email only match ranks last.
+        self.assertEqual(results[-1],('student','Jane Doe'))
+        student = next(item for item in response.data['data'] if item.get('name') == 'John Smith')
+        self.assertEqual(student['batch'],'Physics Morning')
+        #Students don't crowd out the other types, whatever their bm25 ranks.
+        response = self.client.get(url,{'q':'john','limit':3})
+        self.assertEqual([item['type'] for item in response.data['data']],['faculty','student','slot'])
+
+        response = self.client.get(url,{'q':'evening','limit':5})
+        self.assertEqual(response.data['data'],[{'type':'batch','id':str(Batch.objects.get(title='Chemistry Evening').uuid),
+                                                 'title':'Chemistry Evening','isActive':True,'totalStudents':0}])
+
+        self.assertEqual(self.client.get(url,{'q':' '}).status_code,400)
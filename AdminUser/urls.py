@@ -39,6 +39,9 @@ urlpatterns = [
                                             view.StudentMoveView.as_view(),name='admin-move-students'),    
     path('delete-students/<uuid:batch_id>/',view.StudentDeleteView.as_view(),name='admin-delete-students'),
 
+    ### Searches faculties, students, batches & slots of the admin at once
+    path('search/', view.SearchView.as_view(), name='admin-search'),
+
     ### Broadcast Messages to Student/Faculty
     path('broadcast-target/', view.BroadcastTargetView.as_view(),
          name="admin-broadcast-target"),
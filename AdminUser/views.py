@@ -1,4 +1,4 @@
-from django.db.models import Count
+from django.db.models import Count,Prefetch,prefetch_related_objects
 
 from rest_framework.views import APIView
 from rest_framework.generics import (CreateAPIView,ListAPIView, ListCreateAPIView,
@@ -9,11 +9,14 @@ from rest_framework import status
 from rest_framework.exceptions import ValidationError
 
 from . import serializers as ser
-from base.models import Activity
+from base.models import Activity,Batch,Slot
 from .models import AdminProfile
 from FacultyUser.models import FacultyProfile
+from StudentUser.models import StudentProfile
 from base.permissions import IsAuthenticatedWithProfile
 from base.pagination import EnhancedPagination
+from base.authentication import profile_cache
+from base import search
 from .mixins import (BatchToggleMixin, GetStudentMixin, GetFacultyMixin, 
                         GetBatchMixin,GetSlotMixin)
 from FacultyUser.exception import Error as FacultyError
@@ -23,6 +26,7 @@ from FacultyUser.exception import Error as FacultyError
 #TODO: Figure out how to verify email!
 class SignupView(CreateAPIView):
     permission_classes = [AllowAny]
+    max_queries = 7
     serializer_class = ser.AdminSignupSerializer
 
 """ Faculty Views """
@@ -36,17 +40,23 @@ class FacultyView(ListCreateAPIView):
     serializer_class = ser.FacultySerializer
     permission_classes = [IsAuthenticatedWithProfile]
     required_profile = AdminProfile
+    max_queries = {'GET':5,'POST':11}
     pagination_class = EnhancedPagination
 
     def get_queryset(self):
-        connected_faculties = self.request.profile.connected_faculties.prefetch_related('teaches_in')\
+        connected_faculties = self.request.profile.connected_faculties\
             .select_related('user').order_by('-added')
 
+        if self.show_detail():
+            #Ordered slots with their batch, used by FacultyDetailSerializer.
+            taughtSlots = Slot.objects.select_related('batch').order_by('weekday','start_time')
+            connected_faculties = connected_faculties.prefetch_related(
+                Prefetch('teaches_in',queryset=taughtSlots,to_attr='ordered_slots'))
+
         query = self.request.query_params.get('q')
 
         if query:
-            connected_faculties = connected_faculties.filter(
-                name__icontains=query)
+            connected_faculties = search.search(connected_faculties,query)
         
         return connected_faculties
 
@@ -54,12 +64,14 @@ class FacultyView(ListCreateAPIView):
         if self.request.method == 'POST':
             return ser.FacultySerializer
 
-        showDetail = self.request.query_params.get('detail', '').lower() == 'true'
-        if showDetail:
+        if self.show_detail():
             return ser.FacultyDetailSerializer
         else:
             return ser.FacultySerializer
 
+    def show_detail(self):
+        return self.request.query_params.get('detail', '').lower() == 'true'
+
     def perform_create(self, serializer):
         serializer.save(admin=self.request.profile)
 
@@ -70,6 +82,7 @@ class FacultyStatsView(APIView):
     """
     permission_classes = [IsAuthenticatedWithProfile]
     required_profile = AdminProfile
+    max_queries = 3
 
     def get(self,request):
         statusChoices = [choice for choice,_ in FacultyProfile.status_choices]
@@ -98,6 +111,7 @@ class FacultyDeleteView(GetFacultyMixin, APIView):
     """
     permission_classes = [IsAuthenticatedWithProfile]
     required_profile = AdminProfile
+    max_queries = 24
 
     def delete(self,request,faculty_id):
         faculty =self.get_faculty(faculty_id)
@@ -111,6 +125,7 @@ class FacultyInviteView(GetFacultyMixin, APIView):
     """
     permission_classes = [IsAuthenticatedWithProfile]
     required_profile = AdminProfile
+    max_queries = 20
     serializer_class = ser.EmailSerializer
 
     def put(self,request,faculty_id):
@@ -133,7 +148,7 @@ class FacultyInviteView(GetFacultyMixin, APIView):
             msg = 'Email Successfully Added & Invite sent!'
             activity=f"You invited {email} to claim the '{faculty.name}' FACULTY Account"
 
-        Activity.objects.create(user=request.user,text=activity)
+        Activity.log(user=request.user,text=activity)
         return Response({'status': 1, 'data':msg}, status=status.HTTP_200_OK)
         
 
@@ -144,6 +159,7 @@ class FacultyReInviteView(GetFacultyMixin, APIView):
     """
     permission_classes = [IsAuthenticatedWithProfile]
     required_profile = AdminProfile
+    max_queries = 10
 
     def put(self,request,faculty_id):
         faculty = self.get_faculty(faculty_id)
@@ -162,12 +178,14 @@ class FacultyReInviteView(GetFacultyMixin, APIView):
 class SlotView(CreateAPIView):
     permission_classes = [IsAuthenticatedWithProfile]
     required_profile = AdminProfile
+    max_queries = 16
     serializer_class = ser.SlotCreateUpdateSerializer
 
 
 class SlotRUDView(GetSlotMixin,RetrieveUpdateDestroyAPIView):
     permission_classes = [IsAuthenticatedWithProfile]
     required_profile = AdminProfile
+    max_queries = {'GET':5,'PUT':15,'DELETE':9}
     lookup_field = 'uuid'
     lookup_url_kwarg = 'slot_id'
 
@@ -191,6 +209,7 @@ class SlotRUDView(GetSlotMixin,RetrieveUpdateDestroyAPIView):
 class BatchListCreateView(ListCreateAPIView):
     permission_classes = [IsAuthenticatedWithProfile]
     required_profile = AdminProfile
+    max_queries = {'GET':3,'POST':11}
     pagination_class = None
     serializer_class = ser.BatchSerializer
 
@@ -202,7 +221,7 @@ class BatchListCreateView(ListCreateAPIView):
         return Response({'status':1,'data':response.data},status=status.HTTP_200_OK)
 
     def perform_create(self, serializer):
-        Activity.objects.create(user=self.request.user,
+        Activity.log(user=self.request.user,
         text=f"You created '{serializer.validated_data['title']}' batch")
 
         return serializer.save(admin=self.request.profile)
@@ -211,15 +230,16 @@ class BatchListCreateView(ListCreateAPIView):
 class BatchDetailedListView(ListAPIView):
     permission_classes = [IsAuthenticatedWithProfile]
     required_profile = AdminProfile
+    max_queries = 6
     serializer_class = ser.BatchListDetailSerializer
     pagination_class = EnhancedPagination
 
     def get_queryset(self):
-        all_batches = self.request.profile.batch_set.order_by('-created')
-        search = self.request.query_params.get('q')
+        all_batches = self.request.profile.batch_set.with_list_details().order_by('-created')
+        query = self.request.query_params.get('q')
 
-        if search:
-            all_batches = all_batches.filter(title__icontains=search)
+        if query:
+            all_batches = search.search(all_batches,query)
         return all_batches
 
 
@@ -227,6 +247,7 @@ class BatchDetailUpdateView(GetBatchMixin,RetrieveUpdateAPIView):
     """ Shows all the slots in the retrieve view """
     permission_classes = [IsAuthenticatedWithProfile]
     required_profile = AdminProfile
+    max_queries = {'GET':5,'PUT':10}
     lookup_field = 'uuid'
     lookup_url_kwarg = 'batch_id'
 
@@ -246,9 +267,14 @@ class BatchDeleteView(GetBatchMixin, APIView):
     """
     permission_classes = [IsAuthenticatedWithProfile]
     required_profile = AdminProfile
+    max_queries = {'GET':5,'DELETE':24}
 
     def get(self,request,batch_id):
         batch = self.get_batch(batch_id)
+        #Faculty of every slot & user (for the avatar) of every student are shown.
+        prefetch_related_objects([batch],
+                                 Prefetch('connected_slots',queryset=Slot.objects.select_related('faculty')),
+                                 Prefetch('student_profiles',queryset=StudentProfile.objects.select_related('user')))
         data = ser.BatchDeletePreviewSerializer(batch).data
         return Response({'status': 1, 'data': data}, status=status.HTTP_200_OK)
 
@@ -261,6 +287,7 @@ class BatchDeleteView(GetBatchMixin, APIView):
 class BatchToggleView(GetBatchMixin, APIView):
     permission_classes = [IsAuthenticatedWithProfile]
     required_profile = AdminProfile
+    max_queries = 9
 
     def put(self,request,batch_id):      
         batch = self.get_batch(batch_id)           
@@ -272,12 +299,14 @@ class BatchToggleView(GetBatchMixin, APIView):
 class BatchPauseAllView(BatchToggleMixin,APIView):
     permission_classes = [IsAuthenticatedWithProfile]
     required_profile = AdminProfile
+    max_queries = 4
     action = False
 
 
 class BatchResumeAllView(BatchToggleMixin,APIView):
     permission_classes = [IsAuthenticatedWithProfile]
     required_profile = AdminProfile
+    max_queries = 4
     action = True
 
 """ Student Views """
@@ -285,6 +314,7 @@ class BatchResumeAllView(BatchToggleMixin,APIView):
 class StudentListView(GetBatchMixin, ListAPIView):
     permission_classes = [IsAuthenticatedWithProfile]
     required_profile = AdminProfile
+    max_queries = 6
     serializer_class = ser.StudentDetailSerializer
     pagination_class = EnhancedPagination
 
@@ -295,7 +325,7 @@ class StudentListView(GetBatchMixin, ListAPIView):
 
         query = self.request.query_params.get('q')
         if query:
-            allStudents = allStudents.filter(name__icontains=query)
+            allStudents = search.search(allStudents,query)
 
         return allStudents
 
@@ -303,6 +333,7 @@ class StudentListView(GetBatchMixin, ListAPIView):
 class StudentMoveView(GetStudentMixin,GetBatchMixin,APIView):   
     permission_classes = [IsAuthenticatedWithProfile]
     required_profile = AdminProfile
+    max_queries = 10
 
     def put(self,request,source_batch_id,destination_batch_id):
         data = ser.StudentIdSerializer(data=request.data)
@@ -316,13 +347,17 @@ class StudentMoveView(GetStudentMixin,GetBatchMixin,APIView):
         totalStudents = allStudents.count()
         #For all the affected student accounts
         Activity.bulk_create_from_queryset(queryset=allStudents,
-        text=f'You have been moved from {sourceBatch.title} to {destinationBatch.title} by Admin')
+        text=f'You have been moved from {sourceBatch.title} to {destinationBatch.title} by Admin',
+        background=True)
 
-        allStudents.update(batch=destinationBatch)
+        movedStudents = allStudents.update(batch=destinationBatch)
+        Batch.adjust_counters(sourceBatch.id,students=-movedStudents)
+        Batch.adjust_counters(destinationBatch.id,students=movedStudents)
+        profile_cache.invalidate(('batch', sourceBatch.id))
 
         #For the current Admin account
         msg = f'You moved {totalStudents} students from {sourceBatch.title} to {destinationBatch.title}'
-        Activity.objects.create(user=request.user,text=msg)
+        Activity.log(user=request.user,text=msg)
 
         return Response({'status':1,'data':msg},status=status.HTTP_200_OK)
 
@@ -330,6 +365,7 @@ class StudentMoveView(GetStudentMixin,GetBatchMixin,APIView):
 class StudentDeleteView(GetStudentMixin, GetBatchMixin, APIView):
     permission_classes = [IsAuthenticatedWithProfile]
     required_profile = AdminProfile
+    max_queries = 8
     
     def put(self,request,batch_id):
         data = ser.StudentIdSerializer(data=request.data)
@@ -343,15 +379,60 @@ class StudentDeleteView(GetStudentMixin, GetBatchMixin, APIView):
         Activity.bulk_create_from_queryset(queryset=allStudents,
                               text=f'You account has been deleted by Admin!')
 
-        totalStudents = allStudents.count()
-        allStudents.update(batch=None)
+        totalStudents = allStudents.update(batch=None)
+        Batch.adjust_counters(batch.id,students=-totalStudents)
+        profile_cache.invalidate(('batch', batch.id))
 
         #For the current Admin account
         msg = f'You deleted {totalStudents} students from {batch.title}'
-        Activity.objects.create(user=request.user,text=msg)
+        Activity.log(user=request.user,text=msg)
 
         return Response({'status':1,'data':msg},status=status.HTTP_200_OK)
 
+""" Search Views """
+
+class SearchView(APIView):
+    """
+    Admin wide search over faculties, students (of every batch), batches & slots
+    in a single request, results are typed & ranked together (see base.search).
+    """
+    permission_classes = [IsAuthenticatedWithProfile]
+    required_profile = AdminProfile
+    max_queries = 6
+    DEFAULT_LIMIT = 20
+    MAX_LIMIT = 50
+
+    serializers = {'faculty': ser.SearchFacultySerializer,
+                   'student': ser.SearchStudentSerializer,
+                   'batch': ser.SearchBatchSerializer,
+                   'slot': ser.SearchSlotSerializer}
+
+    def get_querysets(self):
+        adminProfile = self.request.profile
+        return {'faculty': adminProfile.connected_faculties.select_related('user'),
+                'student': StudentProfile.objects.filter(batch__admin=adminProfile).select_related('user','batch'),
+                'batch': adminProfile.batch_set.all(),
+                'slot': Slot.objects.filter(batch__admin=adminProfile).select_related('batch','faculty')}
+
+    def get_limit(self):
+        try:
+            limit = int(self.request.query_params.get('limit',self.DEFAULT_LIMIT))
+        except ValueError:
+            raise ValidationError('limit => A valid integer is required.')
+        return max(1,min(limit,self.MAX_LIMIT))
+
+    def get(self,request):
+        query = request.query_params.get('q','').strip()
+        if not query:
+            raise ValidationError('Search query can\'t be empty!')
+
+        results = search.search_all(self.get_querysets(),query,self.get_limit())
+        context = {'request': request}
+        data = [{'type': kind, **self.serializers[kind](instance,context=context).data}
+                for kind,instance in results]
+        return Response({'status': 1, 'data': data}, status=status.HTTP_200_OK)
+
+
 """ Broadcast Views """
 
 class BroadcastTargetView(ListAPIView):
@@ -361,33 +442,33 @@ class BroadcastTargetView(ListAPIView):
     """
     permission_classes = [IsAuthenticatedWithProfile]
     required_profile = AdminProfile
+    max_queries = 4
     serializer_class = ser.BroadcastTargetSerializer
     pagination_class = None
 
     def get_queryset(self):
-        return self.request.profile.batch_set\
-            .annotate(students_count=Count('students', distinct=True))
+        return self.request.profile.batch_set.with_broadcast_counts()
 
     def list(self,request,*args,**kwargs):
-        response = super().list(request,*args,**kwargs)
+        batches = list(self.filter_queryset(self.get_queryset()))
+        data = self.get_serializer(batches,many=True).data
 
         totalFaculties = self.request.profile.connected_faculties\
                     .filter(status=FacultyProfile.VERIFIED).count()
 
-        totalStudents = self.request.profile.batch_set.\
-                        aggregate(students_count=Count('students', distinct=True))\
-                            .pop('students_count')
+        #Every student belongs to a single batch, so batch counts add up to the total.
+        totalStudents = sum(batch.student_count for batch in batches)
 
-        response.data.append({'label': f'All Students ({totalStudents})',
-                              'value': 'STUDENT'})
-        response.data.append({'label': f'All Faculties ({totalFaculties})',
-                              'value': 'FACULTY'})
-        response.data.append({'label': f'Everyone , {totalStudents} students, {totalFaculties} faculties',
-                              'value': 'EVERYONE'})
+        data.append({'label': f'All Students ({totalStudents})',
+                     'value': 'STUDENT'})
+        data.append({'label': f'All Faculties ({totalFaculties})',
+                     'value': 'FACULTY'})
+        data.append({'label': f'Everyone , {totalStudents} students, {totalFaculties} faculties',
+                     'value': 'EVERYONE'})
 
-        response.data = reversed(response.data)
+        data.reverse()
 
-        return Response({'status': 1, 'data': response.data}, status=status.HTTP_200_OK)
+        return Response({'status': 1, 'data': data}, status=status.HTTP_200_OK)
 
 
 class BroadcastView(CreateAPIView):
@@ -397,6 +478,7 @@ class BroadcastView(CreateAPIView):
     """
     permission_classes = [IsAuthenticatedWithProfile]
     required_profile = AdminProfile
+    max_queries = 9
     serializer_class = ser.BroadcastSerializer
 
     def perform_create(self, serializer):
@@ -0,0 +1,80 @@
+# Generated by Django 2.2.28 on 2026-10-19 20:22
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+
+
+def populate_uuids(apps, schema_editor):
+    #Existing rows all got the same default, every row needs its own before the field can be unique.
+    FacultyProfile = apps.get_model('FacultyUser', 'FacultyProfile')
+    for pk in FacultyProfile.objects.values_list('pk', flat=True):
+        FacultyProfile.objects.filter(pk=pk).update(uuid=uuid.uuid4())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('FacultyUser', '0008_auto_20210505_2013'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='facultyprofile',
+            name='image',
+        ),
+        migrations.AddField(
+            model_name='facultyprofile',
+            name='added',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='facultyprofile',
+            name='receive_email_notification',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='facultyprofile',
+            name='status',
+            field=models.CharField(blank=True, choices=[('VERIFIED', 'VERIFIED'), ('INVITED', 'INVITED'), ('UNVERIFIED', 'UNVERIFIED')], max_length=100, null=True),
+        ),
+        migrations.AddField(
+            model_name='facultyprofile',
+            name='uuid',
+            field=models.UUIDField(default=uuid.uuid4, null=True),
+        ),
+        migrations.RunPython(populate_uuids, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='facultyprofile',
+            name='uuid',
+            field=models.UUIDField(default=uuid.uuid4, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='facultyprofile',
+            name='admin',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='connected_faculties', to='AdminUser.AdminProfile'),
+        ),
+        migrations.AlterField(
+            model_name='facultyprofile',
+            name='invite_sent',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='facultyprofile',
+            name='joined',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='facultyprofile',
+            name='name',
+            field=models.CharField(max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='facultyprofile',
+            name='user',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 2.2.28 on 2026-10-19 20:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('FacultyUser', '0009_sync_models'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='facultyprofile',
+            index=models.Index(fields=['admin', 'status', 'added'], name='faculty_admin_status_idx'),
+        ),
+    ]
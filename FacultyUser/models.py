@@ -3,7 +3,7 @@ import uuid
 from django.db import models
 from django.utils import timezone
 from django.core import signing
-from django.db.models.signals import pre_save
+from django.db.models.signals import pre_save,post_save,post_delete
 from django.contrib.auth.models import BaseUserManager
 
 from rest_framework.authtoken.models import Token
@@ -11,8 +11,9 @@ from rest_framework.authtoken.models import Token
 from trackr.settings import AUTH_USER_MODEL as User
 from AdminUser.models import AdminProfile
 from .exception import Error
-from base.models import CustomUser,Batch,Activity
-from base.utils import get_image
+from base.models import CustomUser,Batch,Activity,Slot
+from base.utils import get_image,get_avatar
+from base import authentication, search
 
 
 
@@ -51,6 +52,8 @@ class FacultyProfile(models.Model):
 
     receive_email_notification = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [models.Index(fields=['admin', 'status', 'added'], name='faculty_admin_status_idx')]
 
     def __str__(self):
         if not self.is_active():
@@ -65,8 +68,10 @@ class FacultyProfile(models.Model):
             return self.VERIFIED if self.user.has_usable_password() else self.INVITED
         return self.UNVERIFIED
 
-    def get_profile_image(self,request,thumbnail=True):
-        if self.status == FacultyProfile.VERIFIED:       
+    def get_profile_image(self,request,thumbnail=True,avatar_size=None):
+        if self.status == FacultyProfile.VERIFIED:
+            if avatar_size is not None:
+                return get_avatar(request,self.user,avatar_size)
             image = self.user.thumbnail if thumbnail else self.user.profile_image
             return get_image(request,image)
         return None
@@ -88,7 +93,7 @@ class FacultyProfile(models.Model):
         if email is not None:
             profile.add_or_overwrite_user(email=email)
 
-        Activity.objects.create(user=admin.user,
+        Activity.log(user=admin.user,
         text=f"You added '{name}' as faculty and invited them to create a FACULTY Account with {email}"
              if email is not None else f"You added '{name}' as faculty")
         
@@ -135,7 +140,7 @@ class FacultyProfile(models.Model):
                 raise Error('New Email is same as old email!')
             self.user.delete()
 
-            Activity.objects.create(user=self.admin.user,
+            Activity.log(user=self.admin.user,
             text=f"You changed the invite email from {oldEmail} to {email} for '{self.name}' Faculty Account")
 
             
@@ -157,9 +162,9 @@ class FacultyProfile(models.Model):
             Token.objects.create(user=self.user)
 
             #For Faculty User
-            Activity.objects.create(user=self.user,text="You Signed up with a Faculty Account.")
+            Activity.log(user=self.user,text="You Signed up with a Faculty Account.")
             #For Admin of the current faculty
-            Activity.objects.create(user=self.admin.user,
+            Activity.log(user=self.admin.user,
                                     text=f"{self.name} accepted you Invite for a Faculty account.")
 
         else:
@@ -172,13 +177,13 @@ class FacultyProfile(models.Model):
         so they can see what happened in the activity section,
         otherwise delete the profile.        
         """
-        Activity.objects.create(user=self.admin.user,
+        Activity.log(user=self.admin.user,
         text=f"You deleted '{self.name}' ({self.status}) Faculty Account!")
          
         if self.status == self.VERIFIED:
-            Activity.objects.create(user=self.user,text="Your Account has been deleted by Admin!")
+            Activity.log(user=self.user,text="Your Account has been deleted by Admin!")
             #Need to manually delete slots because cascading wont happen in this case.
-            self.teaches_in.all().delete()
+            Slot.bulk_delete_slots(self.teaches_in.all())
             self.admin = None
             self.save()
         else:
@@ -188,10 +193,14 @@ class FacultyProfile(models.Model):
             self.delete()
         
     def assignedBatches(self):
-        return Batch.objects.filter(slots__faculty=self).distinct()
+        return Batch.objects.filter(assignments__faculty=self)
 
 
 def populate_faculty_status(sender,instance,*args,**kwargs):
     instance.status = instance.get_current_status()
 
 pre_save.connect(populate_faculty_status,sender=FacultyProfile)
+post_save.connect(authentication.invalidate_profile,sender=FacultyProfile)
+post_delete.connect(authentication.invalidate_profile,sender=FacultyProfile)
+post_save.connect(search.index_instance,sender=FacultyProfile)
+post_delete.connect(search.unindex_instance,sender=FacultyProfile)
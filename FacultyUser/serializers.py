@@ -13,6 +13,7 @@ from trackr.settings import FACULTY_INVITE_MAX_AGE
 from base.serializers import BaseOngoingSlotSerializer,BaseNextOrPreviousSlotSerializer                                
 from StudentUser.models import StudentProfile
 from base.utils import PasswordMinLengthValidator
+from base import metrics
 
 
 
@@ -95,7 +96,7 @@ class BroadcastTargetSerializer(serializers.ModelSerializer):
     value = serializers.CharField(source='uuid')
 
     def get_label(self,instance):
-        return f'{instance.title} , {instance.students_count} students'
+        return f'{instance.title} , {instance.student_count} students'
 
 
 class BroadcastSerializer(serializers.ModelSerializer):
@@ -114,6 +115,7 @@ class BroadcastSerializer(serializers.ModelSerializer):
         text,sender,receivers = itemgetter('text','sender','receivers')(validated_data)
         broadcast = Broadcast.objects.create(sender=sender,text=text)
         broadcast.receivers.add(*receivers)
+        metrics.BROADCAST_RECEIVERS.observe(len(receivers), sender='faculty')
         return broadcast
 
     def validate_text(self,text):
@@ -144,7 +146,7 @@ class BroadcastSerializer(serializers.ModelSerializer):
         if targetStudents.count() == 0:
             raise ValidationError("No students are present to receive the broadcast!")
 
-        validated_data['receivers'] = [students.user for students in targetStudents]
+        validated_data['receivers'] = list(targetStudents.values_list('user',flat=True))
 
         return validated_data
 
@@ -1,5 +1,4 @@
 
-from django.db.models import Count
 
 from rest_framework.views import APIView
 from rest_framework.response import Response
@@ -24,6 +23,7 @@ class CreateAccountView(APIView):
     Faculty signup using their Invite link.
     """
     permission_classes = [AllowAny]
+    max_queries = {'GET':2,'POST':20}
     serializer_class = FacultySignupSerializer
     
     def get(self,request):
@@ -63,6 +63,7 @@ class TimelineView(APIView):
     permission_classes = [IsAuthenticatedWithProfile]
     required_profile = FacultyProfile
     required_account_active = True
+    max_queries = 7
 
     def get(self,request):
 
@@ -97,23 +98,24 @@ class BroadcastTargetView(ListAPIView):
     permission_classes = [IsAuthenticatedWithProfile]
     required_profile = FacultyProfile
     required_account_active = True
+    max_queries = 3
 
     def get_queryset(self):
-        return self.request.profile.assignedBatches()\
-            .annotate(students_count=Count('students', distinct=True))
+        return self.request.profile.assignedBatches()
 
     def list(self,request,*args,**kwargs):
-        response = super().list(request,*args,**kwargs)
+        batches = list(self.filter_queryset(self.get_queryset()))
+        data = self.get_serializer(batches,many=True).data
 
-        totalStudents = request.profile.assignedBatches()\
-            .aggregate(total_students=Count('students')).pop('total_students')
+        #Every student belongs to a single batch, so batch counts add up to the total.
+        totalStudents = sum(batch.student_count for batch in batches)
         
-        response.data.append({'label': f'Everyone , {totalStudents} students',
-                              'value': 'EVERYONE'})
+        data.append({'label': f'Everyone , {totalStudents} students',
+                     'value': 'EVERYONE'})
         
-        response.data = reversed(response.data)
+        data.reverse()
 
-        return Response({'status':1,'data':response.data},status=status.HTTP_200_OK)
+        return Response({'status':1,'data':data},status=status.HTTP_200_OK)
 
 
 class BroadcastView(CreateAPIView):
@@ -126,6 +128,7 @@ class BroadcastView(CreateAPIView):
     permission_classes = [IsAuthenticatedWithProfile]
     required_profile = FacultyProfile
     required_account_active = True
+    max_queries = 9
 
     def perform_create(self, serializer):
         return serializer.save(sender=self.request.user)
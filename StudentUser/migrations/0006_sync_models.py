@@ -0,0 +1,52 @@
+# Generated by Django 2.2.28 on 2026-10-19 20:22
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+def populate_uuids(apps, schema_editor):
+    #Existing rows all got the same default, every row needs its own before the field can be unique.
+    StudentProfile = apps.get_model('StudentUser', 'StudentProfile')
+    for pk in StudentProfile.objects.values_list('pk', flat=True):
+        StudentProfile.objects.filter(pk=pk).update(uuid=uuid.uuid4())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('StudentUser', '0005_auto_20210506_2016'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='studentprofile',
+            name='image',
+        ),
+        migrations.AddField(
+            model_name='studentprofile',
+            name='receive_email_notification',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='studentprofile',
+            name='uuid',
+            field=models.UUIDField(default=uuid.uuid4, null=True),
+        ),
+        migrations.RunPython(populate_uuids, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='studentprofile',
+            name='uuid',
+            field=models.UUIDField(default=uuid.uuid4, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='studentprofile',
+            name='batch',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='student_profiles', related_query_name='students', to='base.Batch'),
+        ),
+        migrations.AlterField(
+            model_name='studentprofile',
+            name='name',
+            field=models.CharField(max_length=100),
+        ),
+    ]
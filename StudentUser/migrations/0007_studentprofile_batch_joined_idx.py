@@ -0,0 +1,17 @@
+# Generated by Django 2.2.28 on 2026-10-19 20:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('StudentUser', '0006_sync_models'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='studentprofile',
+            index=models.Index(fields=['batch', 'joined'], name='student_batch_joined_idx'),
+        ),
+    ]
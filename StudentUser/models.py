@@ -1,10 +1,12 @@
 import uuid
 
-from django.db import models
+from django.db import models, transaction
+from django.db.models.signals import pre_save,post_save,post_delete
 from django.contrib.auth import get_user_model
 
 from trackr import settings
 from base.models import Activity, Batch
+from base import authentication, search
 
 
 class StudentProfile(models.Model):
@@ -20,7 +22,9 @@ class StudentProfile(models.Model):
             related_name="student_profiles",related_query_name='students')
     joined = models.DateField(auto_now_add=True)
     receive_email_notification = models.BooleanField(default=False)
-    
+
+    class Meta:
+        indexes = [models.Index(fields=['batch', 'joined'], name='student_batch_joined_idx')]
 
     def __str__(self):
         return f'{self.name} (STUDENT)'
@@ -31,16 +35,51 @@ class StudentProfile(models.Model):
     @classmethod
     def create_profile(cls, *, name, email, password, batch, receive_email_notification):
         CustomUser = get_user_model()
-        user = CustomUser.objects.create_user(email,password,
-                        user_type=CustomUser.STUDENT)
+        with transaction.atomic():
+            user = CustomUser.objects.create_user(email,password,
+                            user_type=CustomUser.STUDENT)
 
-        studentProfile = cls.objects.create(user=user, name=name,batch=batch, 
-                        receive_email_notification=receive_email_notification)
+            studentProfile = cls(user=user, name=name,batch=batch, 
+                            receive_email_notification=receive_email_notification)
+            #Counted by reserve_seat() rather than the post_save signal.
+            studentProfile._seat_reserved = True
+            studentProfile.save()
+            #Claimed in the same transaction so a rejected signup rolls the user & profile back.
+            #On SQLite the write lock is already taken by the user INSERT (after hashing) & held till commit.
+            batch.reserve_seat()
         
-        Activity.objects.create(user=user,text="You Signed up with a Student Account.")
+        Activity.log(user=user,text="You Signed up with a Student Account.")
         #For Admin of the current student.
-        Activity.objects.create(user=batch.admin.user,
+        Activity.log(user=batch.admin.user,
         text=f"'{name}' signed up for a STUDENT Account in '{batch.title}' batch.")
 
         return studentProfile
 
+
+def remember_student_batch(sender, instance, raw=False, **kwargs):
+    instance._old_batch_id = None
+    if instance.pk is not None and not raw:
+        instance._old_batch_id = StudentProfile.objects.filter(pk=instance.pk)\
+                                    .values_list('batch_id',flat=True).first()
+
+def update_batch_counter(sender, instance, created, raw=False, **kwargs):
+    """
+    Keeps Batch.student_count in sync, bulk moves via queryset.update()
+    adjust the counters themselves (see StudentMoveView).
+    """
+    oldBatchId = getattr(instance,'_old_batch_id',None)
+    if raw or oldBatchId == instance.batch_id or (created and getattr(instance,'_seat_reserved',False)):
+        return
+    Batch.adjust_counters(oldBatchId,students=-1)
+    Batch.adjust_counters(instance.batch_id,students=1)
+
+def remove_from_batch_counter(sender, instance, **kwargs):
+    Batch.adjust_counters(instance.batch_id,students=-1)
+
+pre_save.connect(remember_student_batch,sender=StudentProfile)
+post_save.connect(update_batch_counter,sender=StudentProfile)
+post_delete.connect(remove_from_batch_counter,sender=StudentProfile)
+post_save.connect(authentication.invalidate_profile,sender=StudentProfile)
+post_delete.connect(authentication.invalidate_profile,sender=StudentProfile)
+post_save.connect(search.index_instance,sender=StudentProfile)
+post_delete.connect(search.unindex_instance,sender=StudentProfile)
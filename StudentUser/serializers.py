@@ -1,6 +1,8 @@
 
 from uuid import UUID
 
+from django.core.exceptions import ValidationError as DjangoValidationError
+
 from rest_framework.exceptions import ValidationError
 from rest_framework import serializers
 
@@ -44,6 +46,7 @@ class InviteLinkVerifySerializer(serializers.Serializer):
         try:
             batch = Batch.objects.select_related('admin').get(uuid=token)
             assert batch.onboard_students , 'Student onboarding for this batch has been stopped by the Admin!'
+            #Early rejection only, the seat is claimed atomically on signup (see Batch.reserve_seat).
             assert batch.total_students() < batch.max_students,'Batched has reached max students!'
         except (Batch.DoesNotExist,Batch.MultipleObjectsReturned):
             raise ValidationError('Link is Invalid!')
@@ -70,4 +73,7 @@ class StudentSignupSerializer(serializers.Serializer):
     token = serializers.CharField()
 
     def create(self,validated_data):
-        return StudentProfile.create_profile(**validated_data)
+        try:
+            return StudentProfile.create_profile(**validated_data)
+        except DjangoValidationError as err:
+            raise ValidationError(err.message)
@@ -1,3 +1,74 @@
-from django.test import TestCase
+import re
+from io import StringIO
 
-# Create your tests here.
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.test import TransactionTestCase
+from django.test.utils import override_settings
+
+from rest_framework.test import APIClient
+
+from AdminUser.models import AdminProfile
+from StudentUser.models import StudentProfile
+from base.models import Batch, CustomUser
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class SeatReservation(TransactionTestCase):
+
+    def setUp(self):
+        self.admin = AdminProfile.create_profile(name='admin', email='admin@test.com',
+                                                 password='password', timezone='Asia/Kolkata')
+        self.batch = Batch.objects.create(title='batch', admin=self.admin, max_students=2)
+
+    def signup(self, index):
+        return APIClient().post('/api/student/signup/', {
+            'name': f'student {index}', 'email': f'student{index}@test.com', 'password': 'password',
+            'receive_email_notification': False, 'token': str(self.batch.uuid)}, format='json')
+
+    def create_profile(self, index):
+        return StudentProfile.create_profile(name=f'student {index}', email=f'student{index}@test.com',
+                                             password='password', batch=self.batch, receive_email_notification=False)
+
+    def test_signups_stop_at_max_students(self):
+        self.assertEqual(self.signup(0).status_code, 201)
+        self.assertEqual(self.signup(1).status_code, 201)
+
+        response = self.signup(2)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['data'], 'Batched has reached max students!')
+        self.assertFalse(CustomUser.objects.filter(email='student2@test.com').exists())
+
+        self.batch.refresh_from_db()
+        self.assertEqual(self.batch.student_count, 2)
+
+    def test_stale_batch_cannot_overshoot(self):
+        #Every signup saw an empty batch, as concurrent requests would have.
+        self.create_profile(0)
+        self.create_profile(1)
+        for index in (2, 3):
+            with self.assertRaisesMessage(ValidationError, 'Batched has reached max students!'):
+                self.create_profile(index)
+
+        self.assertEqual(StudentProfile.objects.filter(batch=self.batch).count(), 2)
+        self.assertEqual(CustomUser.objects.filter(user_type=CustomUser.STUDENT).count(), 2)
+        self.assertEqual(Batch.objects.get(pk=self.batch.pk).student_count, 2)
+
+    def test_stopped_onboarding(self):
+        Batch.objects.filter(pk=self.batch.pk).update(onboard_students=False)
+        response = self.signup(0)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['data'], 'Student onboarding for this batch has been stopped by the Admin!')
+
+    def test_stress_command(self):
+        out = StringIO()
+        #The shared in-memory test database fails some signups right away instead of
+        #waiting for the write lock, so only the seats are checked.
+        call_command('stress_signups', '--workers', '4', '--signups', '15', '--max-students', '3',
+                     stdout=out, stderr=StringIO())
+        admitted = int(re.search(r'(\d+) admitted', out.getvalue()).group(1))
+        students, counter = map(int, re.search(r'Seats: (\d+) students, counter (\d+)', out.getvalue()).groups())
+        self.assertLessEqual(admitted, 3)
+        self.assertLessEqual(students, 3)
+        self.assertEqual(students, counter)
+        self.assertFalse(CustomUser.objects.filter(email__contains='@stress.test').exists())
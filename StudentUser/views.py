@@ -19,6 +19,7 @@ class CreateAccountView(APIView):
     Student signup using a batch Invite link.
     """
     permission_classes = [AllowAny]
+    max_queries = {'GET':2,'POST':17}
     serializer_class = StudentSignupSerializer
     
     def get(self,request):
@@ -57,6 +58,7 @@ class TimelineView(APIView):
     permission_classes = [IsAuthenticatedWithProfile]
     required_profile = StudentProfile
     required_account_active = True
+    max_queries = 7
 
     def get(self, request):
         batch = request.profile.batch
@@ -64,7 +66,8 @@ class TimelineView(APIView):
         if not batch.active:
             raise ValidationError('Admin has paused the classes for this batch!')
 
-        all_slots = request.profile.batch.connected_slots.select_related('faculty')
+        #Faculty users are needed for their avatars.
+        all_slots = request.profile.batch.connected_slots.select_related('faculty__user')
 
         if not all_slots:
             raise ValidationError('No classes assigned by the Admin yet!')
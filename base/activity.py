@@ -0,0 +1,126 @@
+"""
+Write-behind buffer for the activity log.
+
+Activities logged during a request are collected here instead of being
+inserted one row at a time, and are written with a single bulk_create
+once the request transaction commits (ATOMIC_REQUESTS is enabled), plus
+one per savepoint they were logged inside of. Outside of a transaction
+the on_commit hook fires immediately, so the behaviour degrades to a
+plain insert.
+"""
+
+import queue
+import threading
+
+from django.conf import settings
+from django.db import connection, transaction
+
+
+_local = threading.local()
+
+
+class ActivityBatch:
+    """
+    Activities logged inside the same (savepoint of a) transaction, written by its
+    own on_commit hook. Rolling back a savepoint drops the hooks registered inside
+    it, so its activities are dropped too while the outer transaction commits.
+    """
+    def __init__(self):
+        self.pending = []
+        self.background = []
+
+    def flush(self):
+        from .models import Activity
+
+        pending, background = self.pending, self.background
+        self.pending, self.background = [], []
+
+        if not getattr(settings, 'ACTIVITY_BACKGROUND_FLUSH', False):
+            pending, background = pending + background, []
+
+        if pending:
+            Activity.objects.bulk_create(pending)
+        if background:
+            _background_writer.put(background)
+
+
+class ActivityCollector:
+
+    def __init__(self):
+        #Savepoint ids -> ActivityBatch, i.e () for the outermost atomic block.
+        self.batches = {}
+
+    def add(self, activity, background=False):
+        key = tuple(connection.savepoint_ids)
+        batch = self.batches.get(key)
+        if batch is None or not self._is_scheduled(batch):
+            #A batch that isn't scheduled anymore belongs to a rolled back transaction/savepoint.
+            batch = self.batches[key] = ActivityBatch()
+            scheduled = False
+        else:
+            scheduled = True
+
+        target = batch.background if background else batch.pending
+        target.append(activity)
+
+        if not scheduled:
+            transaction.on_commit(batch.flush)
+
+    def _is_scheduled(self, batch):
+        if not connection.in_atomic_block:
+            return False
+        return any(func == batch.flush for _, func in connection.run_on_commit)
+
+
+def get_collector():
+    collector = getattr(_local, 'collector', None)
+    if collector is None:
+        collector = _local.collector = ActivityCollector()
+    return collector
+
+
+def start_request():
+    _local.collector = ActivityCollector()
+
+
+def end_request():
+    #Anything still pending here was never committed.
+    _local.collector = None
+
+
+class BackgroundActivityWriter:
+    """
+    Writes non-critical activities from a daemon thread so the
+    request doesn't wait on them, enabled with ACTIVITY_BACKGROUND_FLUSH.
+    """
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def put(self, activities):
+        self._ensure_started()
+        self.queue.put(activities)
+
+    def _ensure_started(self):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name='activity-writer', daemon=True)
+                self.thread.start()
+
+    def _run(self):
+        from .models import Activity
+
+        while True:
+            activities = self.queue.get()
+            try:
+                Activity.objects.bulk_create(activities)
+            finally:
+                connection.close()
+                self.queue.task_done()
+
+    def join(self):
+        self.queue.join()
+
+
+_background_writer = BackgroundActivityWriter()
@@ -0,0 +1,267 @@
+import uuid
+import hashlib
+
+from django.apps import apps
+from django.conf import settings
+from django.core import signing
+from django.core.cache import caches
+from django.utils import timezone
+from django.db import transaction
+from django.db.models.fields.files import FieldFile
+from django.core.exceptions import ObjectDoesNotExist
+from django.utils.translation import gettext_lazy as _
+
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+from .tokens import AccessToken
+
+
+class TokenProfileCache:
+    """
+    Maps a hash of a token key to the user & profile of its owner, stored in the
+    AUTH_CACHE['ALIAS'] cache so every worker sharing it sees the same entries.
+    Only plain field values are stored (see to_plain), never the token itself or the
+    password hash. The profile is stored along with its admin/batch so timezone &
+    active status can be resolved without queries.
+
+    Entries are tagged i.e ('user', id), ('batch', id), ('admin', id) & store the
+    version every tag had when they were cached, invalidating a tag replaces its
+    version so the entries of every worker stop matching at once.
+    Every entry is also tagged with ALL, which clear() invalidates.
+    """
+    ALL = ('all', '')
+
+    def __init__(self, alias, ttl):
+        self.alias = alias
+        self.ttl = ttl
+        #Lookups made by this process.
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    @staticmethod
+    def get_key(key):
+        #Tokens are never stored as they are & signed ones are too long for some backends.
+        return 'auth:token:' + hashlib.sha256(key.encode()).hexdigest()
+
+    @staticmethod
+    def get_tag_key(tag):
+        return 'auth:tag:{}:{}'.format(*tag)
+
+    def get(self, key):
+        entry = self.cache.get(self.get_key(key))
+        if entry is not None:
+            versions = self.cache.get_many(list(entry['versions']))
+            #A tag which was invalidated (or evicted) since.
+            if versions != entry['versions']:
+                entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry['value']
+
+    def set(self, key, value, tags):
+        tagKeys = [self.get_tag_key(tag) for tag in {*tags, self.ALL}]
+        versions = self.cache.get_many(tagKeys)
+        for tagKey in tagKeys:
+            if tagKey not in versions:
+                self.cache.add(tagKey, uuid.uuid4().hex, timeout=None)
+                versions[tagKey] = self.cache.get(tagKey)
+        self.cache.set(self.get_key(key), {'versions': versions, 'value': value}, timeout=self.ttl)
+
+    def invalidate_token(self, key):
+        self.cache.delete(self.get_key(key))
+
+    def invalidate(self, tag):
+        """
+        Invalidates right away & again on commit, otherwise a concurrent
+        request could re-cache the old rows before this transaction commits.
+        """
+        self._invalidate_tag(tag)
+        transaction.on_commit(lambda: self._invalidate_tag(tag))
+
+    def _invalidate_tag(self, tag):
+        self.cache.set(self.get_tag_key(tag), uuid.uuid4().hex, timeout=None)
+
+    def clear(self):
+        self._invalidate_tag(self.ALL)
+
+
+profile_cache = TokenProfileCache(alias=settings.AUTH_CACHE['ALIAS'], ttl=settings.AUTH_CACHE['TTL'])
+
+
+def to_plain(instance, exclude=()):
+    """
+    Field values of a model instance & of the related instances cached on it
+    (i.e by select_related), fields in exclude are left out.
+    """
+    if instance is None:
+        return None
+    fields, related = {}, {}
+    for field in instance._meta.concrete_fields:
+        if field.name in exclude:
+            continue
+        value = getattr(instance, field.attname)
+        #Files hold a reference to their instance, only their name is stored.
+        fields[field.attname] = value.name if isinstance(value, FieldFile) else value
+        if field.is_relation and field.is_cached(instance):
+            related[field.name] = to_plain(field.get_cached_value(instance))
+    return {'model': instance._meta.label, 'db': instance._state.db,
+            'fields': fields, 'related': related}
+
+
+def from_plain(data, **values):
+    """
+    Rebuilds an instance stored by to_plain, excluded fields are deferred
+    unless they are given in values.
+    """
+    if data is None:
+        return None
+    model = apps.get_model(data['model'])
+    fieldNames = [field.attname for field in model._meta.concrete_fields if field.attname in data['fields']]
+    instance = model.from_db(data['db'], fieldNames, [data['fields'][name] for name in fieldNames])
+    for name, related in data['related'].items():
+        setattr(instance, name, from_plain(related))
+    for name, value in values.items():
+        setattr(instance, name, value)
+    return instance
+
+
+def get_tags(user, profile):
+    tags = {('user', user.id)}
+    if profile is not None and user.user_type == user.ADMIN:
+        tags.add(('admin', profile.pk))
+    admin_id = getattr(profile, 'admin_id', None)
+    batch_id = getattr(profile, 'batch_id', None)
+    if batch_id is not None:
+        tags.add(('batch', batch_id))
+        admin_id = profile.batch.admin_id
+    if admin_id is not None:
+        tags.add(('admin', admin_id))
+    return tags
+
+
+#Reverse one-to-one relations of every profile type along with their tenant.
+PROFILE_RELATIONS = {'ADMIN': 'adminprofile',
+                     'FACULTY': 'facultyprofile',
+                     'STUDENT': 'studentprofile'}
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication backed by profile_cache, resolved profile is attached
+    to the request as request.profile, steady state requests don't query the db at all.
+
+    On a cache miss token, user, the profile of every role & its admin/batch
+    are fetched in a single joined query and the profile matching user_type is picked.
+    """
+    def authenticate(self, request):
+        result = super().authenticate(request)
+        if result is not None:
+            user, token = result
+            request.profile = token.profile
+        return result
+
+    @staticmethod
+    def get_profile(user):
+        try:
+            return getattr(user, PROFILE_RELATIONS[user.user_type])
+        except (KeyError, ObjectDoesNotExist):
+            return None
+
+    def resolve(self, key):
+        model = self.get_model()
+        try:
+            token = model.objects.select_related('user', 'user__adminprofile',
+                                                 'user__facultyprofile__admin',
+                                                 'user__studentprofile__batch__admin').get(key=key)
+        except model.DoesNotExist:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+
+        return token, self.get_profile(token.user)
+
+    def resolve_signed(self, token):
+        """
+        Signature is already verified, only the user & profile need to be loaded.
+        """
+        from .models import CustomUser
+
+        try:
+            user = CustomUser.objects.select_related('adminprofile', 'facultyprofile__admin',
+                                                     'studentprofile__batch__admin').get(pk=token.user_id)
+        except CustomUser.DoesNotExist:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+
+        profile = self.get_profile(user)
+        #Token belongs to a profile that doesn't exist anymore.
+        if user.user_type != token.role or (profile and profile.pk) != token.profile_id:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+
+        token.user = user
+        return token, profile
+
+    def authenticate_credentials(self, key):
+        signed = AccessToken.is_signed(key)
+
+        if signed:
+            #Signed tokens are never cached, they are verified on every request.
+            try:
+                token = AccessToken.parse(key)
+            except signing.BadSignature:
+                raise exceptions.AuthenticationFailed(_('Invalid token.'))
+            if token.expires <= timezone.now() or token.is_revoked():
+                profile_cache.invalidate_token(key)
+                raise exceptions.AuthenticationFailed(_('Invalid token.'))
+
+        cached = profile_cache.get(key)
+        if cached is None:
+            token, profile = self.resolve_signed(token) if signed else self.resolve(key)
+            user = token.user
+            if user.is_active:
+                profile_cache.set(key, {'user': to_plain(user, exclude={'password'}),
+                                        'profile': to_plain(profile, exclude={'user'}),
+                                        'token': None if signed else to_plain(token, exclude={'key', 'user'})},
+                                  get_tags(user, profile))
+        else:
+            #The password hash isn't cached, it is loaded if something reads it.
+            user = from_plain(cached['user'])
+            profile = from_plain(cached['profile'], user=user)
+            if profile is not None:
+                setattr(user, PROFILE_RELATIONS[user.user_type], profile)
+            if signed:
+                token.user = user
+            else:
+                token = from_plain(cached['token'], key=key, user=user)
+
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+
+        token.profile = profile
+        return (user, token)
+
+
+"""
+Signal receivers used to invalidate cached entries,
+connected next to their models.
+"""
+
+def invalidate_user(sender, instance, **kwargs):
+    profile_cache.invalidate(('user', instance.pk))
+
+def invalidate_token(sender, instance, **kwargs):
+    profile_cache.invalidate_token(instance.key)
+
+def invalidate_profile(sender, instance, **kwargs):
+    if instance.user_id is not None:
+        profile_cache.invalidate(('user', instance.user_id))
+
+def invalidate_admin(sender, instance, **kwargs):
+    profile_cache.invalidate(('admin', instance.pk))
+
+def invalidate_batch(sender, instance, **kwargs):
+    profile_cache.invalidate(('batch', instance.pk))
@@ -0,0 +1,248 @@
+"""
+Profile image pipeline.
+
+Uploads are stored untouched and queued as an ImageJob, the 'process_images'
+worker resizes them in a process pool and swaps them in. Until then the user's
+profile_image & thumbnail point to a shared placeholder image.
+Processed images are content addressed (see base/storage.py).
+
+Along with them square avatar variants of every size in AVATAR_SIZES are
+generated in both WebP & JPEG, named after the hash of the raw upload which is
+stored as the user's 'avatar_key', serializers pick the variant they need (see base.utils.get_avatar).
+"""
+
+import os
+import time
+import uuid
+
+from PIL import Image, ImageOps
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .storage import content_storage, hash_path, touch
+
+
+MAIN_SIZE = (1080, 1350)
+MAIN_QUALITY = 75
+THUMBNAIL_SIZE = (300, 240)
+#Images are decoded at least this many times bigger than MAIN_SIZE before the final LANCZOS pass.
+REDUCING_GAP = 2
+AVATAR_QUALITY = 80
+#Pillow format of every avatar variant along with its file extension.
+AVATAR_FORMATS = {'webp': 'WEBP', 'jpg': 'JPEG'}
+
+
+class ImageTooLarge(Exception):
+    pass
+
+
+def check_dimensions(source):
+    """
+    Reads only the image header of 'source' (path or file), so oversized images
+    and decompression bombs are rejected before any pixel data is decoded.
+    """
+    with Image.open(source) as img:
+        width, height = img.size
+    if max(width, height) > settings.MAX_IMAGE_SIDE or width * height > settings.MAX_IMAGE_PIXELS:
+        raise ImageTooLarge(f'Image can be at most {settings.MAX_IMAGE_SIDE}px wide/tall & '
+                            f'{settings.MAX_IMAGE_PIXELS // 10**6} megapixels, got {width}x{height}.')
+    return width, height
+
+
+def decode_reduced(img, box):
+    """
+    Decodes 'img' at the smallest resolution that still leaves REDUCING_GAP
+    headroom over what fits in 'box'. JPEGs are decoded at 1/2, 1/4 or 1/8 scale
+    straight from the DCT coefficients (draft), other formats are decoded in full
+    and box-reduced right away, so the full size image never lives long.
+    """
+    scale = min(box[0] / img.width, box[1] / img.height) * REDUCING_GAP
+    needed = (max(1, int(img.width * scale)), max(1, int(img.height * scale)))
+
+    if img.format == 'JPEG':
+        img.draft(img.mode, needed)
+    img.load()
+
+    factor = min(img.width // needed[0], img.height // needed[1])
+    return img.reduce(factor) if factor > 1 else img
+
+
+def ensure_placeholder():
+    name = settings.PROFILE_IMAGE_PLACEHOLDER
+    if not content_storage.exists(name):
+        path = content_storage.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        Image.new('RGB', THUMBNAIL_SIZE, (224, 224, 224)).save(path, 'PNG')
+    return name
+
+
+def is_placeholder(image):
+    return image.name == settings.PROFILE_IMAGE_PLACEHOLDER
+
+
+def avatar_name(user_type, key, size, extension):
+    return f'profile_images/{user_type}/avatars/{key}_{size}.{extension}'
+
+
+def get_avatar_names(user_type, key):
+    """
+    Maps (size, extension) to the storage name of every variant of 'key'.
+    """
+    return {(size, extension): avatar_name(user_type, key, size, extension)
+            for size in settings.AVATAR_SIZES for extension in AVATAR_FORMATS}
+
+
+def queue_profile_image(user, upload):
+    """
+    Stores the raw upload & points the user's images to the placeholder,
+    processing happens in the worker. Old images might be shared with other
+    users so they are left to the 'collect_media' command.
+    """
+    from .models import ImageJob
+
+    #Older uploads that weren't processed yet are useless now.
+    for job in ImageJob.objects.filter(user=user, status=ImageJob.PENDING):
+        job.discard()
+
+    placeholder = ensure_placeholder()
+    user.profile_image.name = placeholder
+    user.thumbnail.name = placeholder
+    user.avatar_key = ''
+    user.save(update_fields=['profile_image', 'thumbnail', 'avatar_key'])
+
+    return ImageJob.objects.create(user=user, raw_image=upload)
+
+
+def process_profile_image(raw_path, main_path, thumbnail_path, avatar_paths):
+    """
+    Runs in a worker process, so it only deals with file paths.
+    'avatar_paths' maps (size, extension) to the path of every avatar variant.
+    Returns the seconds it took.
+    """
+    start = time.perf_counter()
+    for path in (main_path, thumbnail_path, *avatar_paths.values()):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    check_dimensions(raw_path)
+    with Image.open(raw_path) as img:
+        img_format = img.format
+        img = decode_reduced(img, MAIN_SIZE)
+
+        main = img.copy()
+        main.thumbnail(MAIN_SIZE, Image.LANCZOS)
+        save_image(main, main_path, img_format, quality=MAIN_QUALITY)
+
+        #Every variant is cropped from the next bigger one, so the full image is only resampled once.
+        avatar = main
+        for size in sorted({size for size, _ in avatar_paths}, reverse=True):
+            avatar = ImageOps.fit(avatar, (size, size), Image.LANCZOS)
+            for extension, avatar_format in AVATAR_FORMATS.items():
+                path = avatar_paths.get((size, extension))
+                if path is not None:
+                    save_image(avatar, path, avatar_format, quality=AVATAR_QUALITY)
+
+        img.thumbnail(THUMBNAIL_SIZE, Image.LANCZOS)
+        save_image(img, thumbnail_path, img_format)
+    return time.perf_counter() - start
+
+
+def save_image(img, path, img_format, **options):
+    if img_format == 'JPEG' and img.mode not in ('RGB', 'L'):
+        img = img.convert('RGB')
+    #Avatars might be served while they are rewritten by another job with the same upload.
+    temporary = f'{path}.{os.getpid()}.tmp'
+    img.save(temporary, img_format, **options)
+    os.replace(temporary, path)
+
+
+def get_output_names(job):
+    """
+    Main image & thumbnail are written under temporary names and renamed to
+    their hash by finish_job(), avatar names are derived from the hash of the upload.
+    """
+    from .models import main_image_path, thumbnail_path
+
+    _, extension = os.path.splitext(job.raw_image.name)
+    main_name = main_image_path(job.user, job.raw_image.name)
+    thumbnail_name = thumbnail_path(job.user, f'thumbnail_{uuid.uuid4()}{extension}')
+    avatar_key = hash_path(job.raw_image.path)
+    return main_name, thumbnail_name, avatar_key
+
+
+def get_missing_avatars(user_type, avatar_key):
+    """
+    Same upload was already processed for someone else, existing variants are reused.
+    """
+    missing = {}
+    for variant, name in get_avatar_names(user_type, avatar_key).items():
+        path = content_storage.path(name)
+        if os.path.exists(path):
+            touch(path)
+        else:
+            missing[variant] = path
+    return missing
+
+
+def claim_jobs(limit):
+    """
+    Every job is claimed by a single UPDATE of PENDING rows tagging them with a
+    fresh token, so concurrent workers never get the same job. Jobs of a worker
+    that died (still PROCESSING after IMAGE_JOB_TIMEOUT) are put back first.
+    """
+    from .models import ImageJob
+
+    now = timezone.now()
+    ImageJob.objects.filter(status=ImageJob.PROCESSING, claimed__lt=now - settings.IMAGE_JOB_TIMEOUT)\
+                    .update(status=ImageJob.PENDING, claim='', claimed=None)
+
+    claim = uuid.uuid4().hex
+    ids = list(ImageJob.objects.filter(status=ImageJob.PENDING).order_by('id')
+               .values_list('id', flat=True)[:limit])
+    #Another worker might have claimed some of them in the meantime, those aren't PENDING anymore.
+    ImageJob.objects.filter(id__in=ids, status=ImageJob.PENDING).update(status=ImageJob.PROCESSING,
+                                                                         claim=claim, claimed=now)
+    return list(ImageJob.objects.filter(claim=claim).select_related('user').order_by('id'))
+
+
+def is_stale(job):
+    """
+    User uploaded another image (or got deleted) while this one was being processed.
+    """
+    from .models import ImageJob
+
+    return (not ImageJob.objects.filter(pk=job.pk).exists() or
+            ImageJob.objects.filter(user_id=job.user_id, id__gt=job.id).exists())
+
+
+def finish_job(job, main_name, thumbnail_name, avatar_key):
+    with transaction.atomic():
+        if is_stale(job):
+            #Avatars might be shared, they are left to 'collect_media'.
+            for name in (main_name, thumbnail_name):
+                content_storage.delete(name)
+        else:
+            user = job.user
+            user.profile_image.name = content_storage.ingest(main_name)
+            user.thumbnail.name = content_storage.ingest(thumbnail_name)
+            user.avatar_key = avatar_key
+            user.save(update_fields=['profile_image', 'thumbnail', 'avatar_key'])
+        job.discard()
+
+
+def fail_job(job, error):
+    with transaction.atomic():
+        if is_stale(job):
+            job.discard()
+            return
+
+        user = job.user
+        user.profile_image = None
+        user.thumbnail = None
+        user.avatar_key = ''
+        user.save(update_fields=['profile_image', 'thumbnail', 'avatar_key'])
+
+        job.status = job.FAILED
+        job.error = error
+        job.save(update_fields=['status', 'error'])
@@ -0,0 +1,350 @@
+"""
+Synthetic institutes & the load driver used by the 'generate_institutes' and
+'load_benchmark' commands.
+
+Every synthetic user has an email under SYNTHETIC_DOMAIN & the same password,
+so the driver can log in as any of them and the data can be cleared again.
+Rows are bulk inserted, the denormalized counters, batch assignments & search
+indexes are rebuilt afterwards the same way their repair commands do.
+"""
+
+import json
+import time
+import random
+import threading
+from datetime import time as clock
+from collections import defaultdict
+from urllib import request as urlrequest
+from urllib.parse import urlencode
+from urllib.error import HTTPError
+
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth.hashers import make_password
+from django.utils import timezone
+
+
+SYNTHETIC_DOMAIN = 'institute.test'
+FIRST_NAMES = ['Aarav', 'Aditi', 'Arjun', 'Diya', 'Ishaan', 'Kavya', 'Meera', 'Nikhil', 'Priya', 'Rahul',
+               'Riya', 'Rohan', 'Saanvi', 'Siddharth', 'Tanvi', 'Varun', 'Ananya', 'Kabir', 'Neha', 'Vikram']
+LAST_NAMES = ['Sharma', 'Verma', 'Iyer', 'Nair', 'Reddy', 'Gupta', 'Mehta', 'Joshi', 'Kapoor', 'Menon',
+              'Patel', 'Rao', 'Das', 'Bose', 'Kulkarni', 'Chopra', 'Malhotra', 'Saxena', 'Pillai', 'Agarwal']
+SUBJECTS = ['Physics', 'Chemistry', 'Mathematics', 'Biology', 'English', 'History', 'Economics', 'Accounts']
+BATCH_SIZE = 400
+
+
+def synthetic_email(role, *indexes):
+    return f"{role}{'_'.join(str(index) for index in indexes)}@{SYNTHETIC_DOMAIN}"
+
+
+def clear_institutes():
+    from .models import CustomUser
+
+    users = CustomUser.objects.filter(email__endswith=f'@{SYNTHETIC_DOMAIN}')
+    total = users.count()
+    users.delete()
+    return total
+
+
+class InstituteGenerator:
+
+    def __init__(self, *, admins, batches, faculties, students, slots_per_day, broadcasts,
+                 activities, password, seed, stdout=None):
+        if faculties < batches * slots_per_day:
+            raise ValueError(f'{batches} batches with {slots_per_day} slots a day need atleast '
+                             f'{batches * slots_per_day} faculties, so nobody teaches two classes at once.')
+        self.admins = admins
+        self.batches = batches
+        self.faculties = faculties
+        self.students = students
+        self.slots_per_day = slots_per_day
+        self.broadcasts = broadcasts
+        self.activities = activities
+        self.password = make_password(password)
+        self.random = random.Random(seed)
+        self.stdout = stdout
+
+    def log(self, msg):
+        if self.stdout is not None:
+            self.stdout.write(msg)
+
+    def name(self):
+        return f'{self.random.choice(FIRST_NAMES)} {self.random.choice(LAST_NAMES)}'
+
+    def create_users(self, emails, user_type):
+        from .models import CustomUser
+
+        CustomUser.objects.bulk_create([CustomUser(email=email, user_type=user_type, password=self.password)
+                                        for email in emails], batch_size=BATCH_SIZE)
+        #SQLite doesn't return primary keys from bulk inserts.
+        ids = dict(CustomUser.objects.filter(email__in=emails).values_list('email', 'id'))
+        return [ids[email] for email in emails]
+
+    def generate(self):
+        from AdminUser.models import AdminProfile
+        from FacultyUser.models import FacultyProfile
+        from StudentUser.models import StudentProfile
+        from .models import Activity, Batch, BatchAssignment, CustomUser, Slot
+        from . import search
+
+        userIds = []
+        for a in range(self.admins):
+            adminUser = self.create_users([synthetic_email('admin', a)], CustomUser.ADMIN)[0]
+            admin = AdminProfile.objects.create(user_id=adminUser, name=f'Institute {a}', timezone='Asia/Kolkata')
+
+            emails = [synthetic_email('faculty', a, f) for f in range(self.faculties)]
+            facultyUsers = self.create_users(emails, CustomUser.FACULTY)
+            FacultyProfile.objects.bulk_create([
+                FacultyProfile(name=self.name(), user_id=user, admin=admin, status=FacultyProfile.VERIFIED,
+                               joined=timezone.now()) for user in facultyUsers], batch_size=BATCH_SIZE)
+            faculties = list(FacultyProfile.objects.filter(admin=admin).order_by('id').values_list('id', flat=True))
+
+            batchIds = []
+            for b in range(self.batches):
+                batch = Batch.objects.create(title=f'{SUBJECTS[b % len(SUBJECTS)]} {b}', admin=admin,
+                                             max_students=self.students * 2)
+                batchIds.append(batch.id)
+
+                emails = [synthetic_email('student', a, b, s) for s in range(self.students)]
+                studentUsers = self.create_users(emails, CustomUser.STUDENT)
+                StudentProfile.objects.bulk_create([StudentProfile(name=self.name(), user_id=user, batch=batch)
+                                                    for user in studentUsers], batch_size=BATCH_SIZE)
+                userIds.extend(studentUsers)
+
+                #A faculty of its own for every (hour, batch), so nobody teaches two classes at once.
+                Slot.objects.bulk_create([
+                    Slot(title=f'{SUBJECTS[(b + hour) % len(SUBJECTS)]} Lecture', weekday=weekday, batch=batch,
+                         start_time=clock(hour=8 + hour), end_time=clock(hour=9 + hour),
+                         faculty_id=faculties[hour * self.batches + b])
+                    for weekday in range(6) for hour in range(self.slots_per_day)], batch_size=BATCH_SIZE)
+
+            self.generate_broadcasts(adminUser, facultyUsers, batchIds)
+            userIds.extend([adminUser, *facultyUsers])
+            self.log(f'Generated institute {a}.')
+
+        Activity.objects.bulk_create([
+            Activity(user_id=user, text=f'Synthetic activity {index}', read=self.random.random() < 0.7)
+            for user in userIds for index in range(self.activities)], batch_size=BATCH_SIZE)
+
+        Batch.objects.repair_counters()
+        BatchAssignment.rebuild()
+        if search.is_available():
+            for index in search.INDEXES.values():
+                index.rebuild()
+        return len(userIds)
+
+    def generate_broadcasts(self, adminUser, facultyUsers, batchIds):
+        from StudentUser.models import StudentProfile
+        from .models import Broadcast, Message
+
+        studentsByBatch = defaultdict(list)
+        for batch, user in StudentProfile.objects.filter(batch__in=batchIds).values_list('batch', 'user'):
+            studentsByBatch[batch].append(user)
+
+        messages = []
+        for index in range(self.broadcasts):
+            #Mostly sent by the admin to a batch, otherwise by a faculty.
+            sender = adminUser if index % 3 else self.random.choice(facultyUsers)
+            broadcast = Broadcast.objects.create(sender_id=sender, text=f'Synthetic announcement {index}')
+            receivers = set(studentsByBatch[self.random.choice(batchIds)])
+            if sender == adminUser:
+                receivers.update(facultyUsers)
+            messages.extend(Message(broadcast=broadcast, receiver_id=receiver, read=self.random.random() < 0.5)
+                            for receiver in receivers)
+        Message.objects.bulk_create(messages, batch_size=BATCH_SIZE)
+
+
+""" Load driver """
+
+#Relative weight of every endpoint in the default mix.
+DEFAULT_MIX = {
+    'login': 5,
+    'student-timeline': 25,
+    'faculty-timeline': 15,
+    'show-activity': 20,
+    'show-broadcast': 15,
+    'batch-detail': 10,
+    'broadcast-send': 5,
+}
+
+
+def percentile(values, percent):
+    """
+    Nearest rank percentile of sorted 'values'.
+    """
+    if not values:
+        return None
+    rank = max(1, round(percent / 100 * len(values)))
+    return values[min(rank, len(values)) - 1]
+
+
+class InProcessTransport:
+    """
+    Drives the Django test client, so queries per request can be counted.
+    """
+    counts_queries = True
+
+    def __init__(self):
+        self.client = Client()
+
+    def send(self, method, path, data, token):
+        headers = {'HTTP_AUTHORIZATION': f'Token {token}'} if token else {}
+        with CaptureQueriesContext(connection) as queries:
+            if method == 'GET':
+                response = self.client.get(path, data, **headers)
+            else:
+                response = self.client.post(path, json.dumps(data), content_type='application/json', **headers)
+        return response.status_code, response.content, len(queries)
+
+
+class HTTPTransport:
+    """
+    Drives a running server, queries are only known to the server.
+    """
+    counts_queries = False
+
+    def __init__(self, url):
+        self.url = url.rstrip('/')
+
+    def send(self, method, path, data, token):
+        headers = {'Content-Type': 'application/json'}
+        if token:
+            headers['Authorization'] = f'Token {token}'
+        if method == 'GET':
+            req = urlrequest.Request(f'{self.url}{path}?{urlencode(data or {})}', headers=headers)
+        else:
+            req = urlrequest.Request(f'{self.url}{path}', data=json.dumps(data).encode(),
+                                     headers=headers, method=method)
+        try:
+            with urlrequest.urlopen(req) as response:
+                return response.status, response.read(), None
+        except HTTPError as err:
+            return err.code, err.read(), None
+
+
+class LoadDriver:
+
+    def __init__(self, transport, *, mix, password, seed, actors=20):
+        self.transport = transport
+        self.mix = mix
+        self.password = password
+        self.random = random.Random(seed)
+        self.actors = actors
+        self.lock = threading.Lock()
+        self.samples = defaultdict(list)
+        self.queries = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def login(self, email):
+        status, content, _ = self.transport.send('POST', '/api/login/',
+                                                 {'email': email, 'password': self.password}, None)
+        if status != 200:
+            raise RuntimeError(f'Could not login as {email}: {content[:200]!r}')
+        return json.loads(content)['data']['token']
+
+    def prepare(self):
+        """
+        Logs in a sample of every role, scenarios then pick one of them at random.
+        """
+        from .models import Batch, CustomUser
+
+        users = CustomUser.objects.filter(email__endswith=f'@{SYNTHETIC_DOMAIN}')
+        self.tokens = {}
+        for role in (CustomUser.ADMIN, CustomUser.FACULTY, CustomUser.STUDENT):
+            emails = list(users.filter(user_type=role).order_by('id').values_list('email', flat=True))
+            emails = self.random.sample(emails, min(self.actors, len(emails)))
+            if not emails:
+                raise RuntimeError('No synthetic institutes found, run generate_institutes first.')
+            self.tokens[role] = [(email, self.login(email)) for email in emails]
+
+        adminEmails = [email for email, _ in self.tokens[CustomUser.ADMIN]]
+        self.batches = defaultdict(list)
+        for email, batch in Batch.objects.filter(admin__user__email__in=adminEmails)\
+                                    .values_list('admin__user__email', 'uuid'):
+            self.batches[email].append(str(batch))
+
+    def pick(self, role):
+        return self.random.choice(self.tokens[role])
+
+    def build(self, scenario):
+        """
+        Returns (method, path, data, token) of a request for 'scenario'.
+        """
+        from .models import CustomUser
+
+        if scenario == 'login':
+            role = self.random.choice(list(self.tokens))
+            return 'POST', '/api/login/', {'email': self.pick(role)[0], 'password': self.password}, None
+        if scenario == 'student-timeline':
+            return 'GET', '/api/student/timeline/', None, self.pick(CustomUser.STUDENT)[1]
+        if scenario == 'faculty-timeline':
+            return 'GET', '/api/faculty/timeline/', None, self.pick(CustomUser.FACULTY)[1]
+        if scenario == 'show-activity':
+            role = self.random.choice(list(self.tokens))
+            return 'GET', '/api/show-activity/', {'page': 1}, self.pick(role)[1]
+        if scenario == 'show-broadcast':
+            role = self.random.choice([CustomUser.FACULTY, CustomUser.STUDENT])
+            return 'GET', '/api/show-broadcast/', None, self.pick(role)[1]
+
+        email, token = self.pick(CustomUser.ADMIN)
+        batch = self.random.choice(self.batches[email])
+        if scenario == 'batch-detail':
+            return 'GET', f'/api/admin/batch/{batch}/', None, token
+        if scenario == 'broadcast-send':
+            return 'POST', '/api/admin/broadcast/', {'text': 'Load test announcement', 'target': batch}, token
+        raise ValueError(f'Unknown scenario {scenario}')
+
+    def run_one(self):
+        with self.lock:
+            scenario = self.random.choices(list(self.mix), weights=list(self.mix.values()))[0]
+            method, path, data, token = self.build(scenario)
+
+        start = time.perf_counter()
+        status, _, queries = self.transport.send(method, path, data, token)
+        elapsed = time.perf_counter() - start
+
+        with self.lock:
+            self.samples[scenario].append(elapsed * 1000)
+            if queries is not None:
+                self.queries[scenario].append(queries)
+            if status >= 400:
+                self.errors[scenario] += 1
+
+    def run(self, requests, concurrency=1, warmup=0):
+        for _ in range(warmup):
+            self.run_one()
+        self.samples.clear()
+        self.queries.clear()
+        self.errors.clear()
+
+        start = time.perf_counter()
+        if concurrency == 1:
+            for _ in range(requests):
+                self.run_one()
+        else:
+            from concurrent.futures import ThreadPoolExecutor
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                list(pool.map(lambda _: self.run_one(), range(requests)))
+        return self.report(time.perf_counter() - start)
+
+    def summarize(self, latencies, queries, errors):
+        latencies = sorted(latencies)
+        return {'requests': len(latencies),
+                'errors': errors,
+                'p50_ms': round(percentile(latencies, 50), 2),
+                'p95_ms': round(percentile(latencies, 95), 2),
+                'p99_ms': round(percentile(latencies, 99), 2),
+                'mean_queries': round(sum(queries) / len(queries), 2) if queries else None,
+                'max_queries': max(queries) if queries else None}
+
+    def report(self, elapsed):
+        endpoints = {scenario: self.summarize(self.samples[scenario], self.queries[scenario],
+                                              self.errors[scenario])
+                     for scenario in self.mix if self.samples[scenario]}
+        allLatencies = [latency for samples in self.samples.values() for latency in samples]
+        allQueries = [count for counts in self.queries.values() for count in counts]
+        total = self.summarize(allLatencies, allQueries, sum(self.errors.values()))
+        total['throughput_rps'] = round(len(allLatencies) / elapsed, 1)
+        total['elapsed_s'] = round(elapsed, 2)
+        return {'endpoints': endpoints, 'total': total}
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from base.retention import RetentionEngine
+
+
+class Command(BaseCommand):
+    help = ('Applies the Activity/Message retention policies, archives old broadcasts '
+            '& purges expired revoked tokens.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=None,
+                            help='Rows deleted per transaction (defaults to RETENTION_CHUNK_SIZE).')
+        parser.add_argument('--pause', type=float, default=0,
+                            help='Seconds to sleep between chunks to let other writers in.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report what would be deleted.')
+        parser.add_argument('--skip-archive', action='store_true',
+                            help='Dont roll old broadcasts into the archive table.')
+
+    def handle(self, *args, **options):
+        engine = RetentionEngine(chunk_size=options['chunk_size'], pause=options['pause'],
+                                 dry_run=options['dry_run'])
+        prefix = '[DRY RUN] ' if options['dry_run'] else ''
+
+        if not options['skip_archive']:
+            archived = engine.archive_broadcasts()
+            self.stdout.write(f'{prefix}Archived {archived} broadcasts.')
+
+        for name, apply in (('activities', engine.apply_activity_retention),
+                            ('messages', engine.apply_message_retention)):
+            deleted = apply()
+            self.stdout.write(f"{prefix}Deleted {sum(deleted.values())} {name} "
+                              f"(age: {deleted['age']}, read: {deleted['read']}, per user cap: {deleted['cap']}).")
+
+        purged = engine.purge_revoked_tokens()
+        self.stdout.write(f'{prefix}Purged {purged} expired revoked tokens.')
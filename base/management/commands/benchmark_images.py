@@ -0,0 +1,109 @@
+import os
+import time
+import shutil
+import resource
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image
+
+from django.core.management.base import BaseCommand
+
+from base import images
+
+
+def full_decode(raw_path, main_path, thumbnail_path):
+    """
+    What uploads used to cost, the whole image is decoded before resizing.
+    """
+    with Image.open(raw_path) as img:
+        img_format = img.format
+        img.load()
+
+        main = img.copy()
+        main.thumbnail(images.MAIN_SIZE, Image.LANCZOS)
+        images.save_image(main, main_path, img_format, quality=images.MAIN_QUALITY)
+
+        img.thumbnail(images.THUMBNAIL_SIZE, Image.LANCZOS)
+        images.save_image(img, thumbnail_path, img_format)
+
+
+def reduced_decode(raw_path, main_path, thumbnail_path):
+    images.process_profile_image(raw_path, main_path, thumbnail_path, {})
+
+
+STRATEGIES = {'full': full_decode, 'reduced': reduced_decode}
+
+
+def get_peak_rss():
+    """
+    Peak RSS of the current process in KB, VmHWM is preferred since
+    Linux carries ru_maxrss over from the parent across fork/exec.
+    """
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def measure(strategy, raw_path, output_dir):
+    """
+    Runs in a fresh process, so the peak only covers this single decode.
+    """
+    baseline = get_peak_rss()
+    start = time.perf_counter()
+    _, extension = os.path.splitext(raw_path)
+    STRATEGIES[strategy](raw_path, os.path.join(output_dir, f'main{extension}'),
+                         os.path.join(output_dir, f'thumbnail{extension}'))
+    elapsed = time.perf_counter() - start
+    peak = get_peak_rss()
+    return elapsed, peak, peak - baseline
+
+
+class Command(BaseCommand):
+    help = 'Compares peak RSS & time of full vs reduced decoding of large profile images.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--megapixels', type=int, nargs='+', default=[12, 24, 40],
+                            help='Sizes of the generated test images.')
+        parser.add_argument('--formats', nargs='+', default=['JPEG', 'PNG'],
+                            help='Pillow formats of the generated test images.')
+        parser.add_argument('--repeat', type=int, default=3,
+                            help='Runs per image & strategy, the fastest one is reported.')
+
+    def generate(self, directory, megapixels, img_format):
+        #4:3 like most phone cameras.
+        width = int((megapixels * 10**6 * 4 / 3) ** 0.5)
+        height = megapixels * 10**6 // width
+        path = os.path.join(directory, f'{megapixels}mp.{img_format.lower()}')
+        img = Image.merge('RGB', [Image.linear_gradient('L').resize((width, height)),
+                                  Image.radial_gradient('L').resize((width, height)),
+                                  Image.effect_noise((width, height), 64)])
+        img.save(path, img_format)
+        return path, img.size
+
+    def handle(self, *args, **options):
+        directory = tempfile.mkdtemp()
+        #Every measurement gets a brand new process, otherwise peak RSS carries over.
+        context = multiprocessing.get_context('spawn')
+        try:
+            self.stdout.write(f"{'image':<22}{'strategy':<10}{'time (s)':>10}{'peak RSS (MB)':>16}{'growth (MB)':>14}")
+            for img_format in options['formats']:
+                for megapixels in options['megapixels']:
+                    path, size = self.generate(directory, megapixels, img_format)
+                    label = f"{img_format} {size[0]}x{size[1]}"
+                    for strategy in STRATEGIES:
+                        results = []
+                        for _ in range(options['repeat']):
+                            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                                results.append(pool.submit(measure, strategy, path, directory).result())
+                        elapsed, peak, growth = min(results)
+                        self.stdout.write(f'{label:<22}{strategy:<10}{elapsed:>10.2f}'
+                                          f'{peak / 1024:>16.1f}{growth / 1024:>14.1f}')
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
@@ -0,0 +1,67 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from base.images import get_avatar_names
+from base.models import CustomUser, ImageJob
+from base.storage import content_storage
+
+
+class Command(BaseCommand):
+    help = 'Deletes profile images that are no longer referenced by any user or pending upload.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-age', type=float, default=3600,
+                            help='Seconds a file has to be untouched for, so in flight uploads are kept.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report what would be deleted.')
+
+    def get_referenced(self):
+        referenced = {settings.PROFILE_IMAGE_PLACEHOLDER}
+        users = CustomUser.objects.values_list('profile_image', 'thumbnail', 'user_type', 'avatar_key')
+        for profile_image, thumbnail, user_type, avatar_key in users.iterator():
+            referenced.update(name for name in (profile_image, thumbnail) if name)
+            if avatar_key:
+                referenced.update(get_avatar_names(user_type, avatar_key).values())
+
+        referenced.update(ImageJob.objects.values_list('raw_image', flat=True).iterator())
+        return referenced
+
+    def scan(self, path):
+        """
+        Yields every file below 'path' without ever listing a whole directory in memory.
+        """
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    yield from self.scan(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    yield entry
+
+    def handle(self, *args, **options):
+        root = content_storage.path('profile_images')
+        if not os.path.isdir(root):
+            return
+
+        #Loaded before scanning, so anything referenced later is younger than 'min_age'.
+        referenced = self.get_referenced()
+        cutoff = time.time() - options['min_age']
+        prefix = '[DRY RUN] ' if options['dry_run'] else ''
+
+        deleted, freed = 0, 0
+        for entry in self.scan(root):
+            name = os.path.relpath(entry.path, content_storage.location).replace(os.sep, '/')
+            if name in referenced:
+                continue
+            stat = entry.stat(follow_symlinks=False)
+            if stat.st_mtime > cutoff:
+                continue
+
+            if not options['dry_run']:
+                os.remove(entry.path)
+            deleted += 1
+            freed += stat.st_size
+
+        self.stdout.write(f'{prefix}Deleted {deleted} orphaned files ({freed / 1024**2:.1f} MB).')
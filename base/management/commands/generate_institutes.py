@@ -0,0 +1,43 @@
+import time
+
+from django.db import transaction
+from django.core.management.base import BaseCommand, CommandError
+
+from base import loadtest
+
+
+class Command(BaseCommand):
+    help = (f'Generates synthetic institutes (admins, batches, faculties, students, weekly slots, '
+            f'broadcasts & activities) for load testing, every user is under @{loadtest.SYNTHETIC_DOMAIN}.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--admins', type=int, default=2)
+        parser.add_argument('--batches', type=int, default=6, help='Batches per admin.')
+        parser.add_argument('--faculties', type=int, default=24,
+                            help='Faculties per admin, atleast batches x slots per day.')
+        parser.add_argument('--students', type=int, default=300, help='Students per batch.')
+        parser.add_argument('--slots-per-day', type=int, default=4, help='Slots per batch & weekday.')
+        parser.add_argument('--broadcasts', type=int, default=50, help='Broadcasts per admin.')
+        parser.add_argument('--activities', type=int, default=30, help='Activities per user.')
+        parser.add_argument('--password', default='password', help='Password of every synthetic user.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--clear', action='store_true',
+                            help='Delete previously generated institutes first.')
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            self.stdout.write(f'Deleted {loadtest.clear_institutes()} synthetic users.')
+
+        try:
+            generator = loadtest.InstituteGenerator(
+                admins=options['admins'], batches=options['batches'], faculties=options['faculties'],
+                students=options['students'], slots_per_day=options['slots_per_day'],
+                broadcasts=options['broadcasts'], activities=options['activities'],
+                password=options['password'], seed=options['seed'], stdout=self.stdout)
+        except ValueError as err:
+            raise CommandError(err)
+
+        start = time.perf_counter()
+        with transaction.atomic():
+            total = generator.generate()
+        self.stdout.write(f'Generated {total} users in {time.perf_counter() - start:.1f}s.')
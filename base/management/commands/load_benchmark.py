@@ -0,0 +1,89 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from base import loadtest
+
+
+class Command(BaseCommand):
+    help = ('Replays a weighted mix of endpoints as synthetic users (see generate_institutes) & '
+            'reports latency percentiles, queries per request and throughput.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--warmup', type=int, default=20, help='Requests that are not measured.')
+        parser.add_argument('--url', help='Base URL of a running server, the test client is used otherwise.')
+        parser.add_argument('--concurrency', type=int, default=1, help='Only used along with --url.')
+        parser.add_argument('--mix', help="Endpoint weights i.e 'login=5,student-timeline=25', "
+                                          f"defaults to {loadtest.DEFAULT_MIX}.")
+        parser.add_argument('--password', default='password', help='Password of the synthetic users.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Write the results as a JSON baseline.')
+        parser.add_argument('--compare', help='JSON baseline to compare the results with.')
+
+    def get_mix(self, mix):
+        if not mix:
+            return loadtest.DEFAULT_MIX
+        try:
+            weights = {name: int(weight) for name, weight in (item.split('=') for item in mix.split(','))}
+        except ValueError:
+            raise CommandError("--mix should look like 'login=5,student-timeline=25'.")
+        unknown = set(weights) - set(loadtest.DEFAULT_MIX)
+        if unknown:
+            raise CommandError(f"Unknown endpoints {', '.join(sorted(unknown))}.")
+        return weights
+
+    def handle(self, *args, **options):
+        if options['url']:
+            transport = loadtest.HTTPTransport(options['url'])
+            concurrency = options['concurrency']
+        else:
+            #The test client & its connection can't be shared between threads.
+            transport = loadtest.InProcessTransport()
+            concurrency = 1
+
+        driver = loadtest.LoadDriver(transport, mix=self.get_mix(options['mix']),
+                                     password=options['password'], seed=options['seed'])
+        try:
+            driver.prepare()
+        except RuntimeError as err:
+            raise CommandError(str(err))
+
+        results = driver.run(options['requests'], concurrency=concurrency, warmup=options['warmup'])
+        results['meta'] = {'transport': 'http' if options['url'] else 'in-process',
+                           'concurrency': concurrency, 'seed': options['seed']}
+        self.print_results(results)
+
+        if options['compare']:
+            with open(options['compare']) as baseline:
+                self.print_comparison(results, json.load(baseline))
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2)
+            self.stdout.write(f"Baseline written to {options['output']}.")
+
+    def print_results(self, results):
+        self.stdout.write(f"{'endpoint':<18}{'requests':>9}{'errors':>8}{'p50 ms':>9}{'p95 ms':>9}"
+                          f"{'p99 ms':>9}{'queries':>9}")
+        rows = list(results['endpoints'].items()) + [('total', results['total'])]
+        for name, stats in rows:
+            queries = stats['mean_queries']
+            self.stdout.write(f"{name:<18}{stats['requests']:>9}{stats['errors']:>8}{stats['p50_ms']:>9.1f}"
+                              f"{stats['p95_ms']:>9.1f}{stats['p99_ms']:>9.1f}"
+                              f"{'-' if queries is None else f'{queries:.1f}':>9}")
+        self.stdout.write(f"Throughput: {results['total']['throughput_rps']} requests/s "
+                          f"over {results['total']['elapsed_s']}s.")
+
+    def print_comparison(self, results, baseline):
+        self.stdout.write(f"{'endpoint':<18}{'p50 change':>12}{'p95 change':>12}{'queries change':>16}")
+        rows = list(results['endpoints'].items()) + [('total', results['total'])]
+        for name, stats in rows:
+            before = baseline['total'] if name == 'total' else baseline['endpoints'].get(name)
+            if before is None:
+                continue
+            changes = [f"{(stats[key] - before[key]) / before[key] * 100:+.1f}%" if before[key] else '-'
+                       for key in ('p50_ms', 'p95_ms')]
+            queries = '-'
+            if stats['mean_queries'] is not None and before['mean_queries'] is not None:
+                queries = f"{stats['mean_queries'] - before['mean_queries']:+.1f}"
+            self.stdout.write(f'{name:<18}{changes[0]:>12}{changes[1]:>12}{queries:>16}')
@@ -0,0 +1,63 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from base import microbench
+
+
+class Command(BaseCommand):
+    help = ('Times the scheduling primitives (overlap detection, timelines, slot serializers, '
+            'pagination & error handling) for several slot counts & compares them with a saved baseline.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--slots', type=int, nargs='+', default=[10, 100, 500],
+                            help=f'Slots in the batch, atmost {microbench.MAX_SLOTS}.')
+        parser.add_argument('--repeat', type=int, default=20, help='Samples per benchmark.')
+        parser.add_argument('--warmup', type=int, default=3, help='Calls that are not measured.')
+        parser.add_argument('--min-time', type=float, default=0.02,
+                            help='Seconds a sample should take atleast, calls are batched until it does.')
+        parser.add_argument('--only', nargs='+', metavar='BENCHMARK',
+                            help=f"Benchmarks to run, out of {', '.join(microbench.BENCHMARKS)}.")
+        parser.add_argument('--output', help='Write the results as a JSON baseline.')
+        parser.add_argument('--compare', help='JSON baseline to compare the results with.')
+        parser.add_argument('--threshold', type=float, default=5.0,
+                            help='Smallest change (in percent) of the median that is reported as significant.')
+
+    #Query logging of DEBUG would be measured along with every query.
+    @override_settings(DEBUG=False)
+    def handle(self, *args, **options):
+        if any(slots < 1 or slots > microbench.MAX_SLOTS for slots in options['slots']):
+            raise CommandError(f'--slots should be between 1 and {microbench.MAX_SLOTS}.')
+        if options['repeat'] < 2:
+            raise CommandError('--repeat should be atleast 2 to report a standard deviation.')
+        unknown = set(options['only'] or []) - set(microbench.BENCHMARKS)
+        if unknown:
+            raise CommandError(f"Unknown benchmarks {', '.join(sorted(unknown))}.")
+
+        results = microbench.run_benchmarks(options['slots'], names=options['only'], repeat=options['repeat'],
+                                            warmup=options['warmup'], min_time=options['min_time'])
+        self.print_results(results)
+
+        if options['compare']:
+            with open(options['compare']) as baseline:
+                self.print_comparison(microbench.compare(results, json.load(baseline)['results'],
+                                                         options['threshold']))
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump({'results': results, 'meta': {'repeat': options['repeat'], 'warmup': options['warmup'],
+                                                        'min_time': options['min_time']}}, output, indent=2)
+            self.stdout.write(f"Baseline written to {options['output']}.")
+
+    def print_results(self, results):
+        self.stdout.write(f"{'benchmark':<42}{'slots':>6}{'mean us':>12}{'stdev us':>11}{'median us':>12}"
+                          f"{'p95 us':>12}{'min us':>12}")
+        for name, runs in results.items():
+            for slots, stats in runs.items():
+                self.stdout.write(f"{name:<42}{slots:>6}{stats['mean_us']:>12.1f}{stats['stdev_us']:>11.1f}"
+                                  f"{stats['median_us']:>12.1f}{stats['p95_us']:>12.1f}{stats['min_us']:>12.1f}")
+
+    def print_comparison(self, changes):
+        self.stdout.write(f"{'benchmark':<42}{'slots':>6}{'before us':>12}{'after us':>12}{'change':>9}  verdict")
+        for name, slots, before, after, change, verdict in changes:
+            self.stdout.write(f'{name:<42}{slots:>6}{before:>12.1f}{after:>12.1f}{change:>+8.1f}%  {verdict}')
@@ -0,0 +1,61 @@
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from base import images, metrics
+from base.storage import content_storage
+
+
+class Command(BaseCommand):
+    help = 'Worker that resizes uploaded profile images & generates their thumbnails/avatars.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=settings.IMAGE_WORKERS,
+                            help='Size of the process pool.')
+        parser.add_argument('--batch-size', type=int, default=20,
+                            help='Jobs claimed from the queue at once.')
+        parser.add_argument('--poll-interval', type=float, default=2,
+                            help='Seconds to wait when the queue is empty.')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit once the queue is empty.')
+
+    def handle(self, *args, **options):
+        images.ensure_placeholder()
+
+        with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+            while True:
+                jobs = images.claim_jobs(options['batch_size'])
+                if not jobs:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+
+                self.process(pool, jobs)
+
+    def process(self, pool, jobs):
+        futures = {}
+        for job in jobs:
+            main_name, thumbnail_name, avatar_key = images.get_output_names(job)
+            avatarPaths = images.get_missing_avatars(job.user.user_type, avatar_key)
+            future = pool.submit(images.process_profile_image, job.raw_image.path,
+                                 content_storage.path(main_name), content_storage.path(thumbnail_name),
+                                 avatarPaths)
+            futures[future] = (job, main_name, thumbnail_name, avatar_key)
+
+        for future in as_completed(futures):
+            job, main_name, thumbnail_name, avatar_key = futures[future]
+            try:
+                elapsed = future.result()
+            except Exception as err:
+                images.fail_job(job, repr(err))
+                metrics.IMAGE_JOBS.inc(outcome='failed')
+                self.stderr.write(f'Failed processing image of {job.user.email}: {err!r}')
+            else:
+                images.finish_job(job, main_name, thumbnail_name, avatar_key)
+                metrics.IMAGE_PROCESSING.observe(elapsed)
+                metrics.IMAGE_JOBS.inc(outcome='processed')
+                self.stdout.write(f'Processed image of {job.user.email}')
+        metrics.flush()
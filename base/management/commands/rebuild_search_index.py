@@ -0,0 +1,17 @@
+from django.db import transaction
+from django.core.management.base import BaseCommand, CommandError
+
+from base import search
+
+
+class Command(BaseCommand):
+    help = 'Repopulates the full text search indexes of faculties, students & batches.'
+
+    def handle(self, *args, **options):
+        if not search.is_available():
+            raise CommandError('Search indexes are missing, run migrate on an SQLite build with FTS5.')
+
+        for index in search.INDEXES.values():
+            with transaction.atomic():
+                index.rebuild()
+            self.stdout.write(f'Rebuilt {index.name}.')
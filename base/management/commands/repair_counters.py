@@ -0,0 +1,26 @@
+from django.db import transaction
+from django.core.management.base import BaseCommand
+
+from base.models import Batch, BatchAssignment
+
+
+class Command(BaseCommand):
+    help = ('Recomputes the denormalized Batch student/slot counters & '
+            'the BatchAssignment table from their source tables.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report how many batches have drifted counters.')
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            drifted = Batch.objects.drifted().count()
+            self.stdout.write(f'[DRY RUN] Counters of {drifted} batches have drifted.')
+            return
+
+        with transaction.atomic():
+            repaired = Batch.objects.repair_counters()
+        self.stdout.write(f'Repaired counters of {repaired} batches.')
+
+        BatchAssignment.rebuild()
+        self.stdout.write('Rebuilt batch assignments.')
@@ -0,0 +1,42 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from base import slowqueries
+
+
+class Command(BaseCommand):
+    help = ('Aggregates the slow query log (& its rotated files) by normalized SQL, '
+            'along with the views & code the queries came from & their query plans.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file', default=settings.SLOW_QUERY_LOG['FILE'], help='Slow query log to read, the files of every process (FILE-<pid>) are read.')
+        parser.add_argument('--limit', type=int, default=10, help='Number of queries to show.')
+        parser.add_argument('--sort', choices=['total', 'count', 'mean', 'max'], default='total',
+                            help='Order of the queries, by their total/mean/max time or count.')
+        parser.add_argument('--view', help='Only queries of this URL name.')
+
+    def handle(self, *args, **options):
+        if not slowqueries.get_log_files(options['file']):
+            raise CommandError(f"No slow query log at {options['file']}.")
+
+        entries = slowqueries.read_entries(options['file'])
+        if options['view']:
+            entries = [entry for entry in entries if entry['view'] == options['view']]
+        summary = slowqueries.summarize(entries)
+        key = 'count' if options['sort'] == 'count' else f"{options['sort']}_ms"
+        summary.sort(key=lambda group: group[key], reverse=True)
+
+        self.stdout.write(f'{len(entries)} slow queries, {len(summary)} distinct.')
+        for group in summary[:options['limit']]:
+            self.stdout.write('')
+            self.stdout.write(f"{group['count']} x, total {group['total_ms']:.1f} ms, "
+                              f"mean {group['mean_ms']:.1f} ms, max {group['max_ms']:.1f} ms")
+            self.stdout.write(f"  {group['sql']}")
+            self.stdout.write(f"  views: {self.format_counts(group['views'])}")
+            self.stdout.write(f"  origins: {self.format_counts(group['origins'])}")
+            for row in group['plan'] or []:
+                self.stdout.write(f'  plan: {row}')
+
+    def format_counts(self, counts):
+        return ', '.join(f'{name} ({count})' for name, count in
+                         sorted(counts.items(), key=lambda item: item[1], reverse=True))
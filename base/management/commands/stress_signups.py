@@ -0,0 +1,71 @@
+import time
+import uuid
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connection
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from AdminUser.models import AdminProfile
+from StudentUser.models import StudentProfile
+from base.models import Batch, CustomUser
+
+
+class Command(BaseCommand):
+    help = ('Fires concurrent student signups at a throwaway batch & checks that seat '
+            'reservation never overshoots max_students. Everything created is deleted afterwards.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8,
+                            help='Concurrent signups, every worker uses its own connection.')
+        parser.add_argument('--signups', type=int, default=400,
+                            help='Total signup attempts.')
+        parser.add_argument('--max-students', type=int, default=250,
+                            help='Seats in the batch, keep it below --signups to exercise rejections.')
+
+    def signup(self, batch, prefix, index):
+        try:
+            StudentProfile.create_profile(name=f'student {index}', email=f'{prefix}{index}@stress.test',
+                                          password='password', batch=batch, receive_email_notification=False)
+            return 'admitted'
+        except DjangoValidationError:
+            return 'rejected'
+        except Exception as err:
+            self.stderr.write(f'Signup {index} failed: {err}')
+            return 'failed'
+        finally:
+            #Like a request (CONN_MAX_AGE is 0) every signup gets a fresh connection.
+            if threading.current_thread() is not threading.main_thread():
+                connection.close()
+
+    #Password hashing would dominate the timings, only seat reservation is of interest here.
+    @override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+    def handle(self, *args, **options):
+        prefix = f'stress-{uuid.uuid4().hex[:8]}-'
+        admin = AdminProfile.create_profile(name='stress', email=f'{prefix}admin@stress.test',
+                                            password='password', timezone='UTC')
+        batch = Batch.objects.create(title='stress', admin=admin, max_students=options['max_students'])
+        try:
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+                results = Counter(pool.map(lambda index: self.signup(batch, prefix, index),
+                                           range(options['signups'])))
+            elapsed = time.perf_counter() - start
+
+            batch.refresh_from_db()
+            students = StudentProfile.objects.filter(batch=batch).count()
+        finally:
+            CustomUser.objects.filter(email__startswith=prefix).delete()
+
+        self.stdout.write(f"{options['signups']} signups by {options['workers']} workers in {elapsed:.2f}s "
+                          f"({options['signups'] / elapsed:.0f}/s): {results['admitted']} admitted, "
+                          f"{results['rejected']} rejected, {results['failed']} failed.")
+        self.stdout.write(f"Seats: {students} students, counter {batch.student_count}, "
+                          f"max {batch.max_students}.")
+
+        #Failures (i.e lock timeouts) may happen after the signup committed, so only the seats are checked.
+        if students > batch.max_students or students != batch.student_count:
+            raise CommandError('Seat reservation overshot or lost count of the batch!')
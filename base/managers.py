@@ -4,7 +4,8 @@ from itertools import groupby
 from datetime import timedelta,datetime
 
 from django.db import models
-from django.db.models import Q
+from django.db.models import Q,F,Count,OuterRef,Prefetch,Subquery
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from django.core.exceptions import ValidationError as DjangoValidationError
 
@@ -142,11 +143,64 @@ class SlotManager(models.Manager):
 
 
 
-#TODO:Test for obsoleteness
+def count_subquery(queryset,field,outer='pk',counted='pk'):
+    """
+    Correlated COUNT of the rows of 'queryset' whose 'field' matches 'outer' of the outer row,
+    unlike annotate(Count()) multiple counts don't multiply each other's joined rows.
+    Distinct values of 'counted' are counted when it isn't the primary key.
+    """
+    counts = queryset.filter(**{field:OuterRef(outer)}).order_by().values(field)\
+                .annotate(total=Count(counted,distinct=counted != 'pk')).values('total')
+    return Coalesce(Subquery(counts,output_field=models.IntegerField()),0)
+
+
 class BatchQueryset(models.QuerySet):
-    pass
 
-class BatchManager(models.Manager):
-    def get_queryset(self):
-        return BatchQueryset(model=self.model, using=self._db)
+    def with_list_details(self):
+        """
+        The assigned faculties (along with their user) are prefetched into 'assigned_pairs',
+        so listing batches takes a fixed number of queries.
+        """
+        from .models import BatchAssignment
+
+        assignedPairs = BatchAssignment.objects.select_related('faculty__user').order_by('faculty__name')
+        return self.prefetch_related(Prefetch('assignments',queryset=assignedPairs,
+                                              to_attr='assigned_pairs'))
+
+    def with_broadcast_counts(self):
+        """
+        VERIFIED faculties teaching in every batch shown in the admin's broadcast composer.
+        """
+        from FacultyUser.models import FacultyProfile
+        from .models import BatchAssignment
+
+        verified = BatchAssignment.objects.filter(faculty__status=FacultyProfile.VERIFIED)
+        return self.annotate(faculties_count=count_subquery(verified,'batch'))
+
+    @staticmethod
+    def get_actual_counts():
+        """
+        Counters recomputed from the StudentProfile & Slot tables.
+        """
+        from StudentUser.models import StudentProfile
+        from .models import Slot
+
+        return {'student_count':count_subquery(StudentProfile.objects.all(),'batch'),
+                'slot_count':count_subquery(Slot.objects.all(),'batch')}
+
+    def drifted(self):
+        counts = self.get_actual_counts()
+        return self.annotate(actual_students=counts['student_count'],actual_slots=counts['slot_count'])\
+                   .exclude(student_count=F('actual_students'),slot_count=F('actual_slots'))
+
+    def repair_counters(self):
+        """
+        Set-wise UPDATE of the counters of every drifted batch, returns their number.
+        """
+        drifted = self.drifted().values('pk')
+        return self.model.objects.filter(pk__in=drifted).update(**self.get_actual_counts())
+
+
+class BatchManager(models.Manager.from_queryset(BatchQueryset)):
+    pass
 
@@ -0,0 +1,244 @@
+"""
+In-process metrics served by 'metrics_view' in the Prometheus text format.
+
+Counters & histograms are kept in memory by every process. With
+METRICS['DIRECTORY'] set, every process (WSGI workers, 'process_images')
+also writes a snapshot of its own values to that directory, atmost once
+per FLUSH_INTERVAL, and the endpoint sums the snapshots of all processes.
+Snapshots of exited processes are kept, so counters never go backwards,
+the directory should be emptied whenever the app is (re)deployed.
+"""
+
+import os
+import json
+import math
+import time
+import uuid
+import atexit
+import threading
+
+from django.conf import settings
+
+
+_lock = threading.Lock()
+REGISTRY = {}
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        #Label values -> value.
+        self.values = {}
+        REGISTRY[name] = self
+
+    def get_key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def collect(self):
+        return list(self.values.items())
+
+    def reset(self):
+        self.values = {}
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self.get_key(labels)
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class CallbackCounter(Counter):
+    """
+    Counter kept by somebody else, 'callback' returns {label values: value} when collected.
+    """
+    def __init__(self, name, documentation, labelnames, callback):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+
+    def collect(self):
+        return list(self.callback().items())
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=()):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self.get_key(labels)
+        with _lock:
+            #Non cumulative bucket counts, then sum & count.
+            counts = self.values.get(key)
+            if counts is None:
+                counts = self.values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            counts[-2] += value
+            counts[-1] += 1
+
+
+""" Metrics """
+
+REQUEST_DURATION = Histogram('trackr_request_duration_seconds', 'Request latency by URL name.',
+                             ('view', 'method'),
+                             buckets=(.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10))
+REQUEST_QUERIES = Histogram('trackr_request_queries', 'SQL queries per request by URL name.',
+                            ('view', 'method'), buckets=(1, 2, 4, 8, 16, 32, 64, 128))
+BROADCAST_RECEIVERS = Histogram('trackr_broadcast_receivers', 'Receivers of every broadcast.',
+                                ('sender',), buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000))
+IMAGE_PROCESSING = Histogram('trackr_image_processing_seconds',
+                             'Time the worker pool took to resize an upload & generate its variants.',
+                             buckets=(.05, .1, .25, .5, 1, 2.5, 5, 10, 30))
+IMAGE_JOBS = Counter('trackr_image_jobs_total', 'Image jobs finished by the worker.', ('outcome',))
+
+
+def get_auth_cache_lookups():
+    from .authentication import profile_cache
+
+    return {('hit',): profile_cache.hits, ('miss',): profile_cache.misses}
+
+AUTH_CACHE_LOOKUPS = CallbackCounter('trackr_auth_cache_lookups_total',
+                                     'Token -> profile cache lookups, hit ratio is hit / (hit + miss).',
+                                     ('result',), get_auth_cache_lookups)
+
+
+""" Multi-process snapshots """
+
+_process = {'token': None, 'flushed': 0.0}
+
+
+def get_directory():
+    return getattr(settings, 'METRICS', {}).get('DIRECTORY')
+
+
+def get_snapshot():
+    with _lock:
+        return {name: {'type': metric.type, 'help': metric.documentation, 'labels': metric.labelnames,
+                       'buckets': [str(bound) for bound in getattr(metric, 'buckets', ())],
+                       'values': [[list(key), value] for key, value in metric.collect()]}
+                for name, metric in REGISTRY.items()}
+
+
+def flush(force=False):
+    """
+    Writes the snapshot of this process, unless it was written less than FLUSH_INTERVAL ago.
+    """
+    directory = get_directory()
+    if directory is None:
+        return
+    now = time.monotonic()
+    if not force and now - _process['flushed'] < settings.METRICS['FLUSH_INTERVAL']:
+        return
+    _process['flushed'] = now
+
+    if _process['token'] is None:
+        _process['token'] = f'{os.getpid()}-{uuid.uuid4().hex[:8]}'
+    path = os.path.join(directory, f"{_process['token']}.json")
+    #Readers never see a partially written snapshot.
+    temporary = f'{path}.tmp'
+    with open(temporary, 'w') as output:
+        json.dump(get_snapshot(), output)
+    os.replace(temporary, path)
+
+
+def get_snapshots():
+    directory = get_directory()
+    if directory is None:
+        return [get_snapshot()]
+
+    flush(force=True)
+    snapshots = []
+    for name in os.listdir(directory):
+        if name.endswith('.json'):
+            try:
+                with open(os.path.join(directory, name)) as snapshot:
+                    snapshots.append(json.load(snapshot))
+            except (OSError, ValueError):
+                continue
+    return snapshots
+
+
+def aggregate(snapshots):
+    """
+    Sums the values of every metric across 'snapshots', {name: (description, {label values: value})}.
+    """
+    metrics = {}
+    for snapshot in snapshots:
+        for name, metric in snapshot.items():
+            _, values = metrics.setdefault(name, (metric, {}))
+            for key, value in metric['values']:
+                key = tuple(key)
+                current = values.get(key)
+                if current is None:
+                    values[key] = value
+                elif isinstance(value, list):
+                    values[key] = [a + b for a, b in zip(current, value)]
+                else:
+                    values[key] = current + value
+    return metrics
+
+
+def escape(value):
+    return value.replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def format_labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in pairs) + '}'
+
+
+def format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(snapshots=None):
+    lines = []
+    for name, (metric, values) in sorted(aggregate(get_snapshots() if snapshots is None else snapshots).items()):
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        for key, value in sorted(values.items()):
+            if metric['type'] != 'histogram':
+                lines.append(f"{name}{format_labels(metric['labels'], key)} {format_value(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(metric['buckets'], value):
+                cumulative += count
+                le = format_value(float(bound))
+                lines.append(f"{name}_bucket{format_labels(metric['labels'], key, [('le', le)])} {cumulative}")
+            lines.append(f"{name}_sum{format_labels(metric['labels'], key)} {format_value(value[-2])}")
+            lines.append(f"{name}_count{format_labels(metric['labels'], key)} {value[-1]}")
+    return '\n'.join(lines) + '\n'
+
+
+def reset():
+    for metric in REGISTRY.values():
+        metric.reset()
+
+
+def after_fork():
+    #A forked child starts empty & with its own snapshot, otherwise the parent's values are counted twice.
+    from .authentication import profile_cache
+
+    reset()
+    profile_cache.hits = profile_cache.misses = 0
+    _process.update(token=None, flushed=0.0)
+
+os.register_at_fork(after_in_child=after_fork)
+atexit.register(lambda: flush(force=True))
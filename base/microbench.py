@@ -0,0 +1,296 @@
+"""
+Micro-benchmarks of the scheduling primitives used by 'micro_benchmark'.
+
+Every benchmark runs against a throwaway batch with a given number of slots
+(rolled back afterwards) and a pinned clock, so runs are repeatable. Timings
+are per call: warm-up calls first, then the number of calls per sample is
+calibrated to take atleast 'min_time' & 'repeat' samples are collected.
+Serializers get already fetched slots, so only their own cost is measured,
+queryset primitives include their queries like the views do.
+"""
+
+import gc
+import math
+import time
+import statistics
+from unittest import mock
+from datetime import datetime, time as clock
+
+import pytz
+
+from django.db import transaction
+from django.test import RequestFactory
+from django.utils import timezone
+
+from rest_framework.exceptions import ValidationError
+from rest_framework.request import Request
+
+from .loadtest import percentile
+
+
+#10 minute slots (9 minutes long) from midnight, on every weekday.
+SLOT_MINUTES = 10
+MAX_SLOTS = 7 * 24 * 60 // SLOT_MINUTES
+TIMEZONE = 'Asia/Kolkata'
+#Wednesday 00:05 in TIMEZONE, the first slot of the day is ongoing.
+PINNED_NOW = pytz.timezone(TIMEZONE).localize(datetime(2024, 1, 3, 0, 5)).astimezone(pytz.utc)
+
+BENCHMARKS = {}
+
+
+def benchmark(name, scales=True):
+    """
+    Registers a benchmark, the decorated function gets the fixture & returns the callable to time.
+    Benchmarks which don't depend on the number of slots (scales=False) only run once.
+    """
+    def register(setup):
+        BENCHMARKS[name] = (setup, scales)
+        return setup
+    return register
+
+
+def get_slot_times(index):
+    day, position = divmod(index, 24 * 60 // SLOT_MINUTES)
+    start = position * SLOT_MINUTES
+    return day, clock(start // 60, start % 60), clock((start + SLOT_MINUTES - 1) // 60,
+                                                      (start + SLOT_MINUTES - 1) % 60)
+
+
+class Fixture:
+    """
+    An admin with a batch, 3 verified faculties & 'slots' slots spread across the week.
+    """
+
+    def __init__(self, slots):
+        from AdminUser.models import AdminProfile
+        from FacultyUser.models import FacultyProfile
+        from .models import Batch, CustomUser, Slot
+
+        self.admin = AdminProfile.create_profile(name='bench', email='admin@microbench.test',
+                                                 password=None, timezone=TIMEZONE)
+        self.batch = Batch.objects.create(title='bench', admin=self.admin)
+        self.faculties = []
+        for index in range(3):
+            user = CustomUser.objects.create(email=f'faculty{index}@microbench.test',
+                                             user_type=CustomUser.FACULTY)
+            self.faculties.append(FacultyProfile.objects.create(user=user, admin=self.admin, name=f'Faculty {index}',
+                                                                status=FacultyProfile.VERIFIED,
+                                                                joined=timezone.now()))
+
+        #Slots are spread over the weekdays first, so every day has some.
+        rows = []
+        for index in range(slots):
+            position, weekday = divmod(index, 7)
+            _, startTime, endTime = get_slot_times(position)
+            rows.append(Slot(title=f'Lecture {index}', weekday=weekday, start_time=startTime, end_time=endTime,
+                             batch=self.batch, faculty=self.faculties[index % len(self.faculties)]))
+        Slot.objects.bulk_create(rows)
+
+        self.slots = list(Slot.objects.filter(batch=self.batch).select_related('batch', 'faculty__user')
+                          .order_by('weekday', 'start_time'))
+        self.tz = pytz.timezone(TIMEZONE)
+        self.request = Request(RequestFactory().get('/'))
+        self.request.profile = self.admin
+
+
+""" Benchmarks """
+
+@benchmark('detect_overlap')
+def bench_detect_overlap(fixture):
+    from .models import Slot
+
+    #The gap between the first two slots of the day never overlaps.
+    gapStart, gapEnd = get_slot_times(0)[2], get_slot_times(1)[1]
+    faculty = fixture.faculties[0]
+    def run():
+        Slot.objects.possible_overlap_queryset(2, faculty, fixture.batch)\
+                    .detect_overlap(gapStart, gapEnd, fixture.batch)
+    return run
+
+
+@benchmark('detect_overlap (conflict)')
+def bench_detect_overlap_conflict(fixture):
+    from django.core.exceptions import ValidationError as DjangoValidationError
+    from .models import Slot
+
+    _, startTime, endTime = get_slot_times(0)
+    faculty = fixture.faculties[0]
+    def run():
+        try:
+            Slot.objects.possible_overlap_queryset(0, faculty, fixture.batch)\
+                        .detect_overlap(startTime, endTime, fixture.batch)
+        except DjangoValidationError:
+            pass
+    return run
+
+
+@benchmark('find_previous_ongoing_next_slot')
+def bench_find_previous_ongoing_next_slot(fixture):
+    from StudentUser.serializers import NextOrPreviousSlotSerializer, OngoingSlotSerializer
+
+    def run():
+        fixture.batch.connected_slots.select_related('faculty')\
+                     .find_previous_ongoing_next_slot(tz=fixture.tz, pSerializer=NextOrPreviousSlotSerializer,
+                                                      oSerializer=OngoingSlotSerializer,
+                                                      nSerializer=NextOrPreviousSlotSerializer)
+    return run
+
+
+@benchmark('serialize_and_group_by_weekday')
+def bench_serialize_and_group_by_weekday(fixture):
+    from .serializers import AdminSlotDisplaySerializer
+
+    def run():
+        fixture.batch.connected_slots.select_related('faculty__user').order_by('weekday', 'start_time')\
+                     .serialize_and_group_by_weekday(serializer=AdminSlotDisplaySerializer,
+                                                     context={'request': fixture.request})
+    return run
+
+
+def serializer_benchmark(serializer):
+    """
+    Every slot display serializer gets the same benchmark, named after the serializer.
+    """
+    @benchmark(serializer)
+    def setup(fixture):
+        from . import serializers
+
+        serializerClass = getattr(serializers, serializer)
+        context = {'request': fixture.request, 'currentDateTime': PINNED_NOW.astimezone(fixture.tz)}
+        def run():
+            serializerClass(fixture.slots, many=True, context=context).data
+        return run
+    return setup
+
+for serializer in ('BaseSlotDisplaySerializer', 'FacultySlotDisplaySerializer', 'StudentSlotDisplaySerializer',
+                   'AdminSlotDisplaySerializer', 'BaseOngoingSlotSerializer', 'BaseNextOrPreviousSlotSerializer'):
+    serializer_benchmark(serializer)
+
+
+@benchmark('get_elapsed_string', scales=False)
+def bench_get_elapsed_string(fixture):
+    from datetime import timedelta
+    from .utils import get_elapsed_string
+
+    #One of every unit.
+    moments = [PINNED_NOW - timedelta(seconds=seconds) for seconds in (30, 600, 7200, 259200)]
+    def run():
+        for moment in moments:
+            get_elapsed_string(moment)
+    return run
+
+
+@benchmark('EnhancedPagination.get_paginated_response')
+def bench_get_paginated_response(fixture):
+    from .pagination import EnhancedPagination
+    from .serializers import BaseSlotDisplaySerializer
+
+    #Every slot on a single page, so indexing scales with the slot count.
+    paginator = EnhancedPagination()
+    paginator.page_size = max(len(fixture.slots), 1)
+    page = paginator.paginate_queryset(fixture.slots, fixture.request)
+    data = BaseSlotDisplaySerializer(page, many=True).data
+    def run():
+        paginator.get_paginated_response(data, batch=fixture.batch.title)
+    return run
+
+
+@benchmark('custom_exception_handler', scales=False)
+def bench_custom_exception_handler(fixture):
+    from .utils import custom_exception_handler
+
+    #Serializer field error, missing field, nested serializer & view error.
+    details = [{'title': ['Ensure this field has no more than 100 characters.']},
+               {'email': ['This field is required.']},
+               {'faculty': {'name': ['This field may not be blank.']}},
+               ['Batched has reached max students!']]
+    def run():
+        for detail in details:
+            custom_exception_handler(ValidationError(detail), {})
+    return run
+
+
+""" Timing """
+
+def summarize(samples, number):
+    """
+    Per call statistics (in microseconds) of 'samples', the seconds taken by 'number' calls each.
+    """
+    perCall = sorted(sample / number * 10**6 for sample in samples)
+    return {'samples': len(perCall),
+            'calls_per_sample': number,
+            'mean_us': round(statistics.mean(perCall), 3),
+            'stdev_us': round(statistics.stdev(perCall), 3) if len(perCall) > 1 else 0.0,
+            'median_us': round(statistics.median(perCall), 3),
+            'p95_us': round(percentile(perCall, 95), 3),
+            'min_us': round(perCall[0], 3)}
+
+
+def measure(func, *, repeat, warmup, min_time):
+    for _ in range(warmup):
+        func()
+
+    #Like timeit the number of calls is doubled until a sample takes long enough to time.
+    number = 1
+    while True:
+        elapsed = time_calls(func, number)
+        if elapsed >= min_time or number >= 2**20:
+            break
+        number *= 2
+
+    return summarize([time_calls(func, number) for _ in range(repeat)], number)
+
+
+def time_calls(func, number):
+    gcEnabled = gc.isenabled()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        return time.perf_counter() - start
+    finally:
+        if gcEnabled:
+            gc.enable()
+
+
+def run_benchmarks(slotCounts, *, names=None, repeat=20, warmup=3, min_time=0.02, stdout=None):
+    """
+    Returns {benchmark: {slot count (or '-' when it doesn't scale): stats}}.
+    """
+    names = names or list(BENCHMARKS)
+    results = {name: {} for name in names}
+    for index, slots in enumerate(slotCounts):
+        with transaction.atomic(), mock.patch('django.utils.timezone.now', return_value=PINNED_NOW):
+            fixture = Fixture(slots)
+            for name in names:
+                setup, scales = BENCHMARKS[name]
+                if not scales and index:
+                    continue
+                results[name][str(slots) if scales else '-'] = measure(setup(fixture), repeat=repeat,
+                                                                       warmup=warmup, min_time=min_time)
+                if stdout is not None:
+                    stdout.write(f"Measured {name} ({slots if scales else '-'} slots).")
+            transaction.set_rollback(True)
+    return results
+
+
+def compare(current, baseline, threshold):
+    """
+    Change of every benchmark against the baseline, a change is only called significant
+    when the means differ by more than 'threshold' percent & twice their standard error.
+    """
+    changes = []
+    for name, runs in current.items():
+        for slots, stats in runs.items():
+            before = baseline.get(name, {}).get(slots)
+            if before is None:
+                continue
+            change = (stats['median_us'] - before['median_us']) / before['median_us'] * 100
+            error = math.sqrt(stats['stdev_us']**2 / stats['samples'] + before['stdev_us']**2 / before['samples'])
+            difference = stats['mean_us'] - before['mean_us']
+            verdict = '~'
+            if abs(change) >= threshold and abs(difference) > 2 * error:
+                verdict = 'slower' if difference > 0 else 'faster'
+            changes.append((name, slots, before['median_us'], stats['median_us'], change, verdict))
+    return changes
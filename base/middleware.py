@@ -0,0 +1,120 @@
+import json
+import time
+import random
+import logging
+
+from django.conf import settings
+from django.db import connection
+
+from . import activity, metrics, profiling, slowqueries
+
+
+logger = logging.getLogger('base.profiling')
+
+
+class ActivityBufferMiddleware:
+    """
+    Gives every request its own activity collector,
+    so buffered activities never leak into the next request.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        activity.start_request()
+        try:
+            return self.get_response(request)
+        finally:
+            activity.end_request()
+
+
+class ProfilingMiddleware:
+    """
+    Profiles PROFILING_SAMPLE_RATE of the requests & logs them to 'base.profiling'
+    when PROFILING_LOG is set. Only INTERNAL_IPS & staff users get the
+    Server-Timing header, its timings would tell anyone else i.e whether an
+    email exists (a password hash is only checked for existing users).
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        sampleRate = getattr(settings, 'PROFILING_SAMPLE_RATE', 0)
+        if not sampleRate or random.random() >= sampleRate:
+            return self.get_response(request)
+
+        profiling.install()
+        profile = profiling.start_request()
+        try:
+            with connection.execute_wrapper(profile):
+                response = self.get_response(request)
+        finally:
+            profiling.end_request()
+        profile.finish()
+
+        if self.can_see_timing(request):
+            response['Server-Timing'] = profile.get_header()
+        if getattr(settings, 'PROFILING_LOG', False):
+            logger.info(json.dumps({'method': request.method, 'path': request.path,
+                                    'status': response.status_code, **profile.as_dict()}))
+        return response
+
+    def can_see_timing(self, request):
+        #DRF sets the user it authenticated on the request as well.
+        user = getattr(request, 'user', None)
+        return request.META.get('REMOTE_ADDR') in settings.INTERNAL_IPS or getattr(user, 'is_staff', False)
+
+    def process_template_response(self, request, response):
+        #Renders ahead of the handler (which skips rendered responses), so the time can be taken.
+        profile = profiling.get_profile()
+        if profile is not None and not response.is_rendered:
+            start = time.perf_counter()
+            response.render()
+            profile.durations['render'] += time.perf_counter() - start
+        return response
+
+
+class QueryCounter:
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class MetricsMiddleware:
+    """
+    Records the latency & SQL queries of every request by URL name (see base/metrics.py).
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        queries = QueryCounter()
+        with connection.execute_wrapper(queries):
+            response = self.get_response(request)
+
+        match = request.resolver_match
+        view = (match.url_name or 'unnamed') if match is not None else 'unresolved'
+        metrics.REQUEST_DURATION.observe(time.perf_counter() - start, view=view, method=request.method)
+        metrics.REQUEST_QUERIES.observe(queries.count, view=view, method=request.method)
+        metrics.flush()
+        return response
+
+
+class SlowQueryMiddleware:
+    """
+    Logs the queries of a request slower than SLOW_QUERY_LOG['THRESHOLD'] (see base/slowqueries.py).
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        threshold = settings.SLOW_QUERY_LOG['THRESHOLD']
+        if threshold is None:
+            return self.get_response(request)
+        with connection.execute_wrapper(slowqueries.SlowQueryRecorder(request, threshold)):
+            return self.get_response(request)
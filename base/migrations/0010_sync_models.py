@@ -0,0 +1,105 @@
+# Generated by Django 2.2.28 on 2026-10-19 20:22
+
+import base.models
+import datetime
+from django.db import migrations, models
+import django.db.models.deletion
+import django_resized.forms
+import uuid
+
+
+def populate_uuids(apps, schema_editor):
+    #Existing rows all got the same default, every row needs its own before the field can be unique.
+    Slot = apps.get_model('base', 'Slot')
+    for pk in Slot.objects.values_list('pk', flat=True):
+        Slot.objects.filter(pk=pk).update(uuid=uuid.uuid4())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0009_auto_20210514_1922'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='slot',
+            name='created',
+        ),
+        migrations.RemoveField(
+            model_name='slot',
+            name='timing',
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='profile_image',
+            field=django_resized.forms.ResizedImageField(blank=True, crop=None, force_format=None, keep_meta=True, null=True, quality=75, size=[1080, 1350], upload_to=base.models.main_image_path),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='thumbnail',
+            field=models.ImageField(blank=True, null=True, upload_to=base.models.thumbnail_path),
+        ),
+        migrations.AddField(
+            model_name='slot',
+            name='end_time',
+            field=models.TimeField(default=datetime.time(9, 0)),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='slot',
+            name='last_modified',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='slot',
+            name='next_utc_occurence',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AddField(
+            model_name='slot',
+            name='start_time',
+            field=models.TimeField(default=datetime.time(8, 0)),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='slot',
+            name='uuid',
+            field=models.UUIDField(default=uuid.uuid4, null=True),
+        ),
+        migrations.RunPython(populate_uuids, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='slot',
+            name='uuid',
+            field=models.UUIDField(default=uuid.uuid4, unique=True),
+        ),
+        migrations.AddField(
+            model_name='slot',
+            name='weekday',
+            field=models.IntegerField(choices=[(0, 'Monday'), (1, 'Tuesday'), (2, 'Wednesday'), (3, 'Thursday'), (4, 'Friday'), (5, 'Saturday'), (6, 'Sunday')], default=0),
+            preserve_default=False,
+        ),
+        migrations.AlterField(
+            model_name='batch',
+            name='created',
+            field=models.DateTimeField(auto_now_add=True),
+        ),
+        migrations.AlterField(
+            model_name='customuser',
+            name='email',
+            field=models.EmailField(max_length=254, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='slot',
+            name='batch',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='connected_slots', related_query_name='slots', to='base.Batch'),
+        ),
+        migrations.AlterField(
+            model_name='slot',
+            name='faculty',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='teaches_in', related_query_name='slots', to='FacultyUser.FacultyProfile'),
+        ),
+        migrations.DeleteModel(
+            name='Timing',
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 2.2.28 on 2026-10-19 20:24
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0010_sync_models'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedBroadcast',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('text', models.TextField()),
+                ('created', models.DateTimeField()),
+                ('sent_to', models.PositiveIntegerField()),
+                ('receivers', models.TextField()),
+                ('sender', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_broadcasts', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='archivedbroadcast',
+            index=models.Index(fields=['sender', 'created'], name='base_archiv_sender__2128f1_idx'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 2.2.28 on 2026-10-19 20:24
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def remove_duplicate_messages(apps, schema_editor):
+    """
+    Keeps the oldest Message of every (broadcast, receiver) pair,
+    needed before the unique constraint can be added.
+    """
+    Message = apps.get_model('base', 'Message')
+    duplicates = Message.objects.values('broadcast', 'receiver')\
+        .annotate(total=Count('id'), keep=Min('id')).filter(total__gt=1)
+
+    for item in duplicates:
+        Message.objects.filter(broadcast=item['broadcast'], receiver=item['receiver'])\
+            .exclude(id=item['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0011_archivedbroadcast'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='activity',
+            index=models.Index(fields=['user', 'read', 'created'], name='activity_user_read_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='batch',
+            index=models.Index(fields=['admin', 'created'], name='batch_admin_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['receiver', 'read'], name='message_receiver_read_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='slot',
+            index=models.Index(fields=['faculty', 'weekday', 'start_time'], name='slot_faculty_weekday_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='slot',
+            index=models.Index(fields=['batch', 'weekday', 'start_time'], name='slot_batch_weekday_idx'),
+        ),
+        migrations.RunPython(remove_duplicate_messages, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='message',
+            constraint=models.UniqueConstraint(fields=('broadcast', 'receiver'), name='unique_broadcast_receiver'),
+        ),
+    ]
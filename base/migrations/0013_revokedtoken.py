@@ -0,0 +1,23 @@
+# Generated by Django 2.2.28 on 2026-10-19 20:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0012_performance_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RevokedToken',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('jti', models.CharField(max_length=32, null=True, unique=True)),
+                ('user_id', models.IntegerField(null=True)),
+                ('revoked_before', models.DateTimeField(null=True)),
+                ('expires', models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 2.2.28 on 2026-10-19 20:24
+
+import base.models
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0013_revokedtoken'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='customuser',
+            name='profile_image',
+            field=models.ImageField(blank=True, null=True, upload_to=base.models.main_image_path),
+        ),
+        migrations.CreateModel(
+            name='ImageJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('raw_image', models.FileField(upload_to=base.models.raw_image_path)),
+                ('status', models.CharField(choices=[('PENDING', 'PENDING'), ('PROCESSING', 'PROCESSING'), ('FAILED', 'FAILED')], default='PENDING', max_length=20)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('error', models.TextField(blank=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='image_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='imagejob',
+            index=models.Index(fields=['status', 'id'], name='imagejob_status_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.28 on 2026-10-19 20:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0014_imagejob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='avatar_key',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 2.2.28 on 2026-10-19 20:25
+
+import base.models
+import base.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0015_customuser_avatar_key'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='customuser',
+            name='profile_image',
+            field=models.ImageField(blank=True, null=True, storage=base.storage.ContentAddressedStorage(), upload_to=base.models.main_image_path),
+        ),
+        migrations.AlterField(
+            model_name='customuser',
+            name='thumbnail',
+            field=models.ImageField(blank=True, null=True, storage=base.storage.ContentAddressedStorage(), upload_to=base.models.thumbnail_path),
+        ),
+    ]
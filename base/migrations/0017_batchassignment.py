@@ -0,0 +1,43 @@
+# Generated by Django 2.2.28 on 2026-10-19 20:25
+
+from django.db import migrations, models
+from django.db.models import Count
+import django.db.models.deletion
+
+
+def populate_assignments(apps, schema_editor):
+    Slot = apps.get_model('base', 'Slot')
+    BatchAssignment = apps.get_model('base', 'BatchAssignment')
+
+    pairs = Slot.objects.order_by().values('batch', 'faculty').annotate(total=Count('pk'))
+    BatchAssignment.objects.bulk_create([BatchAssignment(batch_id=pair['batch'], faculty_id=pair['faculty'],
+                                                         slot_count=pair['total']) for pair in pairs])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('FacultyUser', '0010_facultyprofile_admin_status_idx'),
+        ('base', '0016_customuser_image_storage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BatchAssignment',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slot_count', models.PositiveIntegerField(default=0)),
+                ('batch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='assignments', to='base.Batch')),
+                ('faculty', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='assignments', to='FacultyUser.FacultyProfile')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='batchassignment',
+            index=models.Index(fields=['faculty', 'batch'], name='assignment_faculty_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='batchassignment',
+            constraint=models.UniqueConstraint(fields=('batch', 'faculty'), name='unique_batch_faculty'),
+        ),
+        migrations.RunPython(populate_assignments, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 2.2.28 on 2026-10-19 20:25
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_counters(apps, schema_editor):
+    Batch = apps.get_model('base', 'Batch')
+    Slot = apps.get_model('base', 'Slot')
+    StudentProfile = apps.get_model('StudentUser', 'StudentProfile')
+
+    def count(model):
+        counts = model.objects.filter(batch=OuterRef('pk')).order_by().values('batch')\
+                    .annotate(total=Count('pk')).values('total')
+        return Coalesce(Subquery(counts, output_field=models.IntegerField()), 0)
+
+    Batch.objects.update(student_count=count(StudentProfile), slot_count=count(Slot))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('StudentUser', '0007_studentprofile_batch_joined_idx'),
+        ('base', '0017_batchassignment'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='batch',
+            name='slot_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='batch',
+            name='student_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 2.2.28 on 2026-10-19 20:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0018_batch_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imagejob',
+            name='claim',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+        migrations.AddField(
+            model_name='imagejob',
+            name='claimed',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
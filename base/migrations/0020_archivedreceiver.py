@@ -0,0 +1,42 @@
+# Generated by Django 2.2.28 on 2026-10-19 20:37
+
+import json
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_receivers(apps, schema_editor):
+    ArchivedBroadcast = apps.get_model('base', 'ArchivedBroadcast')
+    ArchivedReceiver = apps.get_model('base', 'ArchivedReceiver')
+    CustomUser = apps.get_model('base', 'CustomUser')
+
+    userIds = set(CustomUser.objects.values_list('pk', flat=True))
+    for archiveId, receivers in ArchivedBroadcast.objects.values_list('pk', 'receivers').iterator():
+        #Receivers deleted since their broadcast was archived can't look it up anymore.
+        ArchivedReceiver.objects.bulk_create([ArchivedReceiver(archive_id=archiveId, receiver_id=int(userId))
+                                              for userId in json.loads(receivers) if int(userId) in userIds])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0019_imagejob_claim'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedReceiver',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('archive', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='receiver_rows', to='base.ArchivedBroadcast')),
+                ('receiver', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='archivedreceiver',
+            constraint=models.UniqueConstraint(fields=('receiver', 'archive'), name='unique_archived_receiver'),
+        ),
+        migrations.RunPython(populate_receivers, migrations.RunPython.noop),
+    ]
@@ -1,21 +1,23 @@
 import os
+import json
 import uuid
 from datetime import date,datetime,timedelta
-from PIL import Image
-from io import BytesIO
 
-from django.db import models
-from django.core.files import File
-from django.db.models.signals import pre_save,post_save
+from django.db import models, transaction, IntegrityError
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import pre_save,post_save,post_delete,post_migrate
 from django.contrib.auth.base_user import BaseUserManager
 from django.contrib.auth.models import AbstractUser
 from django.core.exceptions import ValidationError as DjangoValidationError
 
 from rest_framework.authtoken.models import Token
-from django_resized import ResizedImageField
 
 from .managers import SlotManager,BatchManager
+from .activity import get_collector
+from . import authentication, tokens, search
 from .utils import get_elapsed_string
+from .storage import content_storage
 from trackr.settings import WEEKDAYS
 
 
@@ -61,6 +63,10 @@ def main_image_path(instance, filename):
 def thumbnail_path(instance,filename):
     return f'profile_images/{instance.user_type}/thumbnail/{filename}'
 
+def raw_image_path(instance,filename):
+    _,extension = os.path.splitext(filename)
+    return f'profile_images/raw/{uuid.uuid4()}{extension}'
+
 
 class CustomUser(AbstractUser):
 
@@ -69,9 +75,12 @@ class CustomUser(AbstractUser):
     username = None
     email = models.EmailField(unique=True)
 
-    profile_image = ResizedImageField(
-        size=[1080, 1350], quality=75, upload_to=main_image_path, null=True, blank=True)
-    thumbnail = models.ImageField(upload_to=thumbnail_path, null=True, blank=True) 
+    #Both are generated from the raw upload by the 'process_images' worker (see base/images.py)
+    #and stored under the hash of their content, upload_to only decides the directory.
+    profile_image = models.ImageField(upload_to=main_image_path, storage=content_storage, null=True, blank=True)
+    thumbnail = models.ImageField(upload_to=thumbnail_path, storage=content_storage, null=True, blank=True) 
+    #Common key of the square avatar variants, empty when none were generated.
+    avatar_key = models.CharField(max_length=32, blank=True, default='')
 
     ADMIN = 'ADMIN'
     FACULTY = 'FACULTY'
@@ -88,25 +97,47 @@ class CustomUser(AbstractUser):
         return self.email
 
 
-def generate_thumbnail(sender,instance,*args,**kwargs):
-    #Only generate when new profile_image is uploaded.
-    if instance.profile_image and not instance.profile_image.closed:
-        _,extension = os.path.splitext(instance.profile_image.name)      
-        img = Image.open(instance.profile_image)
-        img.thumbnail((300,240))  
-        
-        thumb = BytesIO()  
-        img.save(thumb,img.format)
-        thumb_name = f'thumbnail_{uuid.uuid4()}{extension}'
-        instance.thumbnail = File(thumb, name=thumb_name)
-
 def create_auth_token(sender, instance=None, created=False, **kwargs):
     #To prevent Token generation for INVITED Faculty accounts.
     if created and instance.has_usable_password():
         Token.objects.create(user=instance)
 
-pre_save.connect(generate_thumbnail, sender=CustomUser)
 post_save.connect(create_auth_token,sender=CustomUser)
+post_save.connect(authentication.invalidate_user,sender=CustomUser)
+post_delete.connect(authentication.invalidate_user,sender=CustomUser)
+post_delete.connect(authentication.invalidate_token,sender=Token)
+post_delete.connect(tokens.revoke_user_tokens,sender=CustomUser)
+post_save.connect(search.reindex_user,sender=CustomUser)
+
+
+class ImageJob(models.Model):
+    """
+    Raw profile image upload waiting to be resized by the 'process_images' worker.
+    Jobs are deleted once processed, only FAILED jobs are kept around.
+    A worker claims a job by tagging it with its own claim token (see base.images.claim_jobs).
+    """
+    PENDING = 'PENDING'
+    PROCESSING = 'PROCESSING'
+    FAILED = 'FAILED'
+    status_choices = ((PENDING,PENDING),(PROCESSING,PROCESSING),(FAILED,FAILED))
+
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='image_jobs')
+    raw_image = models.FileField(upload_to=raw_image_path)
+    status = models.CharField(max_length=20, choices=status_choices, default=PENDING)
+    created = models.DateTimeField(auto_now_add=True)
+    error = models.TextField(blank=True)
+    claim = models.CharField(max_length=32, blank=True, default='')
+    claimed = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'id'], name='imagejob_status_idx')]
+
+    def __str__(self):
+        return f'{self.user.email} ({self.status})'
+
+    def discard(self):
+        self.raw_image.delete(save=False)
+        self.delete()
 
 
 class Broadcast(models.Model):
@@ -140,7 +171,6 @@ class Broadcast(models.Model):
             raise DjangoValidationError('Broadcast can be sent by ADMIN/FACULTY users only!')
         super().save(*args,**kwargs)
 
-#Unique constraint maybe needed
 class Message(models.Model):
     """
     Custom M2M table to accomodate read attribute for each received message.
@@ -149,11 +179,82 @@ class Message(models.Model):
     receiver = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
     read = models.BooleanField(default=False)
 
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['broadcast', 'receiver'],
+                                               name='unique_broadcast_receiver')]
+        #Unread count & mark as read.
+        indexes = [models.Index(fields=['receiver', 'read'], name='message_receiver_read_idx')]
+
     def __str__(self):
         msg = f'{self.receiver.email} received {self.broadcast.preview_text()} from {self.broadcast.sender.email}'
         return msg
 
 
+class ArchivedBroadcast(models.Model):
+    """
+    Compact copy of an old Broadcast, created by the 'apply_retention' command.
+    Receivers & their read status are packed into a single JSON object
+    i.e {"<user id>": <read>} instead of one Message row per receiver,
+    ArchivedReceiver rows only index who received it.
+    """
+    sender = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='archived_broadcasts')
+    text = models.TextField()
+    created = models.DateTimeField()
+    sent_to = models.PositiveIntegerField()
+    receivers = models.TextField()
+
+    class Meta:
+        indexes = [models.Index(fields=['sender', 'created'])]
+
+    def __str__(self):
+        return f'{self.sender.email} sent "{self.text[:Broadcast.PREVIEW_LENGTH]}" to {self.sent_to} people (ARCHIVED)'
+
+    @staticmethod
+    def receiver_lookup(user):
+        #Subquery rather than a join, so OR-ing it with the sender doesn't repeat rows.
+        return {'pk__in':ArchivedReceiver.objects.filter(receiver=user).values('archive')}
+
+    def get_receivers(self):
+        return {int(userId):read for userId,read in json.loads(self.receivers).items()}
+
+    @classmethod
+    def from_broadcast(cls,broadcast,messages):
+        receivers = {str(receiverId):read for receiverId,read in messages}
+        return cls(sender_id=broadcast.sender_id,text=broadcast.text,created=broadcast.created,
+                   sent_to=len(receivers),receivers=json.dumps(receivers,separators=(',',':')))
+
+
+class ArchivedReceiver(models.Model):
+    """
+    (receiver, archive) pairs of the ArchivedBroadcast rows, read status stays in the archive.
+    """
+    archive = models.ForeignKey(ArchivedBroadcast, on_delete=models.CASCADE, related_name='receiver_rows')
+    receiver = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='+')
+
+    class Meta:
+        #Receiver first, archived broadcasts are only ever looked up by their receiver.
+        constraints = [models.UniqueConstraint(fields=['receiver', 'archive'],
+                                               name='unique_archived_receiver')]
+
+    def __str__(self):
+        return f'{self.receiver_id} received archived broadcast {self.archive_id}'
+
+
+class RevokedToken(models.Model):
+    """
+    Deny list for signed access tokens (see base/tokens.py), either a single token
+    or every token of a (deleted) user issued before 'revoked_before'.
+    Rows are useless once 'expires' has passed since the tokens would have expired anyway.
+    """
+    jti = models.CharField(max_length=32, unique=True, null=True)
+    user_id = models.IntegerField(null=True)
+    revoked_before = models.DateTimeField(null=True)
+    expires = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f'{self.jti or self.user_id} (expires {self.expires})'
+
+
 class Activity(models.Model):
     """
     Activity Log that is automatically generated for all users.
@@ -164,17 +265,28 @@ class Activity(models.Model):
     read = models.BooleanField(default=False)
     created = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        #Unread count & the activity feed.
+        indexes = [models.Index(fields=['user', 'read', 'created'], name='activity_user_read_idx')]
+
     def __str__(self):
         return f'{self.text} ({self.user.email})'
 
     @classmethod
-    def bulk_create_from_queryset(cls,*,queryset,text):
-        bulk_create = []
+    def log(cls,*,user,text,background=False):
+        """
+        Buffers the activity, the activities of a request (or of a savepoint
+        inside it) are written together in a single bulk_create on commit.
+        """
+        collector = get_collector()
+        collector.add(cls(user=user,text=text),background=background)
+
+    @classmethod
+    def bulk_create_from_queryset(cls,*,queryset,text,background=False):
+        collector = get_collector()
         for obj in queryset:
-            assert hasattr(obj,'user'),'Queryset Object needs to have a user attribute'
-            bulk_create.append(cls(user=obj.user,text=text))
-        
-        cls.objects.bulk_create(bulk_create)
+            assert hasattr(obj,'user_id'),'Queryset Object needs to have a user attribute'
+            collector.add(cls(user_id=obj.user_id,text=text),background=background)
 
 
 class Batch(models.Model):
@@ -185,33 +297,85 @@ class Batch(models.Model):
     created = models.DateTimeField(auto_now_add=True)
     onboard_students = models.BooleanField(default=True)
     max_students = models.PositiveIntegerField(default=100)
+    #Denormalized counters, only ever changed with F() updates via adjust_counters()
+    #('repair_counters' command recomputes them).
+    student_count = models.PositiveIntegerField(default=0)
+    slot_count = models.PositiveIntegerField(default=0)
+
+    COUNTERS = ('student_count', 'slot_count')
 
     objects = BatchManager()
 
+    class Meta:
+        indexes = [models.Index(fields=['admin', 'created'], name='batch_admin_created_idx')]
+
     def __str__(self):
         return f'{self.title} ({self.connected_slots.all().count()} Slots Assigned)'
 
+    def save(self,*args,**kwargs):
+        #A stale instance must never overwrite the counters.
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [field.name for field in self._meta.concrete_fields
+                                       if not field.primary_key and field.name not in self.COUNTERS]
+        super().save(*args,**kwargs)
+
+    @classmethod
+    def adjust_counters(cls,batch_id,*,students=0,slots=0):
+        changes = {}
+        for field,delta in (('student_count',students),('slot_count',slots)):
+            if delta:
+                changes[field] = Greatest(F(field)+delta,0)
+        if batch_id is not None and changes:
+            cls.objects.filter(pk=batch_id).update(**changes)
+
+    def reserve_seat(self):
+        """
+        Claims a seat with a single conditional UPDATE instead of counting students,
+        the row stays locked till the transaction ends so concurrent signups
+        can never overshoot 'max_students'.
+        """
+        reserved = Batch.objects.filter(pk=self.pk,onboard_students=True,student_count__lt=F('max_students'))\
+                    .update(student_count=F('student_count')+1)
+        if reserved:
+            return
+        #Only rejected signups pay for finding out why.
+        if not Batch.objects.filter(pk=self.pk,onboard_students=True).exists():
+            raise DjangoValidationError('Student onboarding for this batch has been stopped by the Admin!')
+        raise DjangoValidationError('Batched has reached max students!')
+
     def total_classes(self):
-        return self.connected_slots.count()
+        return self.slot_count
 
     def total_students(self):
-        return self.student_profiles.count()
+        return self.student_count
 
     def getAssignedFaculties(self):
         from FacultyUser.models import FacultyProfile
-        #Faculty that teach atleast 1 or more Slots in the current batch
-        return FacultyProfile.objects.filter(slots__batch=self).distinct()
+        #Faculty that teach atleast 1 or more Slots in the current batch (see BatchAssignment)
+        return FacultyProfile.objects.filter(assignments__batch=self)
+
+    def get_assigned_faculties_list(self):
+        if hasattr(self,'assigned_pairs'):
+            return [assignment.faculty for assignment in self.assigned_pairs]
+        return list(self.getAssignedFaculties().select_related('user').order_by('name'))
 
     def delete_batch(self):
+        #Slots are deleted before the batch, its cascade would delete (and send signals) slot by slot.
+        Slot.bulk_delete_slots(self.connected_slots.all())
         allStudents = self.student_profiles.all()
         Activity.bulk_create_from_queryset(queryset=allStudents,
         text= "Your account has been deleted because the associated Batch has been deleted by the admin.")
 
-        Activity.objects.create(user=self.admin.user,
+        Activity.log(user=self.admin.user,
         text=f"You have deleted the '{self.title}' Batch.")
 
         self.delete()
 
+post_save.connect(authentication.invalidate_batch,sender=Batch)
+post_delete.connect(authentication.invalidate_batch,sender=Batch)
+post_save.connect(search.index_instance,sender=Batch)
+post_delete.connect(search.unindex_instance,sender=Batch)
+
 
 class Slot(models.Model):
     uuid = models.UUIDField(default=uuid.uuid4,unique=True)
@@ -239,6 +403,11 @@ class Slot(models.Model):
 
     objects = SlotManager()
 
+    class Meta:
+        #Overlap detection & timelines always filter by weekday and order by start time.
+        indexes = [models.Index(fields=['faculty', 'weekday', 'start_time'], name='slot_faculty_weekday_idx'),
+                   models.Index(fields=['batch', 'weekday', 'start_time'], name='slot_batch_weekday_idx')]
+
     def __str__(self):
         return f'{self.title} Taught By {self.faculty} ({self.start_time} - {self.end_time} {self.weekday})'
 
@@ -252,6 +421,27 @@ class Slot(models.Model):
         return cls.objects.create(title=title,start_time=start_time,end_time=end_time,
                 weekday=weekday,batch=batch,faculty=faculty)
 
+    @classmethod
+    def bulk_delete_slots(cls,queryset):
+        """
+        Deletes the slots with a single DELETE, without their post_delete signals.
+        The work of those signals (batch assignments, slot counters & the search index)
+        is redone once for the affected batches, keep both in sync.
+        """
+        rows = list(queryset.order_by().values_list('pk','batch_id'))
+        if not rows:
+            return 0
+        pks = [pk for pk,_ in rows]
+        batchIds = {batchId for _,batchId in rows}
+
+        with transaction.atomic():
+            #Nothing references slots, so there's nothing to collect either.
+            deleted = cls._base_manager.filter(pk__in=pks)._raw_delete(queryset.db)
+            BatchAssignment.rebuild(batches=batchIds)
+            Batch.objects.filter(pk__in=batchIds).update(slot_count=Batch.objects.get_actual_counts()['slot_count'])
+            search.get_index(cls).remove(pks)
+        return deleted
+
     def update_slot(self,title,start_time,end_time,weekday,faculty):
 
         possibleOverlaps = Slot.objects.possible_overlap_queryset(weekday,faculty,self.batch)
@@ -293,3 +483,90 @@ class Slot(models.Model):
 
     def get_last_modified(self):
         return get_elapsed_string(self.last_modified)
+
+
+class BatchAssignment(models.Model):
+    """
+    Materialized (batch, faculty) pairs of all slots along with the number of
+    slots the faculty teaches in the batch, kept in sync by the Slot signals below.
+    Rows are deleted once their slot_count drops to 0, so existence means assigned.
+    """
+    batch = models.ForeignKey(Batch, on_delete=models.CASCADE, related_name='assignments')
+    faculty = models.ForeignKey('FacultyUser.FacultyProfile', on_delete=models.CASCADE, related_name='assignments')
+    slot_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['batch', 'faculty'], name='unique_batch_faculty')]
+        #Batches of a faculty, the unique constraint already covers faculties of a batch.
+        indexes = [models.Index(fields=['faculty', 'batch'], name='assignment_faculty_idx')]
+
+    def __str__(self):
+        return f'{self.faculty.name} teaches {self.slot_count} slots in {self.batch.title}'
+
+    @classmethod
+    def adjust(cls,*,batch_id,faculty_id,delta):
+        pair = cls.objects.filter(batch_id=batch_id,faculty_id=faculty_id)
+        if pair.update(slot_count=F('slot_count')+delta):
+            if delta < 0:
+                pair.filter(slot_count__lte=0).delete()
+            return
+
+        if delta > 0:
+            try:
+                with transaction.atomic():
+                    cls.objects.create(batch_id=batch_id,faculty_id=faculty_id,slot_count=delta)
+            except IntegrityError:
+                #Created concurrently by another slot.
+                pair.update(slot_count=F('slot_count')+delta)
+
+    @classmethod
+    def rebuild(cls,batches=None):
+        """
+        Recomputes the whole table (or the rows of the given batch ids) from Slot,
+        used by the migration, for repairs & by Slot.bulk_delete_slots.
+        """
+        from django.db.models import Count
+
+        slots = Slot.objects.order_by()
+        assignments = cls.objects.all()
+        if batches is not None:
+            slots = slots.filter(batch__in=batches)
+            assignments = assignments.filter(batch__in=batches)
+
+        pairs = slots.values('batch','faculty').annotate(total=Count('pk'))
+        with transaction.atomic():
+            assignments.delete()
+            cls.objects.bulk_create([cls(batch_id=pair['batch'],faculty_id=pair['faculty'],
+                                         slot_count=pair['total']) for pair in pairs])
+
+
+def remember_slot_assignment(sender, instance, raw=False, **kwargs):
+    instance._old_assignment = None
+    if instance.pk is not None and not raw:
+        instance._old_assignment = Slot.objects.filter(pk=instance.pk)\
+                                    .values_list('batch_id','faculty_id').first()
+
+def update_slot_assignment(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    old = getattr(instance, '_old_assignment', None)
+    new = (instance.batch_id, instance.faculty_id)
+    if old == new:
+        return
+    if old is not None:
+        BatchAssignment.adjust(batch_id=old[0],faculty_id=old[1],delta=-1)
+        Batch.adjust_counters(old[0],slots=-1)
+    BatchAssignment.adjust(batch_id=new[0],faculty_id=new[1],delta=1)
+    Batch.adjust_counters(new[0],slots=1)
+
+def remove_slot_assignment(sender, instance, **kwargs):
+    #Pair & batch are already gone when the slot is deleted by a batch cascade.
+    BatchAssignment.adjust(batch_id=instance.batch_id,faculty_id=instance.faculty_id,delta=-1)
+    Batch.adjust_counters(instance.batch_id,slots=-1)
+
+pre_save.connect(remember_slot_assignment,sender=Slot)
+post_save.connect(update_slot_assignment,sender=Slot)
+post_delete.connect(remove_slot_assignment,sender=Slot)
+post_save.connect(search.index_instance,sender=Slot)
+post_delete.connect(search.unindex_instance,sender=Slot)
+post_migrate.connect(search.setup_indexes)
@@ -31,10 +31,13 @@ class IsAuthenticatedWithProfile(IsAuthenticated):
         assert view.required_profile in {AdminProfile,FacultyProfile,StudentProfile},\
         'required_profile can only take AdminProfile/FacultyProfile/StudentProfile'
 
-        try:
-            profile = view.required_profile.objects.get(user=request.user)
-        except ObjectDoesNotExist:
-            raise ValidationError('Your account does not have permission to perform this action!')
+        #Already resolved (and cached) by CachedTokenAuthentication.
+        profile = getattr(request, 'profile', None)
+        if not isinstance(profile, view.required_profile):
+            try:
+                profile = view.required_profile.objects.get(user=request.user)
+            except ObjectDoesNotExist:
+                raise ValidationError('Your account does not have permission to perform this action!')
 
         if view.required_profile in {FacultyProfile,StudentProfile}:
             if getattr(view, 'required_account_active', False) is True and (not profile.is_active()):
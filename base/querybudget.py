@@ -0,0 +1,338 @@
+"""
+Per view query budgets.
+
+Every API view declares 'max_queries' next to 'required_profile', either a
+number for all methods or a {method: number} dict. The QueryBudget test
+seeds institutes of every size in SIZES, replays SCENARIOS (atleast one for
+every URL in trackr/urls.py) as their users and fails when a view goes over
+its budget or when its query count grows along with the data i.e an N+1.
+
+Sizes are kept below the page size, so paginated lists grow along with
+the data too. The profile cache is cleared before every request, so counts
+are the worst case (a cold cache) of each request.
+"""
+
+import io
+import re
+import json
+from datetime import time as clock, timedelta
+
+from PIL import Image
+
+from django.core import signing
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, get_resolver
+from django.utils import timezone
+
+from rest_framework.views import APIView
+
+
+SIZES = (2, 4)
+PASSWORD = 'password'
+
+
+def get_endpoints(patterns=None, prefix=''):
+    """
+    Yields (route, view class) of every API view in the URLconf.
+    """
+    if patterns is None:
+        patterns = get_resolver().url_patterns
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from get_endpoints(pattern.url_patterns, prefix + str(pattern.pattern))
+        elif isinstance(pattern, URLPattern):
+            view = getattr(pattern.callback, 'cls', None)
+            if view is not None and issubclass(view, APIView):
+                yield prefix + str(pattern.pattern), view
+
+
+def get_budget(view, method):
+    budget = getattr(view, 'max_queries', None)
+    if isinstance(budget, dict):
+        return budget.get(method)
+    return budget
+
+
+class Dataset:
+    """
+    An institute where every relation has 'size' rows, along with the tokens of its users.
+    """
+
+    def __init__(self, size):
+        from AdminUser.models import AdminProfile
+        from FacultyUser.models import FacultyProfile
+        from StudentUser.models import StudentProfile
+        from .loadtest import InstituteGenerator, synthetic_email
+        from .models import Activity, Batch, BatchAssignment, Broadcast, CustomUser, Message, Slot
+
+        InstituteGenerator(admins=1, batches=size + 2, faculties=(size + 2) * size, students=size,
+                           slots_per_day=size, broadcasts=0, activities=size, password=PASSWORD, seed=size).generate()
+
+        self.size = size
+        self.admin = AdminProfile.objects.select_related('user').get()
+        self.batches = list(Batch.objects.order_by('id'))
+        self.faculties = list(FacultyProfile.objects.select_related('user').order_by('id'))
+        self.students = list(StudentProfile.objects.filter(batch=self.batches[0]).select_related('user')
+                             .order_by('id'))
+        #Read flags are random, the activities of the student are left for the mark & show scenarios.
+        Activity.objects.filter(user=self.students[0].user).update(read=False)
+        #Sunday classes of the first faculty across batches, so their timeline grows too.
+        Slot.objects.bulk_create([Slot(title=f'Sunday Lecture {index}', weekday=6, batch=batch,
+                                       start_time=clock(hour=8 + index), end_time=clock(hour=9 + index),
+                                       faculty=self.faculties[0])
+                                  for index, batch in enumerate(self.batches[:size])])
+        Batch.objects.repair_counters()
+        BatchAssignment.rebuild()
+        self.slots = list(Slot.objects.filter(batch=self.batches[0]).order_by('id'))
+
+        self.unverified = FacultyProfile.create_profile(name='Unverified Faculty', admin=self.admin)
+        self.invited = FacultyProfile.create_profile(name='Invited Faculty', admin=self.admin,
+                                                     email=synthetic_email('invited', 0))
+        self.reinvited = FacultyProfile.create_profile(name='Reinvited Faculty', admin=self.admin,
+                                                       email=synthetic_email('invited', 1))
+        #Resending is limited to once a day.
+        FacultyProfile.objects.filter(pk=self.reinvited.pk).update(invite_sent=timezone.now() - timedelta(days=2))
+
+        #Broadcasts from the admin to everyone & from a faculty to the first batch.
+        faculty = self.faculties[0].user
+        everyone = [student.user for student in StudentProfile.objects.select_related('user')] + \
+                   [profile.user for profile in self.faculties]
+        for index in range(size):
+            for sender, receivers in ((self.admin.user, everyone), (faculty, [s.user for s in self.students])):
+                broadcast = Broadcast.objects.create(sender=sender, text=f'Announcement {index}')
+                Message.objects.bulk_create([Message(broadcast=broadcast, receiver=receiver, read=False)
+                                             for receiver in receivers])
+
+        self.users = {CustomUser.ADMIN: self.admin.user, CustomUser.FACULTY: faculty,
+                      CustomUser.STUDENT: self.students[0].user,
+                      #Logs out, so nobody else's token is deleted.
+                      'LOGOUT': self.students[-1].user}
+
+    def token(self, role):
+        from rest_framework.authtoken.models import Token
+
+        token, _ = Token.objects.get_or_create(user=self.users[role])
+        return token.key
+
+    def invite_token(self):
+        return signing.dumps({'email': self.invited.user.email, 'invitedBy': str(self.admin.uuid)})
+
+
+def image_upload():
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64), 'teal').save(buffer, 'PNG')
+    buffer.name = 'avatar.png'
+    buffer.seek(0)
+    return buffer
+
+
+#Route: [(label, method, role, build)], build(dataset) returns (url kwargs, data).
+#Scenarios run in this order, so destructive ones pick rows nobody else uses.
+ADMIN, FACULTY, STUDENT = 'ADMIN', 'FACULTY', 'STUDENT'
+SCENARIOS = {
+    'api/login/': [
+        ('login', 'POST', None, lambda d: ({}, {'email': d.students[0].user.email, 'password': PASSWORD})),
+    ],
+    'api/profile/': [
+        (f'{role.lower()} detail', 'GET', role, lambda d: ({}, {'detail': 'true'})) for role in (ADMIN, FACULTY, STUDENT)
+    ],
+    'api/toggle-notification/': [
+        ('faculty', 'POST', FACULTY, lambda d: ({}, {})),
+    ],
+    'api/upload-profile-image/': [
+        ('upload', 'POST', STUDENT, lambda d: ({}, {'profile_image': image_upload()})),
+    ],
+    #Before the lists mark their pages as read, so both sizes have unread rows.
+    'api/mark-activity/': [
+        ('student', 'POST', STUDENT, lambda d: ({}, {})),
+    ],
+    'api/mark-broadcast/': [
+        ('student', 'POST', STUDENT, lambda d: ({}, {})),
+    ],
+    'api/show-activity/': [
+        ('student', 'GET', STUDENT, lambda d: ({}, {})),
+    ],
+    'api/show-broadcast/': [
+        ('admin sent', 'GET', ADMIN, lambda d: ({}, {})),
+        ('faculty both', 'GET', FACULTY, lambda d: ({}, {})),
+        ('student received', 'GET', STUDENT, lambda d: ({}, {})),
+        ('admin archived', 'GET', ADMIN, lambda d: ({}, {'archived': 'true'})),
+    ],
+    'api/admin/signup/': [
+        ('signup', 'POST', None, lambda d: ({}, {'name': 'New Institute', 'email': 'new@institute.test',
+                                                  'password': PASSWORD, 'timezone': 'Asia/Kolkata'})),
+    ],
+    'api/admin/faculty/': [
+        ('list', 'GET', ADMIN, lambda d: ({}, {})),
+        ('detailed list', 'GET', ADMIN, lambda d: ({}, {'detail': 'true'})),
+        ('search', 'GET', ADMIN, lambda d: ({}, {'q': d.faculties[0].name.split()[0]})),
+        ('add', 'POST', ADMIN, lambda d: ({}, {'name': 'Added Faculty'})),
+    ],
+    'api/admin/faculty-stats': [
+        ('stats', 'GET', ADMIN, lambda d: ({}, {})),
+    ],
+    'api/admin/slot/': [
+        ('create', 'POST', ADMIN, lambda d: ({}, {
+            'title': 'Evening Lecture', 'batch': str(d.batches[0].uuid), 'faculty': str(d.faculties[0].uuid),
+            'start_time': '20:00', 'end_time': '21:00', 'weekday': 6})),
+    ],
+    'api/admin/slot/<uuid:slot_id>/': [
+        ('retrieve', 'GET', ADMIN, lambda d: ({'slot_id': d.slots[0].uuid}, {})),
+        ('update', 'PUT', ADMIN, lambda d: ({'slot_id': d.slots[0].uuid}, {
+            'title': 'Moved Lecture', 'faculty': str(d.slots[0].faculty.uuid),
+            'start_time': '21:00', 'end_time': '22:00', 'weekday': 6})),
+        ('delete', 'DELETE', ADMIN, lambda d: ({'slot_id': d.slots[-1].uuid}, {})),
+    ],
+    'api/admin/batch/': [
+        ('list', 'GET', ADMIN, lambda d: ({}, {})),
+        ('create', 'POST', ADMIN, lambda d: ({}, {'title': 'New Batch', 'max_students': 10,
+                                                  'onboard_students': True})),
+    ],
+    'api/admin/batch-detail/': [
+        ('list', 'GET', ADMIN, lambda d: ({}, {})),
+        ('search', 'GET', ADMIN, lambda d: ({}, {'q': d.batches[0].title.split()[0]})),
+    ],
+    'api/admin/batch/<uuid:batch_id>/': [
+        ('retrieve', 'GET', ADMIN, lambda d: ({'batch_id': d.batches[0].uuid}, {})),
+        ('update', 'PUT', ADMIN, lambda d: ({'batch_id': d.batches[0].uuid}, {
+            'title': 'Renamed Batch', 'max_students': 50, 'onboard_students': True})),
+    ],
+    'api/admin/list-students/<uuid:batch_id>/': [
+        ('list', 'GET', ADMIN, lambda d: ({'batch_id': d.batches[0].uuid}, {})),
+        ('search', 'GET', ADMIN, lambda d: ({'batch_id': d.batches[0].uuid}, {'q': d.students[0].name})),
+    ],
+    'api/admin/search/': [
+        ('search', 'GET', ADMIN, lambda d: ({}, {'q': d.faculties[0].name.split()[0]})),
+    ],
+    'api/admin/broadcast-target/': [
+        ('targets', 'GET', ADMIN, lambda d: ({}, {})),
+    ],
+    'api/admin/broadcast/': [
+        ('everyone', 'POST', ADMIN, lambda d: ({}, {'text': 'Holiday tomorrow', 'target': 'EVERYONE'})),
+        ('batch', 'POST', ADMIN, lambda d: ({}, {'text': 'Test on monday', 'target': str(d.batches[0].uuid)})),
+    ],
+    'api/faculty/signup/': [
+        ('verify', 'GET', None, lambda d: ({}, {'token': d.invite_token()})),
+        ('claim', 'POST', None, lambda d: ({}, {'token': d.invite_token(), 'password': PASSWORD,
+                                                'receive_email_notification': True})),
+    ],
+    'api/faculty/timeline/': [
+        ('timeline', 'GET', FACULTY, lambda d: ({}, {})),
+    ],
+    'api/faculty/broadcast-target/': [
+        ('targets', 'GET', FACULTY, lambda d: ({}, {})),
+    ],
+    'api/faculty/broadcast/': [
+        ('everyone', 'POST', FACULTY, lambda d: ({}, {'text': 'Assignment due', 'target': 'EVERYONE'})),
+    ],
+    'api/student/signup/': [
+        ('verify', 'GET', None, lambda d: ({}, {'token': str(d.batches[0].uuid)})),
+        ('signup', 'POST', None, lambda d: ({}, {'name': 'New Student', 'email': 'new.student@institute.test',
+                                                 'password': PASSWORD, 'receive_email_notification': False,
+                                                 'token': str(d.batches[0].uuid)})),
+    ],
+    'api/student/timeline/': [
+        ('timeline', 'GET', STUDENT, lambda d: ({}, {})),
+    ],
+    #Destructive ones last.
+    'api/admin/faculty-invite/<uuid:faculty_id>': [
+        ('add email', 'PUT', ADMIN, lambda d: ({'faculty_id': d.unverified.uuid}, {'email': 'added@institute.test'})),
+    ],
+    'api/admin/faculty-resend-invite/<uuid:faculty_id>': [
+        ('resend', 'PUT', ADMIN, lambda d: ({'faculty_id': d.reinvited.uuid}, {})),
+    ],
+    'api/admin/batch-active-toggle/<uuid:batch_id>/': [
+        ('pause', 'PUT', ADMIN, lambda d: ({'batch_id': d.batches[-1].uuid}, {})),
+    ],
+    'api/admin/batch-pause-all/': [
+        ('pause', 'PUT', ADMIN, lambda d: ({}, {})),
+    ],
+    'api/admin/batch-resume-all/': [
+        ('resume', 'PUT', ADMIN, lambda d: ({}, {})),
+    ],
+    'api/admin/move-students/<uuid:source_batch_id>/<uuid:destination_batch_id>/': [
+        ('all', 'PUT', ADMIN, lambda d: ({'source_batch_id': d.batches[1].uuid,
+                                          'destination_batch_id': d.batches[2].uuid}, {'students': []})),
+    ],
+    'api/admin/delete-students/<uuid:batch_id>/': [
+        ('all', 'PUT', ADMIN, lambda d: ({'batch_id': d.batches[2].uuid}, {'students': []})),
+    ],
+    'api/admin/faculty-delete/<uuid:faculty_id>': [
+        ('verified', 'DELETE', ADMIN, lambda d: ({'faculty_id': d.faculties[-1].uuid}, {})),
+    ],
+    'api/admin/batch-delete/<uuid:batch_id>/': [
+        ('preview', 'GET', ADMIN, lambda d: ({'batch_id': d.batches[-1].uuid}, {})),
+        ('delete', 'DELETE', ADMIN, lambda d: ({'batch_id': d.batches[-1].uuid}, {})),
+    ],
+    'api/logout/': [
+        ('logout', 'DELETE', 'LOGOUT', lambda d: ({}, {})),
+    ],
+}
+
+
+def get_path(route, kwargs):
+    return '/' + re.sub(r'<(?:\w+:)?(\w+)>', lambda match: str(kwargs[match.group(1)]), route)
+
+
+def send(client, method, path, data, token):
+    headers = {'HTTP_AUTHORIZATION': f'Token {token}'} if token else {}
+    if method == 'GET':
+        return client.get(path, data, **headers)
+    if any(hasattr(value, 'read') for value in data.values()):
+        return client.post(path, data, **headers)
+    return getattr(client, method.lower())(path, json.dumps(data), content_type='application/json', **headers)
+
+
+def measure(size):
+    """
+    Seeds a Dataset of 'size' & replays every scenario on it,
+    returns {(route, label): (queries, status code)}.
+    """
+    from .authentication import profile_cache
+
+    dataset = Dataset(size)
+    tokens = {role: dataset.token(role) for role in dataset.users}
+    client = Client()
+    results = {}
+    for route, scenarios in SCENARIOS.items():
+        for label, method, role, build in scenarios:
+            kwargs, data = build(dataset)
+            profile_cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                response = send(client, method, get_path(route, kwargs), data, tokens.get(role))
+            results[route, label] = (len(queries), response.status_code)
+    return results
+
+
+def check(measurements):
+    """
+    Problems found in {size: measure(size)}, every size is expected to be measured on a fresh database.
+    """
+    problems = []
+    endpoints = dict(get_endpoints())
+    for route in SCENARIOS.keys() - endpoints.keys():
+        problems.append(f'{route} has scenarios but no URL.')
+
+    for route, view in endpoints.items():
+        if route not in SCENARIOS:
+            problems.append(f'{route} ({view.__name__}) has no scenario.')
+            continue
+        for label, method, _, _ in SCENARIOS[route]:
+            name = f'{method} {route} ({label})'
+            budget = get_budget(view, method)
+            counts = []
+            for size in sorted(measurements):
+                queries, status = measurements[size][route, label]
+                if status >= 400:
+                    problems.append(f'{name} failed with {status} on size {size}.')
+                counts.append(queries)
+
+            if budget is None:
+                problems.append(f'{view.__name__} has no max_queries for {method}, {name} took {max(counts)}.')
+            elif max(counts) > budget:
+                problems.append(f'{name} took {max(counts)} queries, over the budget of {budget}.')
+            if any(later > earlier for earlier, later in zip(counts, counts[1:])):
+                problems.append(f'{name} grows with the data: {counts} queries for sizes {sorted(measurements)}.')
+    return problems
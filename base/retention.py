@@ -0,0 +1,149 @@
+"""
+Retention & compaction of the Activity/Message tables.
+
+Every delete is done in small primary key ordered chunks, each chunk in its
+own short transaction, so the SQLite write lock is only held for the duration
+of a single 'DELETE ... WHERE id IN (...)' and readers are never starved.
+"""
+
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import Activity, ArchivedBroadcast, ArchivedReceiver, Broadcast, Message, RevokedToken
+
+
+class RetentionEngine:
+
+    def __init__(self, *, chunk_size=None, pause=0, dry_run=False):
+        self.chunk_size = chunk_size or settings.RETENTION_CHUNK_SIZE
+        self.pause = pause
+        self.dry_run = dry_run
+        self.now = timezone.now()
+
+    def delete_in_chunks(self, queryset):
+        """
+        Walks the queryset in primary key order with a cursor, so rows that
+        don't match are never scanned twice and every chunk is an index lookup.
+        """
+        model = queryset.model
+        lastPk = 0
+        total = 0
+        while True:
+            ids = list(queryset.filter(pk__gt=lastPk).order_by('pk')
+                       .values_list('pk', flat=True)[:self.chunk_size])
+            if not ids:
+                break
+
+            if not self.dry_run:
+                with transaction.atomic():
+                    model._base_manager.filter(pk__in=ids).delete()
+
+            total += len(ids)
+            lastPk = ids[-1]
+            if self.pause:
+                time.sleep(self.pause)
+
+        return total
+
+    def apply_age(self, queryset, date_field, max_age):
+        if max_age is None:
+            return 0
+        return self.delete_in_chunks(queryset.filter(**{f'{date_field}__lt': self.now - max_age}))
+
+    def apply_per_user_cap(self, queryset, user_field, max_per_user):
+        """
+        Only keeps the latest 'max_per_user' rows of every user,
+        ids are monotonic with creation time so they are used for ordering.
+        """
+        if max_per_user is None:
+            return 0
+
+        overCap = list(queryset.values(user_field).annotate(total=Count('pk'))
+                       .filter(total__gt=max_per_user).values_list(user_field, flat=True))
+        total = 0
+        for userId in overCap:
+            userRows = queryset.filter(**{user_field: userId})
+            cutoff = userRows.order_by('-pk').values_list('pk', flat=True)[max_per_user]
+            total += self.delete_in_chunks(userRows.filter(pk__lte=cutoff))
+        return total
+
+    def apply_policy(self, queryset, policy, *, date_field, user_field):
+        deleted = {}
+        deleted['age'] = self.apply_age(queryset, date_field, policy.get('MAX_AGE'))
+
+        readOlderThan = policy.get('READ_OLDER_THAN')
+        deleted['read'] = (self.apply_age(queryset.filter(read=True), date_field, readOlderThan)
+                           if readOlderThan is not None else 0)
+
+        deleted['cap'] = self.apply_per_user_cap(queryset, user_field, policy.get('MAX_PER_USER'))
+        return deleted
+
+    def apply_activity_retention(self):
+        return self.apply_policy(Activity.objects.all(), settings.ACTIVITY_RETENTION,
+                                 date_field='created', user_field='user')
+
+    def apply_message_retention(self):
+        return self.apply_policy(Message.objects.all(), settings.MESSAGE_RETENTION,
+                                 date_field='broadcast__created', user_field='receiver')
+
+    def archive_broadcasts(self, archive_after=None):
+        """
+        Rolls broadcasts older than 'archive_after' into ArchivedBroadcast,
+        chunks are limited by the number of Message rows they delete.
+        """
+        archive_after = archive_after or settings.BROADCAST_ARCHIVE_AFTER
+        if archive_after is None:
+            return 0
+
+        candidates = Broadcast.objects.filter(created__lt=self.now - archive_after)\
+                        .annotate(total_receivers=Count('message'))
+        lastPk = 0
+        total = 0
+        while True:
+            found = list(candidates.filter(pk__gt=lastPk).order_by('pk')[:self.chunk_size])
+            if not found:
+                break
+
+            chunk, messageCount = [], 0
+            for broadcast in found:
+                if chunk and messageCount + broadcast.total_receivers > self.chunk_size:
+                    break
+                chunk.append(broadcast)
+                messageCount += broadcast.total_receivers
+
+            ids = [broadcast.id for broadcast in chunk]
+            messages = defaultdict(list)
+            for broadcastId, receiverId, read in Message.objects.filter(broadcast__in=ids)\
+                                                    .values_list('broadcast', 'receiver', 'read'):
+                messages[broadcastId].append((receiverId, read))
+
+            if not self.dry_run:
+                with transaction.atomic():
+                    #Saved one by one since bulk_create() doesn't set the ids on SQLite.
+                    receiverRows = []
+                    for broadcast in chunk:
+                        archived = ArchivedBroadcast.from_broadcast(broadcast, messages[broadcast.id])
+                        archived.save()
+                        receiverRows.extend(ArchivedReceiver(archive=archived, receiver_id=receiverId)
+                                            for receiverId, _ in messages[broadcast.id])
+                    ArchivedReceiver.objects.bulk_create(receiverRows)
+                    Message.objects.filter(broadcast__in=ids).delete()
+                    Broadcast.objects.filter(pk__in=ids).delete()
+
+            total += len(chunk)
+            lastPk = ids[-1]
+            if self.pause:
+                time.sleep(self.pause)
+
+        return total
+
+    def purge_revoked_tokens(self):
+        """
+        Revoked signed tokens past their expiry would be rejected anyway.
+        """
+        return self.delete_in_chunks(RevokedToken.objects.filter(expires__lte=self.now))
@@ -0,0 +1,256 @@
+"""
+Full text search over faculty, student & batch lists.
+
+Every searchable model gets an FTS5 table (rowid = primary key) with word
+tokens & prefix indexes, queries are ranked with bm25 and scoped by joining
+back on the regular queryset, so permissions & ordering stay with the views.
+When no word/prefix matches, a second FTS5 table with the trigram tokenizer
+finds substrings (i.e 'mith' in 'Smith'), like the old icontains search did.
+
+Indexes are kept in sync by signals (connected in each models.py), created &
+repopulated on post_migrate (which flush sends too) and can be rebuilt with
+the 'rebuild_search_index' command. Without FTS5 searches fall back to icontains.
+"""
+
+import re
+
+from django.apps import apps
+from django.db import connection, DatabaseError
+
+
+TOKEN = re.compile(r'\w+', re.UNICODE)
+#Trigram tokenizer needs queries of atleast 3 characters.
+MIN_TRIGRAM_LENGTH = 3
+BATCH_SIZE = 1000
+
+
+class SearchIndex:
+
+    def __init__(self, name, model, fields, weights):
+        self.name = name
+        self.model_label = model
+        #ORM lookups of the indexed columns, the first one is used by the icontains fallback.
+        self.fields = fields
+        self.weights = weights
+
+    @property
+    def model(self):
+        return apps.get_model(self.model_label)
+
+    @property
+    def columns(self):
+        return [field.replace('__', '_') for field in self.fields]
+
+    def tables(self):
+        tables = [self.name]
+        if has_trigrams():
+            tables.append(f'{self.name}_trigram')
+        return tables
+
+    def create(self, cursor):
+        columns = ', '.join(self.columns)
+        cursor.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.name} "
+                       f"USING fts5({columns}, tokenize='unicode61', prefix='1 2 3')")
+        if has_trigrams():
+            cursor.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.name}_trigram "
+                           f"USING fts5({columns}, tokenize='trigram')")
+        #Matches in names weigh more than in emails.
+        ranking = ', '.join(str(weight) for weight in self.weights)
+        for table in self.tables():
+            cursor.execute(f"INSERT INTO {table}({table}, rank) VALUES ('rank', 'bm25({ranking})')")
+
+    def get_rows(self, pks=None):
+        rows = self.model._base_manager.order_by().values_list('pk', *self.fields)
+        if pks is not None:
+            rows = rows.filter(pk__in=pks)
+        return ((pk, *(value or '' for value in values)) for pk, *values in rows.iterator())
+
+    def delete(self, pks, cursor):
+        placeholders = ', '.join(['%s'] * len(pks))
+        for table in self.tables():
+            cursor.execute(f'DELETE FROM {table} WHERE rowid IN ({placeholders})', pks)
+
+    def insert(self, rows, cursor):
+        placeholders = ', '.join(['%s'] * (len(self.fields) + 1))
+        columns = ', '.join(['rowid', *self.columns])
+        for table in self.tables():
+            cursor.executemany(f'INSERT INTO {table}({columns}) VALUES ({placeholders})', rows)
+
+    def update(self, pks):
+        pks = list(pks)
+        if not pks or not is_available():
+            return
+        with connection.cursor() as cursor:
+            self.delete(pks, cursor)
+            self.insert(list(self.get_rows(pks)), cursor)
+
+    def remove(self, pks):
+        pks = list(pks)
+        if pks and is_available():
+            with connection.cursor() as cursor:
+                self.delete(pks, cursor)
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            for table in self.tables():
+                cursor.execute(f'DELETE FROM {table}')
+            rows = []
+            for row in self.get_rows():
+                rows.append(row)
+                if len(rows) == BATCH_SIZE:
+                    self.insert(rows, cursor)
+                    rows = []
+            if rows:
+                self.insert(rows, cursor)
+
+    def match(self, queryset, table, expression):
+        model = queryset.model
+        pk = f'{connection.ops.quote_name(model._meta.db_table)}.{connection.ops.quote_name(model._meta.pk.column)}'
+        #Unary '+' keeps SQLite from probing the FTS table once per row of the (indexed) scope,
+        #so the query is driven by the matches & every row is ranked once.
+        return queryset.extra(select={'search_rank': f'{table}.rank'}, tables=[table],
+                              where=[f'+{table}.rowid = {pk}', f'{table} MATCH %s'], params=[expression])\
+                       .order_by('search_rank', *queryset.query.order_by)
+
+    def get_matchers(self, query):
+        """
+        (table, MATCH expression) pairs to try in order.
+        """
+        matchers = []
+        tokens = TOKEN.findall(query)
+        if tokens:
+            #Every token has to match the start of a word i.e 'jo sm' finds 'John Smith'.
+            matchers.append((self.name, ' '.join(f'"{token}"*' for token in tokens)))
+        if has_trigrams() and len(query) >= MIN_TRIGRAM_LENGTH:
+            phrase = query.replace('"', '""')
+            matchers.append((f'{self.name}_trigram', f'"{phrase}"'))
+        return matchers
+
+    def fallback(self, queryset, query):
+        #Too short for trigrams (or no FTS5 at all), plain scan of the scope.
+        return queryset.filter(**{f'{self.fields[0]}__icontains': query})
+
+    def search(self, queryset, query):
+        query = query.strip()
+        if not is_available():
+            return self.fallback(queryset, query)
+
+        matchers = self.get_matchers(query)
+        for table, expression in matchers:
+            results = self.match(queryset, table, expression)
+            if results.exists():
+                return results
+        if matchers and matchers[-1][0].endswith('_trigram'):
+            return queryset.none()
+        return self.fallback(queryset, query)
+
+
+INDEXES = {index.model_label: index for index in (
+    SearchIndex('search_faculty', 'FacultyUser.FacultyProfile', ['name', 'user__email'], [10.0, 1.0]),
+    SearchIndex('search_student', 'StudentUser.StudentProfile', ['name', 'user__email'], [10.0, 1.0]),
+    SearchIndex('search_batch', 'base.Batch', ['title'], [1.0]),
+    SearchIndex('search_slot', 'base.Slot', ['title'], [1.0]),
+)}
+
+_available = None
+
+
+def has_trigrams():
+    #Trigram tokenizer was added in SQLite 3.34.
+    return connection.vendor == 'sqlite' and connection.Database.sqlite_version_info >= (3, 34, 0)
+
+
+def is_available():
+    global _available
+    if _available is None:
+        with connection.cursor() as cursor:
+            tables = set(connection.introspection.table_names(cursor))
+        _available = all(index.name in tables for index in INDEXES.values())
+    return _available
+
+
+def get_index(model):
+    return INDEXES[model._meta.label]
+
+
+def search(queryset, query):
+    """
+    Returns the rows of 'queryset' matching 'query', best matches first.
+    """
+    return get_index(queryset.model).search(queryset, query)
+
+
+def search_all(querysets, query, limit):
+    """
+    Searches several querysets (keyed by result type) at once, every type is tried
+    with word matches first & trigrams only when no type had a word match.
+    Returns upto 'limit' (type, instance) pairs, the types take turns in the order
+    of 'querysets' as bm25 ranks of different tables aren't comparable.
+    """
+    query = query.strip()
+    indexes = {kind: get_index(queryset.model) for kind, queryset in querysets.items()}
+    results = {}
+    if is_available():
+        for stage in range(2):
+            for kind, queryset in querysets.items():
+                matchers = indexes[kind].get_matchers(query)
+                if stage < len(matchers):
+                    table, expression = matchers[stage]
+                    results[kind] = list(indexes[kind].match(queryset, table, expression)[:limit])
+            if any(results.values()):
+                break
+        else:
+            if len(query) >= MIN_TRIGRAM_LENGTH and has_trigrams():
+                return []
+
+    if not any(results.values()):
+        results = {kind: list(indexes[kind].fallback(queryset, query)[:limit])
+                   for kind, queryset in querysets.items()}
+
+    merged = []
+    for position in range(limit):
+        merged.extend((kind, rows[position]) for kind, rows in results.items() if position < len(rows))
+    return merged[:limit]
+
+
+def setup_indexes(sender, **kwargs):
+    """
+    post_migrate handler, tables are created when missing & always repopulated
+    so a flushed or freshly migrated database never has a stale index.
+    """
+    global _available
+    if sender.label != 'base' or connection.vendor != 'sqlite':
+        return
+    try:
+        with connection.cursor() as cursor:
+            for index in INDEXES.values():
+                index.create(cursor)
+    except DatabaseError:
+        #SQLite was built without FTS5.
+        _available = False
+        return
+    _available = True
+    for index in INDEXES.values():
+        index.rebuild()
+
+
+def index_instance(sender, instance, raw=False, update_fields=None, **kwargs):
+    index = get_index(sender)
+    #Saves of unindexed columns only (i.e a preference toggle).
+    if raw or (update_fields is not None and
+               not {field.split('__')[0] for field in index.fields} & set(update_fields)):
+        return
+    index.update([instance.pk])
+
+def unindex_instance(sender, instance, **kwargs):
+    get_index(sender).remove([instance.pk])
+
+def reindex_user(sender, instance, created=False, update_fields=None, raw=False, **kwargs):
+    """
+    Emails are indexed along with the profile, logins only touch 'last_login'.
+    """
+    if raw or created or (update_fields is not None and 'email' not in update_fields):
+        return
+    for index in INDEXES.values():
+        if 'user__email' in index.fields:
+            index.update(index.model._base_manager.filter(user=instance).values_list('pk', flat=True))
@@ -3,6 +3,7 @@ from rest_framework import serializers
 
 from base.models import Activity, CustomUser, Slot
 from base.utils import get_elapsed_string
+from base.images import ImageTooLarge, check_dimensions
 
 """
 Slot Display Serializers for Admin,Faculty & students.
@@ -47,7 +48,7 @@ class SlotDisplayWithFacultySerializer(BaseSlotDisplaySerializer):
         request = self.context.get('request')
         faculty = instance.faculty
         return {'id':faculty.uuid,'name':faculty.name
-                ,'image':faculty.get_profile_image(request)}
+                ,'image':faculty.get_profile_image(request,avatar_size=32)}
 
 class StudentSlotDisplaySerializer(SlotDisplayWithFacultySerializer):
     pass
@@ -106,6 +107,26 @@ class ActivitySerializer(serializers.ModelSerializer):
         return get_elapsed_string(instance.created)
 
 
+class BoundedImageField(serializers.ImageField):
+    """
+    Checks the dimensions from the image header before Django/Pillow
+    validate the file, uploads are expected to be on disk (see UploadProfileImageView).
+    """
+    def to_internal_value(self, data):
+        #Anything that isn't an upload is rejected by FileField itself.
+        if hasattr(data, 'read'):
+            source = data.temporary_file_path() if hasattr(data, 'temporary_file_path') else data
+            try:
+                check_dimensions(source)
+            except ImageTooLarge as err:
+                raise serializers.ValidationError(str(err))
+            except Exception:
+                self.fail('invalid_image')
+            finally:
+                data.seek(0)
+        return super().to_internal_value(data)
+
+
 class UserImageSerializer(serializers.ModelSerializer):
 
     class Meta:
@@ -113,4 +134,4 @@ class UserImageSerializer(serializers.ModelSerializer):
         fields = ['profile_image']
 
     #Required
-    profile_image = serializers.ImageField(allow_null=False, max_length=100, required=True)
+    profile_image = BoundedImageField(allow_null=False, max_length=100, required=True)
@@ -0,0 +1,192 @@
+"""
+Slow query log written by SlowQueryMiddleware (base/middleware.py).
+
+Every query of a request taking atleast SLOW_QUERY_LOG['THRESHOLD'] seconds
+is written as a JSON line to a rotating file (one per process, so workers
+never rotate each other's file) along with the URL name of the view, the
+innermost stack frame in one of the apps & its EXPLAIN QUERY PLAN.
+Only the execute() call is timed, rows fetched afterwards aren't. The
+'slow_query_report' command aggregates the file by normalized SQL.
+"""
+
+import os
+import re
+import glob
+import json
+import time
+import logging
+import threading
+import traceback
+from logging.handlers import RotatingFileHandler
+
+from django.conf import settings
+from django.utils import timezone
+
+
+APPS = ('base', 'AdminUser', 'FacultyUser', 'StudentUser')
+#Statements EXPLAIN works for, not BEGIN, SAVEPOINT & the like.
+EXPLAINABLE = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH')
+#Instrumentation, never the origin of a query.
+IGNORED_FILES = {os.path.join('base', name) for name in ('slowqueries.py', 'middleware.py', 'profiling.py')}
+
+_handler = {'path': None, 'logger': None}
+_handlerLock = threading.Lock()
+
+
+def get_process_file(path):
+    """
+    Every process writes (& rotates) a file of its own, i.e slow_queries.log -> slow_queries-<pid>.log
+    """
+    root, extension = os.path.splitext(path)
+    return f'{root}-{os.getpid()}{extension}'
+
+
+def get_logger():
+    """
+    Logger writing to this process's SLOW_QUERY_LOG['FILE'], (re)created whenever the setting changes.
+    """
+    config = settings.SLOW_QUERY_LOG
+    path = get_process_file(config['FILE'])
+    with _handlerLock:
+        if _handler['path'] != path:
+            logger = logging.getLogger('base.slowqueries')
+            logger.propagate = False
+            logger.setLevel(logging.INFO)
+            for handler in list(logger.handlers):
+                logger.removeHandler(handler)
+                handler.close()
+            handler = RotatingFileHandler(path, maxBytes=config['MAX_BYTES'],
+                                          backupCount=config['BACKUP_COUNT'], delay=True)
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            logger.addHandler(handler)
+            _handler.update(path=path, logger=logger)
+        return _handler['logger']
+
+
+def get_log_files(path):
+    """
+    The files of every process along with their rotated backups.
+    """
+    root, extension = os.path.splitext(path)
+    files = glob.glob(f'{glob.escape(root)}-*{extension}')
+    files += glob.glob(f'{glob.escape(root)}-*{extension}.*')
+    return sorted(name for name in files if re.search(r'-\d+' + re.escape(extension) + r'(\.\d+)?$', name))
+
+
+def describe_params(params, many):
+    """
+    Bind parameters are tokens, password hashes, emails..., only their types are logged unless LOG_PARAMS is set.
+    """
+    if settings.SLOW_QUERY_LOG.get('LOG_PARAMS'):
+        return repr(params)[:500]
+    if params is None:
+        return None
+    if many:
+        return f'{len(params)} parameter sets'
+    values = params.values() if isinstance(params, dict) else params
+    return [type(value).__name__ for value in values]
+
+
+def get_origin():
+    """
+    'app/module.py:line in function' of the innermost frame in one of the APPS.
+    """
+    for frame, lineno in traceback.walk_stack(None):
+        path = os.path.relpath(frame.f_code.co_filename, settings.BASE_DIR)
+        if path.split(os.sep, 1)[0] in APPS and path not in IGNORED_FILES:
+            return f'{path}:{lineno} in {frame.f_code.co_name}'
+    return None
+
+
+def explain(connection, sql, params):
+    """
+    Query plan rows, run on a backend cursor so it neither goes through the
+    execute wrappers nor disturbs the rows of the original cursor.
+    """
+    if not (connection.features.supports_explaining_query_execution and
+            sql.lstrip().upper().startswith(EXPLAINABLE)):
+        return None
+    cursor = connection.create_cursor()
+    try:
+        cursor.execute(f'{connection.ops.explain_query_prefix()} {sql}', params)
+        return [' | '.join(str(column) for column in row) for row in cursor.fetchall()]
+    except Exception as err:
+        return [f'EXPLAIN failed: {err!r}']
+    finally:
+        cursor.close()
+
+
+def normalize(sql):
+    """
+    Groups queries which only differ by their literals or the length of an IN (...) list.
+    """
+    sql = re.sub(r"'(?:[^']|'')*'", '?', sql)
+    sql = re.sub(r'\b\d+(?:\.\d+)?\b', '?', sql)
+    sql = sql.replace('%s', '?')
+    sql = re.sub(r'\(\s*\?(?:\s*,\s*\?)*\s*\)', '(...)', sql)
+    return re.sub(r'\s+', ' ', sql).strip()
+
+
+class SlowQueryRecorder:
+    """
+    Execute wrapper of a single request.
+    """
+    def __init__(self, request, threshold):
+        self.request = request
+        self.threshold = threshold
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        result = execute(sql, params, many, context)
+        duration = time.perf_counter() - start
+        if duration >= self.threshold:
+            self.record(sql, params, many, duration, context['connection'])
+        return result
+
+    def record(self, sql, params, many, duration, connection):
+        match = self.request.resolver_match
+        entry = {'time': timezone.now().isoformat(),
+                 'duration_ms': round(duration * 1000, 3),
+                 'view': match.url_name if match is not None else None,
+                 'method': self.request.method,
+                 'path': self.request.path,
+                 'origin': get_origin(),
+                 'sql': sql,
+                 'normalized': normalize(sql),
+                 'params': describe_params(params, many),
+                 #executemany gets a list of parameter sets, there's no single plan.
+                 'plan': None if many else explain(connection, sql, params)}
+        get_logger().info(json.dumps(entry))
+
+
+def summarize(entries):
+    """
+    Aggregates log entries by normalized SQL, the slowest (by total time) first.
+    """
+    groups = {}
+    for entry in entries:
+        group = groups.setdefault(entry['normalized'], {'sql': entry['normalized'], 'count': 0, 'total_ms': 0,
+                                                        'max_ms': -1, 'views': {}, 'origins': {}, 'plan': None})
+        group['count'] += 1
+        group['total_ms'] += entry['duration_ms']
+        for key, value in (('views', entry['view']), ('origins', entry['origin'])):
+            group[key][value] = group[key].get(value, 0) + 1
+        #The plan of the slowest run.
+        if entry['duration_ms'] > group['max_ms']:
+            group.update(max_ms=entry['duration_ms'], plan=entry['plan'])
+
+    for group in groups.values():
+        group.update(total_ms=round(group['total_ms'], 3), mean_ms=round(group['total_ms'] / group['count'], 3))
+    return sorted(groups.values(), key=lambda group: group['total_ms'], reverse=True)
+
+
+def read_entries(path):
+    entries = []
+    for name in get_log_files(path):
+        with open(name) as log:
+            for line in log:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    continue
+    return entries
@@ -0,0 +1,103 @@
+"""
+Content addressed storage for processed profile images.
+
+Files are named after the hash of their content, so identical images are
+stored once and a URL always points to the same bytes, which lets them be
+cached forever. Since files can be shared between users they are never
+deleted inline, the 'collect_media' command removes unreferenced ones.
+"""
+
+import os
+import re
+import hashlib
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+CHUNK_SIZE = 64 * 1024
+DIGEST_LENGTH = 32
+#Content addressed URLs never change, so clients & proxies can cache them forever.
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+#Hashed names, optionally followed by an avatar size i.e '<digest>_64.webp'.
+HASHED_NAME = re.compile(r'^[0-9a-f]{%d}(_\d+)?\.\w+$' % DIGEST_LENGTH)
+
+
+def hash_file(file):
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: file.read(CHUNK_SIZE), b''):
+        digest.update(chunk)
+    return digest.hexdigest()[:DIGEST_LENGTH]
+
+
+def hash_path(path):
+    with open(path, 'rb') as file:
+        return hash_file(file)
+
+
+def is_immutable(name):
+    return HASHED_NAME.match(os.path.basename(name)) is not None
+
+
+def touch(path):
+    """
+    Reused files are touched so 'collect_media' never
+    treats them as old orphans right after they got referenced again.
+    """
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        pass
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+
+    def hashed_name(self, name, digest):
+        directory, filename = os.path.split(name)
+        _, extension = os.path.splitext(filename)
+        return os.path.join(directory, f'{digest}{extension.lower()}')
+
+    def get_available_name(self, name, max_length=None):
+        #Final name is only known once the content is hashed in _save().
+        return name
+
+    def _save(self, name, content):
+        content.seek(0)
+        name = self.hashed_name(name, hash_file(content))
+        path = self.path(name)
+        if os.path.exists(path):
+            touch(path)
+            return name
+
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        #Written next to the target & renamed, so concurrent saves of the same content are harmless.
+        fd, temporary = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            content.seek(0)
+            with os.fdopen(fd, 'wb') as file:
+                for chunk in content.chunks():
+                    file.write(chunk)
+            if self.file_permissions_mode is not None:
+                os.chmod(temporary, self.file_permissions_mode)
+            os.replace(temporary, path)
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+        return name
+
+    def ingest(self, name):
+        """
+        Moves a file written directly to disk (i.e by the image worker)
+        to its hashed name in the same directory.
+        """
+        path = self.path(name)
+        name = self.hashed_name(name, hash_path(path))
+        os.replace(path, self.path(name))
+        return name
+
+
+content_storage = ContentAddressedStorage()
@@ -1,3 +1,1028 @@
-from django.test import TestCase
+import os
+import json
+import pickle
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
+from datetime import time, timedelta
+
+from PIL import Image
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client, TransactionTestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework.authtoken.models import Token
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from AdminUser.models import AdminProfile
+from FacultyUser.models import FacultyProfile
+from StudentUser.models import StudentProfile
+from base.models import (Activity, ArchivedBroadcast, Batch, BatchAssignment, Broadcast, CustomUser, ImageJob,
+                         Message, RevokedToken, Slot)
+from base import images, metrics, querybudget, slowqueries
+from base.retention import RetentionEngine
+from base.authentication import TokenProfileCache, profile_cache
+from base.tokens import AccessToken
+from base.images import MAIN_SIZE, decode_reduced, get_avatar_names
+from base.utils import get_avatar, get_image
+from base.views import serve_media
+
+
+#Auth cache of the tests, never the one configured by TRACKR_AUTH_CACHE_DIR.
+TEST_CACHES = {**settings.CACHES,
+               'auth': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                        'LOCATION': 'trackr-auth-tests'}}
+
+
+def count_activity_inserts(queries):
+    return len([query for query in queries
+                if query['sql'].startswith('INSERT INTO "base_activity"')])
+
+
+class ActivityBuffer(TransactionTestCase):
+
+    def setUp(self):
+        self.admin = AdminProfile.create_profile(name='admin', email='admin@test.com',
+                                                 password='password', timezone='Asia/Kolkata')
+        self.sourceBatch = Batch.objects.create(title='source', admin=self.admin)
+        self.destinationBatch = Batch.objects.create(title='destination', admin=self.admin)
+
+        for index in range(5):
+            user = CustomUser.objects.create_user(f'student{index}@test.com', 'password',
+                                                  user_type=CustomUser.STUDENT)
+            StudentProfile.objects.create(user=user, name=f'student{index}', batch=self.sourceBatch)
+
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin.user)
+
+    def test_single_insert_per_request(self):
+        """
+        Moving 5 students logs 6 activities (5 students + admin),
+        which used to cost 2 inserts, now written by a single bulk insert.
+        """
+        url = reverse('admin-move-students', kwargs={'source_batch_id': self.sourceBatch.uuid,
+                                                     'destination_batch_id': self.destinationBatch.uuid})
+        activitiesBefore = Activity.objects.count()
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.put(url, {'students': []}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(count_activity_inserts(queries.captured_queries), 1)
+        self.assertEqual(Activity.objects.count() - activitiesBefore, 6)
+
+    def test_rolled_back_activities_are_discarded(self):
+        activitiesBefore = Activity.objects.count()
+
+        try:
+            with transaction.atomic():
+                Activity.log(user=self.admin.user, text='never committed')
+                raise ValueError
+        except ValueError:
+            pass
+
+        with transaction.atomic():
+            Activity.log(user=self.admin.user, text='committed')
+
+        self.assertEqual(Activity.objects.count() - activitiesBefore, 1)
+        self.assertFalse(Activity.objects.filter(text='never committed').exists())
+
+    def test_rolled_back_savepoints_are_discarded(self):
+        with transaction.atomic():
+            Activity.log(user=self.admin.user, text='before')
+            try:
+                with transaction.atomic():
+                    Activity.log(user=self.admin.user, text='rolled back')
+                    raise ValueError
+            except ValueError:
+                pass
+            with transaction.atomic():
+                Activity.log(user=self.admin.user, text='released')
+            Activity.log(user=self.admin.user, text='after')
+            self.assertFalse(Activity.objects.filter(text__in=['before', 'released', 'after']).exists())
+
+        self.assertEqual(set(Activity.objects.filter(text__in=['before', 'rolled back', 'released', 'after'])
+                             .values_list('text', flat=True)), {'before', 'released', 'after'})
+
+
+@override_settings(ACTIVITY_RETENTION={'MAX_AGE': timedelta(days=30), 'READ_OLDER_THAN': timedelta(days=7),
+                                       'MAX_PER_USER': 3},
+                   MESSAGE_RETENTION={'MAX_AGE': None, 'READ_OLDER_THAN': None, 'MAX_PER_USER': None},
+                   BROADCAST_ARCHIVE_AFTER=timedelta(days=30))
+class Retention(TransactionTestCase):
+
+    def setUp(self):
+        self.admin = AdminProfile.create_profile(name='admin', email='admin@test.com',
+                                                 password='password', timezone='Asia/Kolkata')
+        self.student = CustomUser.objects.create_user('student@test.com', 'password',
+                                                      user_type=CustomUser.STUDENT)
+        Activity.objects.all().delete()
+
+    def create_activity(self, days_old, read=False):
+        activity = Activity.objects.create(user=self.student, text=f'{days_old} days old', read=read)
+        Activity.objects.filter(pk=activity.pk).update(created=timezone.now() - timedelta(days=days_old))
+
+    def test_activity_policies(self):
+        self.create_activity(60)
+        self.create_activity(10, read=True)
+        self.create_activity(10)
+        for _ in range(4):
+            self.create_activity(1)
+
+        deleted = RetentionEngine(chunk_size=2).apply_activity_retention()
+
+        self.assertEqual(deleted, {'age': 1, 'read': 1, 'cap': 2})
+        self.assertEqual(list(Activity.objects.values_list('text', flat=True)), ['1 days old'] * 3)
+
+    def test_broadcast_archive(self):
+        client = APIClient()
+        for days_old in (60, 1):
+            broadcast = Broadcast.objects.create(sender=self.admin.user, text=f'{days_old} days old')
+            broadcast.receivers.add(self.student)
+            Broadcast.objects.filter(pk=broadcast.pk).update(created=timezone.now() - timedelta(days=days_old))
+        Message.objects.filter(broadcast__text='60 days old').update(read=True)
+
+        self.assertEqual(RetentionEngine().archive_broadcasts(), 1)
+        self.assertEqual(Broadcast.objects.count(), 1)
+        self.assertEqual(Message.objects.count(), 1)
+
+        archived = ArchivedBroadcast.objects.get()
+        self.assertEqual(archived.get_receivers(), {self.student.id: True})
+        self.assertEqual(list(archived.receiver_rows.values_list('receiver', flat=True)), [self.student.id])
+
+        client.force_authenticate(user=self.student)
+        response = client.get(reverse('show-broadcast'), {'archived': 'true'})
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual(response.data['results'][0]['text'], '60 days old')
+        self.assertTrue(response.data['results'][0]['read'])
+
+        client.force_authenticate(user=self.admin.user)
+        response = client.get(reverse('show-broadcast'), {'archived': 'true'})
+        self.assertEqual(response.data['results'][0]['receivers'][0]['email'], self.student.email)
+
+
+class BatchAssignments(TransactionTestCase):
+
+    def setUp(self):
+        self.admin = AdminProfile.create_profile(name='admin', email='admin@test.com',
+                                                 password='password', timezone='Asia/Kolkata')
+        self.batch = Batch.objects.create(title='batch', admin=self.admin)
+        self.faculty = FacultyProfile.objects.create(name='faculty', admin=self.admin)
+        self.other = FacultyProfile.objects.create(name='other', admin=self.admin)
+
+    def create_slot(self, weekday, faculty=None, batch=None):
+        return Slot.create_slot(title='slot', start_time=time(hour=8), end_time=time(hour=9), weekday=weekday,
+                                faculty=faculty or self.faculty, batch=batch or self.batch)
+
+    def get_assignments(self):
+        return set(BatchAssignment.objects.values_list('batch__title', 'faculty__name', 'slot_count'))
+
+    def test_kept_in_sync_with_slots(self):
+        first = self.create_slot(0)
+        second = self.create_slot(1)
+        self.assertEqual(self.get_assignments(), {('batch', 'faculty', 2)})
+        self.assertEqual(list(self.batch.getAssignedFaculties()), [self.faculty])
+        self.assertEqual(list(self.faculty.assignedBatches()), [self.batch])
+
+        second.update_slot(title='slot', start_time=time(hour=8), end_time=time(hour=9),
+                           weekday=1, faculty=self.other)
+        self.assertEqual(self.get_assignments(), {('batch', 'faculty', 1), ('batch', 'other', 1)})
+
+        first.delete()
+        self.assertEqual(self.get_assignments(), {('batch', 'other', 1)})
+
+        self.faculty.delete_profile()
+        self.other.delete_profile()
+        self.assertEqual(self.get_assignments(), set())
+
+    def test_cascades(self):
+        otherBatch = Batch.objects.create(title='other batch', admin=self.admin)
+        self.create_slot(0)
+        self.create_slot(1, batch=otherBatch)
+        self.batch.delete()
+        self.assertEqual(self.get_assignments(), {('other batch', 'faculty', 1)})
+
+        BatchAssignment.objects.all().delete()
+        BatchAssignment.rebuild()
+        self.assertEqual(self.get_assignments(), {('other batch', 'faculty', 1)})
+
+
+
+class BatchCounters(TransactionTestCase):
+
+    def setUp(self):
+        self.admin = AdminProfile.create_profile(name='admin', email='admin@test.com',
+                                                 password='password', timezone='Asia/Kolkata')
+        self.batch = Batch.objects.create(title='batch', admin=self.admin)
+        self.other = Batch.objects.create(title='other', admin=self.admin)
+        self.faculty = FacultyProfile.objects.create(name='faculty', admin=self.admin)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin.user)
+
+    def create_student(self, index, batch=None):
+        return StudentProfile.create_profile(name=f'student {index}', email=f'student{index}@test.com',
+                                             password='password', batch=batch or self.batch,
+                                             receive_email_notification=False)
+
+    def get_counters(self):
+        return dict(Batch.objects.values_list('title', 'student_count')), \
+               dict(Batch.objects.values_list('title', 'slot_count'))
+
+    def test_student_counter(self):
+        students = [self.create_student(index) for index in range(3)]
+        self.assertEqual(self.get_counters()[0], {'batch': 3, 'other': 0})
+
+        response = self.client.put(reverse('admin-move-students', args=[self.batch.uuid, self.other.uuid]),
+                                   {'students': [str(students[0].uuid)]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.get_counters()[0], {'batch': 2, 'other': 1})
+
+        students[1].batch = self.other
+        students[1].save()
+        students[2].user.delete()
+        self.assertEqual(self.get_counters()[0], {'batch': 0, 'other': 2})
+
+        response = self.client.put(reverse('admin-delete-students', args=[self.other.uuid]),
+                                   {'students': []}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.get_counters()[0], {'batch': 0, 'other': 0})
+
+    def test_slot_counter(self):
+        slot = Slot.create_slot(title='slot', start_time=time(hour=8), end_time=time(hour=9), weekday=0,
+                                faculty=self.faculty, batch=self.batch)
+        self.assertEqual(self.get_counters()[1], {'batch': 1, 'other': 0})
+
+        slot.batch = self.other
+        slot.save()
+        self.assertEqual(self.get_counters()[1], {'batch': 0, 'other': 1})
+
+        slot.delete()
+        self.assertEqual(self.get_counters()[1], {'batch': 0, 'other': 0})
+
+    def test_bulk_slot_delete(self):
+        for weekday in range(3):
+            Slot.create_slot(title='slot', start_time=time(hour=8), end_time=time(hour=9), weekday=weekday,
+                             faculty=self.faculty, batch=self.batch if weekday else self.other)
+        deleted = Slot.bulk_delete_slots(Slot.objects.filter(batch=self.batch))
+        self.assertEqual(deleted, 2)
+        self.assertEqual(self.get_counters()[1], {'batch': 0, 'other': 1})
+        self.assertFalse(Batch.objects.drifted().exists())
+        self.assertEqual(list(BatchAssignment.objects.values_list('batch__title', flat=True)), ['other'])
+
+    def test_stale_instance_keeps_counters(self):
+        stale = Batch.objects.get(pk=self.batch.pk)
+        self.create_student(0)
+        stale.title = 'renamed'
+        stale.save()
+        self.assertEqual(self.get_counters()[0], {'renamed': 1, 'other': 0})
+
+    def test_repair_counters(self):
+        self.create_student(0)
+        self.create_student(1, batch=self.other)
+        Batch.objects.update(student_count=7, slot_count=3)
+
+        out = StringIO()
+        call_command('repair_counters', '--dry-run', stdout=out)
+        self.assertIn('2 batches', out.getvalue())
+        self.assertEqual(self.get_counters()[0], {'batch': 7, 'other': 7})
+
+        call_command('repair_counters', stdout=StringIO())
+        self.assertEqual(self.get_counters(), ({'batch': 1, 'other': 1}, {'batch': 0, 'other': 0}))
+        self.assertFalse(Batch.objects.drifted().exists())
+
+class QueryPlans(TransactionTestCase):
+    """
+    Runs EXPLAIN QUERY PLAN on the SQL the hot views actually run,
+    so an index can't silently stop being used.
+    """
+    def setUp(self):
+        self.admin = AdminProfile.create_profile(name='admin', email='admin@test.com',
+                                                 password='password', timezone='Asia/Kolkata')
+        self.batch = Batch.objects.create(title='batch', admin=self.admin)
+        user = CustomUser.objects.create_user('faculty@test.com', 'password', user_type=CustomUser.FACULTY)
+        self.faculty = FacultyProfile.objects.create(name='faculty', admin=self.admin, user=user,
+                                                     status=FacultyProfile.VERIFIED)
+        self.student = StudentProfile.create_profile(name='student', email='student@test.com', password='password',
+                                                     batch=self.batch, receive_email_notification=False)
+        self.slot = Slot.create_slot(title='slot', start_time=time(hour=8), end_time=time(hour=9),
+                                     weekday=0, faculty=self.faculty, batch=self.batch)
+
+    def get_plans(self, user, method, url, data=None):
+        """
+        {SQL: plan} of the SELECTs run by the request.
+        """
+        client = APIClient()
+        client.force_authenticate(user=user)
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(client, method)(url, data)
+        self.assertLess(response.status_code, 300, response.data)
+
+        plans = {}
+        with connection.cursor() as cursor:
+            for query in queries.captured_queries:
+                if query['sql'].startswith('SELECT'):
+                    cursor.execute(f"EXPLAIN QUERY PLAN {query['sql']}")
+                    plans[query['sql']] = [row[-1] for row in cursor.fetchall()]
+        return plans
+
+    def assertIndexUsed(self, plans, table, index):
+        steps = [step for plan in plans.values() for step in plan]
+        self.assertTrue(any(index in step for step in steps), f'{index} not used in {plans}')
+
+        fullScans = [step for step in steps if step.startswith('SCAN') and f'{table} ' in f'{step} ' and
+                     'INDEX' not in step]
+        self.assertEqual(fullScans, [], f'Full scan of {table} in {plans}')
+
+    def test_slot_queries(self):
+        plans = self.get_plans(self.admin.user, 'post', reverse('admin-slots'), {
+            'title': 'other', 'batch': str(self.batch.uuid), 'faculty': str(self.faculty.uuid),
+            'start_time': '10:00', 'end_time': '11:00', 'weekday': 0})
+        self.assertIndexUsed(plans, 'base_slot', 'slot_faculty_weekday_idx')
+        self.assertIndexUsed(plans, 'base_slot', 'slot_batch_weekday_idx')
+
+        plans = self.get_plans(self.faculty.user, 'get', '/api/faculty/timeline/')
+        self.assertIndexUsed(plans, 'base_slot', 'slot_faculty_weekday_idx')
+
+        plans = self.get_plans(self.student.user, 'get', '/api/student/timeline/')
+        self.assertIndexUsed(plans, 'base_slot', 'slot_batch_weekday_idx')
+
+    def test_activity_and_message_queries(self):
+        user = self.student.user
+        self.assertIndexUsed(self.get_plans(user, 'get', reverse('show-activity')),
+                             'base_activity', 'activity_user_read_idx')
+        self.assertIndexUsed(self.get_plans(user, 'post', reverse('mark-activity-as-read')),
+                             'base_activity', 'activity_user_read_idx')
+        self.assertIndexUsed(self.get_plans(user, 'post', reverse('mark-broadcast-as-read')),
+                             'base_message', 'message_receiver_read_idx')
+
+    def test_admin_queries(self):
+        user = self.admin.user
+        self.assertIndexUsed(self.get_plans(user, 'get', reverse('admin-batch-detailed-list')),
+                             'base_batch', 'batch_admin_created_idx')
+        self.assertIndexUsed(self.get_plans(user, 'get', reverse('admin-broadcast-target')),
+                             'FacultyUser_facultyprofile', 'faculty_admin_status_idx')
+        self.assertIndexUsed(self.get_plans(user, 'get', reverse('faculty-stats')),
+                             'FacultyUser_facultyprofile', 'faculty_admin_status_idx')
+        self.assertIndexUsed(self.get_plans(user, 'get', reverse('admin-list-students', args=[self.batch.uuid])),
+                             'StudentUser_studentprofile', 'student_batch_joined_idx')
+
+    def test_archived_broadcast_queries(self):
+        broadcast = Broadcast.objects.create(sender=self.admin.user, text='old')
+        broadcast.receivers.add(self.faculty.user, self.student.user)
+        RetentionEngine().archive_broadcasts(archive_after=timedelta(0))
+
+        for user in (self.faculty.user, self.student.user):
+            plans = self.get_plans(user, 'get', reverse('show-broadcast'), {'archived': 'true'})
+            #The receivers subquery aliases its table as U0, the unique constraint is SQLite's autoindex.
+            self.assertIndexUsed(plans, 'U0', 'sqlite_autoindex_base_archivedreceiver')
+            self.assertIndexUsed(plans, 'base_archivedbroadcast', 'INTEGER PRIMARY KEY')
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ProfileCache(TransactionTestCase):
+
+    def setUp(self):
+        profile_cache.clear()
+        self.admin = AdminProfile.create_profile(name='admin', email='admin@test.com',
+                                                 password='password', timezone='Asia/Kolkata')
+        self.batch = Batch.objects.create(title='batch', admin=self.admin)
+        user = CustomUser.objects.create_user('student@test.com', 'password', user_type=CustomUser.STUDENT)
+        self.student = StudentProfile.objects.create(user=user, name='student', batch=self.batch)
+
+    def get_client(self, user):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.get(user=user).key}')
+        return client
+
+    def test_no_auth_queries_when_cached(self):
+        client = self.get_client(self.admin.user)
+        client.get(reverse('faculty-stats'))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(reverse('faculty-stats'))
+
+        self.assertEqual(response.status_code, 200)
+        tables = ' '.join(query['sql'] for query in queries.captured_queries)
+        for table in ('authtoken_token', 'base_customuser', 'AdminUser_adminprofile'):
+            self.assertNotIn(table, tables)
+
+    def test_logout_invalidates(self):
+        client = self.get_client(self.admin.user)
+        self.assertEqual(client.get(reverse('faculty-stats')).status_code, 200)
+        self.assertEqual(client.delete(reverse('logout')).status_code, 200)
+        self.assertEqual(client.get(reverse('faculty-stats')).status_code, 401)
+
+    def test_student_delete_invalidates(self):
+        studentClient = self.get_client(self.student.user)
+        response = studentClient.get('/api/student/timeline/')
+        self.assertEqual(response.data['data'], 'No classes assigned by the Admin yet!')
+
+        adminClient = self.get_client(self.admin.user)
+        url = reverse('admin-delete-students', kwargs={'batch_id': self.batch.uuid})
+        self.assertEqual(adminClient.put(url, {'students': []}, format='json').status_code, 200)
+
+        response = studentClient.get('/api/student/timeline/')
+        self.assertEqual(response.data['data'], 'Your Account has been deleted by the admin!')
+
+    def test_single_query_resolution(self):
+        """
+        Token, user, profile, batch & admin are resolved by one joined query,
+        so the detailed profile needs 1 query on a cold cache and none afterwards.
+        """
+        client = self.get_client(self.student.user)
+        for expectedQueries in (1, 0):
+            with CaptureQueriesContext(connection) as queries:
+                response = client.get(reverse('profile'), {'detail': 'true'})
+
+            self.assertEqual(response.status_code, 200)
+            #BEGIN is issued by ATOMIC_REQUESTS.
+            sql = [query['sql'] for query in queries.captured_queries if query['sql'] != 'BEGIN']
+            self.assertEqual(len(sql), expectedQueries, sql)
+            self.assertEqual(response.data['data']['details']['batch'], self.batch.title)
+            self.assertEqual(response.data['data']['details']['admin'], self.admin.name)
+
+    def test_invalidation_reaches_other_workers(self):
+        client = self.get_client(self.admin.user)
+        self.assertEqual(client.get(reverse('faculty-stats')).status_code, 200)
+
+        #Another worker shares the cache, not the process.
+        otherWorker = TokenProfileCache(alias=settings.AUTH_CACHE['ALIAS'], ttl=settings.AUTH_CACHE['TTL'])
+        key = Token.objects.get(user=self.admin.user).key
+        self.assertIsNotNone(otherWorker.get(key))
+        profile_cache.invalidate(('user', self.admin.user.pk))
+        self.assertIsNone(otherWorker.get(key))
+
+    def test_no_secrets_cached(self):
+        client = self.get_client(self.admin.user)
+        self.assertEqual(client.get(reverse('faculty-stats')).status_code, 200)
+
+        key = Token.objects.get(user=self.admin.user).key
+        entry = pickle.dumps(profile_cache.cache.get(profile_cache.get_key(key)))
+        self.assertNotIn(key.encode(), entry)
+        self.assertNotIn(self.admin.user.password.encode(), entry)
+        self.assertNotIn(b'rest_framework', entry)
+
+    def test_toggle_keeps_concurrent_changes(self):
+        client = self.get_client(self.student.user)
+        self.assertEqual(client.get(reverse('profile')).status_code, 200)
+
+        #The admin moves the student while its profile is cached.
+        other = Batch.objects.create(title='other', admin=self.admin)
+        StudentProfile.objects.filter(pk=self.student.pk).update(batch=other)
+
+        response = client.post(reverse('toggle-notification'))
+        self.assertEqual(response.status_code, 200)
+        student = StudentProfile.objects.get(pk=self.student.pk)
+        self.assertEqual((student.batch_id, student.receive_email_notification), (other.id, response.data['data']))
+
+
+@override_settings(SIGNED_ACCESS_TOKENS=True, CACHES=TEST_CACHES)
+class SignedAccessTokens(TransactionTestCase):
+
+    def setUp(self):
+        profile_cache.clear()
+        self.admin = AdminProfile.create_profile(name='admin', email='admin@test.com',
+                                                 password='password', timezone='Asia/Kolkata')
+        self.client = APIClient()
+
+    def login(self):
+        response = self.client.post(reverse('login'), {'email': 'admin@test.com', 'password': 'password'})
+        token = response.data['data']['token']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+        return token
+
+    def test_no_token_table_reads(self):
+        token = self.login()
+        self.assertTrue(AccessToken.is_signed(token))
+
+        profile_cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('faculty-stats'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(any('authtoken_token' in query['sql'] for query in queries.captured_queries))
+
+    def test_logout_revokes(self):
+        self.login()
+        self.assertEqual(self.client.delete(reverse('logout')).status_code, 200)
+        self.assertEqual(RevokedToken.objects.count(), 1)
+        self.assertEqual(self.client.get(reverse('faculty-stats')).status_code, 401)
+
+    def test_user_delete_revokes_on_commit(self):
+        with transaction.atomic():
+            self.admin.user.delete()
+            self.assertFalse(RevokedToken.objects.exists())
+        self.assertEqual(RevokedToken.objects.get().user_id, self.admin.user_id)
+
+        other = AdminProfile.create_profile(name='other', email='other@test.com',
+                                            password='password', timezone='Asia/Kolkata')
+        with transaction.atomic():
+            other.user.delete()
+            transaction.set_rollback(True)
+        with override_settings(SIGNED_ACCESS_TOKENS=False):
+            CustomUser.objects.get(email='other@test.com').delete()
+        self.assertEqual(RevokedToken.objects.count(), 1)
+
+    def test_tampered_token(self):
+        token = self.login()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token[:-1]}x')
+        self.assertEqual(self.client.get(reverse('faculty-stats')).status_code, 401)
+
+    def test_db_tokens_keep_working(self):
+        key = Token.objects.get(user=self.admin.user).key
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {key}')
+        self.assertEqual(self.client.get(reverse('faculty-stats')).status_code, 200)
+
+
+class ImagePipeline(TransactionTestCase):
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.admin = AdminProfile.create_profile(name='admin', email='admin@test.com',
+                                                 password='password', timezone='Asia/Kolkata')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin.user)
+
+    def upload(self, size, color=(255, 0, 0), client=None):
+        upload = BytesIO()
+        Image.new('RGB', size, color).save(upload, 'JPEG')
+        upload.name = 'photo.jpg'
+        upload.seek(0)
+        client = client or self.client
+        return client.post(reverse('upload-profile-image'), {'profile_image': upload}, format='multipart')
+
+    def test_upload_is_processed_by_worker(self):
+        response = self.upload((2000, 2000))
+        self.assertEqual(response.status_code, 202)
+
+        user = CustomUser.objects.get(pk=self.admin.user.pk)
+        self.assertEqual(user.profile_image.name, settings.PROFILE_IMAGE_PLACEHOLDER)
+        self.assertTrue(response.data['data'].endswith(settings.PROFILE_IMAGE_PLACEHOLDER))
+        self.assertEqual(ImageJob.objects.count(), 1)
+
+        call_command('process_images', once=True, workers=1, stdout=StringIO())
+
+        user = CustomUser.objects.get(pk=self.admin.user.pk)
+        self.assertEqual(ImageJob.objects.count(), 0)
+        with Image.open(user.profile_image.path) as main, Image.open(user.thumbnail.path) as thumbnail:
+            self.assertEqual(main.size, (1080, 1080))
+            self.assertEqual(thumbnail.size, (240, 240))
+
+    def test_avatar_variants(self):
+        self.upload((800, 600))
+        call_command('process_images', once=True, workers=1, stdout=StringIO())
+
+        user = CustomUser.objects.get(pk=self.admin.user.pk)
+        variants = get_avatar_names(user.user_type, user.avatar_key)
+        self.assertEqual(len(variants), len(settings.AVATAR_SIZES) * 2)
+        for (size, extension), name in variants.items():
+            with Image.open(user.thumbnail.storage.path(name)) as avatar:
+                self.assertEqual(avatar.size, (size, size))
+                self.assertEqual(avatar.format, 'WEBP' if extension == 'webp' else 'JPEG')
+
+        factory = APIRequestFactory()
+        #The Accept header doesn't change the URL, the query param does.
+        request = Request(factory.get('/', HTTP_ACCEPT='image/webp,*/*'))
+        self.assertTrue(get_avatar(request, user, 32).endswith(f'{user.avatar_key}_32.jpg'))
+        request = Request(factory.get('/', {'avatar_format': 'webp'}))
+        self.assertTrue(get_avatar(request, user, 32).endswith(f'{user.avatar_key}_32.webp'))
+        with override_settings(AVATAR_FORMAT='webp'):
+            self.assertTrue(get_avatar(Request(factory.get('/')), user, 32).endswith(f'{user.avatar_key}_32.webp'))
+        #Sizes requested by the client are rounded up to the next variant.
+        request = Request(factory.get('/', {'avatar': '100'}))
+        self.assertTrue(get_avatar(request, user, 32).endswith(f'{user.avatar_key}_128.jpg'))
+
+        #Images uploaded before variants existed fall back to the thumbnail.
+        user.avatar_key = ''
+        self.assertEqual(get_avatar(request, user, 32), f'http://testserver{user.thumbnail.url}')
+
+    def test_oversized_upload_is_rejected(self):
+        with override_settings(MAX_IMAGE_PIXELS=1000 * 1000):
+            response = self.upload((1200, 1000))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('megapixels', response.data['data'])
+        self.assertEqual(ImageJob.objects.count(), 0)
+
+    def test_reduced_decoding(self):
+        path = f'{self.media}/large.jpg'
+        Image.new('RGB', (8000, 6000), (0, 0, 255)).save(path, 'JPEG')
+        with Image.open(path) as img:
+            reduced = decode_reduced(img, MAIN_SIZE)
+            #Decoded straight at 1/2 scale, still with enough headroom for a sharp 1080px image.
+            self.assertEqual(reduced.size, (4000, 3000))
+
+    def test_superseded_upload_is_discarded(self):
+        self.upload((500, 500))
+        self.upload((600, 600))
+        self.assertEqual(ImageJob.objects.count(), 1)
+
+        call_command('process_images', once=True, workers=1, stdout=StringIO())
+        user = CustomUser.objects.get(pk=self.admin.user.pk)
+        with Image.open(user.profile_image.path) as main:
+            self.assertEqual(main.size, (600, 600))
+
+    def test_claims(self):
+        other = AdminProfile.create_profile(name='other', email='other@test.com',
+                                            password='password', timezone='Asia/Kolkata')
+        otherClient = APIClient()
+        otherClient.force_authenticate(user=other.user)
+        self.upload((400, 300))
+        self.upload((400, 300), client=otherClient)
+
+        first, second = images.claim_jobs(1), images.claim_jobs(10)
+        self.assertEqual(len(first), 1)
+        self.assertEqual(len(second), 1)
+        self.assertNotEqual(first[0].claim, second[0].claim)
+        self.assertEqual(images.claim_jobs(10), [])
+
+        #The worker of the first job died.
+        ImageJob.objects.filter(pk=first[0].pk).update(claimed=timezone.now() - settings.IMAGE_JOB_TIMEOUT * 2)
+        self.assertEqual([job.pk for job in images.claim_jobs(10)], [first[0].pk])
+
+    def test_identical_uploads_share_files(self):
+        other = AdminProfile.create_profile(name='other', email='other@test.com',
+                                            password='password', timezone='Asia/Kolkata')
+        otherClient = APIClient()
+        otherClient.force_authenticate(user=other.user)
+
+        self.upload((400, 300))
+        self.upload((400, 300), client=otherClient)
+        call_command('process_images', once=True, workers=1, stdout=StringIO())
+
+        first = CustomUser.objects.get(pk=self.admin.user.pk)
+        second = CustomUser.objects.get(pk=other.user.pk)
+        self.assertEqual(first.profile_image.name, second.profile_image.name)
+        self.assertEqual(first.thumbnail.name, second.thumbnail.name)
+        self.assertEqual(first.avatar_key, second.avatar_key)
+
+        response = serve_media(APIRequestFactory().get('/'), first.thumbnail.name, document_root=self.media)
+        self.assertIn('immutable', response['Cache-Control'])
+
+        #Replaced images are still used by the other user, so nothing is collected.
+        self.upload((500, 300), color=(0, 255, 0))
+        call_command('process_images', once=True, workers=1, stdout=StringIO())
+        call_command('collect_media', min_age=0, stdout=StringIO())
+        self.assertTrue(os.path.exists(second.profile_image.path))
+        self.assertTrue(os.path.exists(second.thumbnail.path))
+
+        self.upload((600, 300), color=(0, 0, 255), client=otherClient)
+        call_command('process_images', once=True, workers=1, stdout=StringIO())
+        call_command('collect_media', min_age=0, stdout=StringIO())
+        self.assertFalse(os.path.exists(second.profile_image.path))
+        self.assertFalse(os.path.exists(second.thumbnail.path))
+        for name in get_avatar_names(second.user_type, second.avatar_key).values():
+            self.assertFalse(os.path.exists(os.path.join(self.media, name)))
+
+        #Current images of both users are kept.
+        for user in CustomUser.objects.filter(pk__in=[first.pk, second.pk]):
+            self.assertTrue(os.path.exists(user.profile_image.path))
+            self.assertTrue(os.path.exists(user.thumbnail.path))
+
+    def test_media_urls_are_built_once_per_request(self):
+        user = CustomUser.objects.get(pk=self.admin.user.pk)
+        user.thumbnail.name = 'profile_images/ADMIN/thumbnail/a b.jpg'
+
+        request = Request(APIRequestFactory().get('/'))
+        with mock.patch.object(request._request, 'build_absolute_uri',
+                               wraps=request._request.build_absolute_uri) as build:
+            urls = [get_image(request, user.thumbnail) for _ in range(100)]
+        self.assertEqual(build.call_count, 1)
+        self.assertEqual(urls[0], 'http://testserver/media/profile_images/ADMIN/thumbnail/a%20b.jpg')
+
+        with override_settings(MEDIA_BASE_URL='https://cdn.example.com/media'):
+            request = Request(APIRequestFactory().get('/'))
+            self.assertEqual(get_image(request, user.thumbnail),
+                             'https://cdn.example.com/media/profile_images/ADMIN/thumbnail/a%20b.jpg')
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class LoadBenchmark(TransactionTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def test_generate_and_replay(self):
+        with self.assertRaises(CommandError):
+            call_command('generate_institutes', '--admins', '1', '--batches', '2', '--faculties', '3',
+                         '--slots-per-day', '2', stdout=StringIO())
+        call_command('generate_institutes', '--admins', '1', '--batches', '2', '--faculties', '4',
+                     '--students', '4', '--slots-per-day', '2', '--broadcasts', '3', '--activities', '2',
+                     stdout=StringIO())
+        batch = Batch.objects.first()
+        self.assertEqual((batch.student_count, batch.slot_count), (4, 12))
+        self.assertEqual(BatchAssignment.objects.count(), 4)
+        #Nobody teaches two classes at once.
+        self.assertFalse(Slot.objects.values('faculty', 'weekday', 'start_time').annotate(total=Count('id'))
+                                     .filter(total__gt=1).exists())
+        #Admin broadcasts reach a batch (4 students) & every faculty.
+        receivers = Broadcast.objects.filter(sender__user_type=CustomUser.ADMIN)\
+                                     .annotate(total=Count('receivers')).values_list('total', flat=True)
+        self.assertEqual(set(receivers), {8})
+
+        baseline = os.path.join(self.directory, 'baseline.json')
+        call_command('load_benchmark', '--requests', '40', '--warmup', '0', '--output', baseline,
+                     stdout=StringIO())
+        with open(baseline) as file:
+            results = json.load(file)
+        self.assertEqual(results['total']['requests'], 40)
+        self.assertEqual(results['total']['errors'], 0)
+        for stats in results['endpoints'].values():
+            self.assertGreater(stats['mean_queries'], 0)
+            self.assertLessEqual(stats['p50_ms'], stats['p95_ms'])
+
+        out = StringIO()
+        call_command('load_benchmark', '--requests', '10', '--warmup', '0', '--mix', 'show-activity=1',
+                     '--compare', baseline, stdout=out)
+        self.assertIn('p50 change', out.getvalue())
+
+        call_command('generate_institutes', '--clear', '--admins', '0', stdout=StringIO())
+        self.assertFalse(CustomUser.objects.exists())
+
+
+class MicroBenchmark(TransactionTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def test_run_and_compare(self):
+        baseline = os.path.join(self.directory, 'baseline.json')
+        call_command('micro_benchmark', '--slots', '3', '8', '--repeat', '2', '--warmup', '0',
+                     '--min-time', '0', '--output', baseline, stdout=StringIO())
+        with open(baseline) as file:
+            results = json.load(file)['results']
+        self.assertEqual(set(results['detect_overlap']), {'3', '8'})
+        #Benchmarks which don't depend on the slots only run once.
+        self.assertEqual(set(results['get_elapsed_string']), {'-'})
+        stats = results['AdminSlotDisplaySerializer']['8']
+        self.assertLessEqual(stats['min_us'], stats['median_us'])
+        self.assertLessEqual(stats['median_us'], stats['p95_us'])
+        #Fixtures are rolled back.
+        self.assertFalse(Slot.objects.exists())
+        self.assertFalse(CustomUser.objects.exists())
+
+        out = StringIO()
+        call_command('micro_benchmark', '--slots', '8', '--repeat', '2', '--warmup', '0', '--min-time', '0',
+                     '--only', 'detect_overlap', '--compare', baseline, stdout=out)
+        self.assertIn('verdict', out.getvalue())
+        self.assertNotIn('get_elapsed_string', out.getvalue().split('verdict')[1])
+
+        with self.assertRaises(CommandError):
+            call_command('micro_benchmark', '--only', 'unknown', stdout=StringIO())
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class QueryBudget(TransactionTestCase):
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_views_stay_within_budget(self):
+        measurements = {}
+        for size in querybudget.SIZES:
+            call_command('flush', interactive=False, verbosity=0)
+            measurements[size] = querybudget.measure(size)
+        problems = querybudget.check(measurements)
+        self.assertFalse(problems, '\n'.join(problems))
+
+
+@override_settings(PROFILING_SAMPLE_RATE=1)
+@override_settings(INTERNAL_IPS=['127.0.0.1'])
+class RequestProfiling(TransactionTestCase):
+
+    def setUp(self):
+        profile_cache.clear()
+        self.admin = AdminProfile.create_profile(name='admin', email='admin@test.com',
+                                                 password='password', timezone='Asia/Kolkata')
+        Batch.objects.create(title='batch', admin=self.admin)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.get(user=self.admin.user).key}')
+
+    def get_metrics(self, response):
+        metrics = {}
+        for metric in response['Server-Timing'].split(', '):
+            name, *params = metric.split(';')
+            metrics[name] = dict(param.split('=', 1) for param in params)
+        return metrics
+
+    def test_server_timing(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('admin-batch'))
+
+        self.assertEqual(response.status_code, 200)
+        metrics = self.get_metrics(response)
+        self.assertEqual(list(metrics), ['db', 'auth', 'perm', 'ser', 'render', 'total'])
+        self.assertEqual(metrics['db']['desc'], f'"{len(queries.captured_queries)} queries"')
+        for name in ('auth', 'perm', 'ser', 'render'):
+            self.assertGreater(float(metrics[name]['dur']), 0, name)
+            self.assertLess(float(metrics[name]['dur']), float(metrics['total']['dur']), name)
+
+    def test_sampling(self):
+        with override_settings(PROFILING_SAMPLE_RATE=0), mock.patch('base.profiling.install') as install:
+            self.assertNotIn('Server-Timing', self.client.get(reverse('admin-batch')))
+        #DRF isn't patched unless a request is sampled.
+        install.assert_not_called()
+        with mock.patch('base.middleware.random.random', side_effect=[0.3, 0.1]), \
+             override_settings(PROFILING_SAMPLE_RATE=0.2):
+            self.assertNotIn('Server-Timing', self.client.get(reverse('admin-batch')))
+            self.assertIn('Server-Timing', self.client.get(reverse('admin-batch')))
+
+    @override_settings(PROFILING_LOG=True)
+    def test_log_line(self):
+        with self.assertLogs('base.profiling', 'INFO') as logs:
+            response = self.client.post(reverse('login'), {'email': 'admin@test.com', 'password': 'wrong'})
+
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual((line['method'], line['path'], line['status']),
+                         ('POST', reverse('login'), response.status_code))
+        self.assertEqual(line['queries'], int(self.get_metrics(response)['db']['desc'].strip('"').split()[0]))
+
+    @override_settings(PROFILING_LOG=True)
+    def test_only_internal_or_staff(self):
+        with override_settings(INTERNAL_IPS=[]):
+            with self.assertLogs('base.profiling', 'INFO') as logs:
+                response = self.client.post(reverse('login'), {'email': 'nobody@test.com', 'password': 'wrong'})
+            #Logged all the same.
+            self.assertEqual(len(logs.records), 1)
+            self.assertNotIn('Server-Timing', response)
+            self.assertNotIn('Server-Timing', self.client.get(reverse('admin-batch')))
+
+            CustomUser.objects.filter(pk=self.admin.user.pk).update(is_staff=True)
+            profile_cache.clear()
+            self.assertIn('Server-Timing', self.client.get(reverse('admin-batch')))
+
+
+class Metrics(TransactionTestCase):
+
+    def setUp(self):
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+        override = override_settings(METRICS={**settings.METRICS, 'TOKEN': 'scraper'})
+        override.enable()
+        self.addCleanup(override.disable)
+        self.admin = AdminProfile.create_profile(name='admin', email='admin@test.com',
+                                                 password='password', timezone='Asia/Kolkata')
+        self.batch = Batch.objects.create(title='batch', admin=self.admin)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.get(user=self.admin.user).key}')
+
+    def get_samples(self):
+        response = Client().get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer scraper')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], metrics.CONTENT_TYPE)
+        return dict(line.rsplit(' ', 1) for line in response.content.decode().splitlines()
+                    if not line.startswith('#'))
+
+    def test_request_metrics(self):
+        queryCount = 0
+        for _ in range(2):
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.client.get(reverse('admin-batch')).status_code, 200)
+            queryCount += len(queries.captured_queries)
+
+        samples = self.get_samples()
+        labels = '{view="admin-batch",method="GET"}'
+        self.assertEqual(samples[f'trackr_request_duration_seconds_count{labels}'], '2')
+        self.assertEqual(samples['trackr_request_duration_seconds_bucket{view="admin-batch",method="GET",le="+Inf"}'],
+                         '2')
+        self.assertEqual(float(samples[f'trackr_request_queries_sum{labels}']), queryCount)
+        self.assertEqual(int(samples['trackr_auth_cache_lookups_total{result="hit"}']) +
+                         int(samples['trackr_auth_cache_lookups_total{result="miss"}']),
+                         profile_cache.hits + profile_cache.misses)
+
+    def test_broadcast_receivers(self):
+        StudentProfile.create_profile(name='student', email='student@test.com', password='password',
+                                      batch=self.batch, receive_email_notification=False)
+        response = self.client.post(reverse('admin-broadcast'), {'text': 'Holiday', 'target': 'EVERYONE'})
+        self.assertEqual(response.status_code, 201)
+
+        samples = self.get_samples()
+        self.assertEqual(samples['trackr_broadcast_receivers_count{sender="admin"}'], '1')
+        self.assertEqual(float(samples['trackr_broadcast_receivers_sum{sender="admin"}']), Message.objects.count())
+
+    def test_processes_are_summed(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        with override_settings(METRICS={**settings.METRICS, 'DIRECTORY': directory}):
+            metrics.IMAGE_PROCESSING.observe(0.2)
+            metrics.flush(force=True)
+            #Another process writes its own snapshot.
+            metrics.after_fork()
+            metrics.IMAGE_PROCESSING.observe(3)
+            metrics.IMAGE_JOBS.inc(outcome='failed')
+
+            samples = self.get_samples()
+        self.assertEqual(len(os.listdir(directory)), 2)
+        self.assertEqual(samples['trackr_image_processing_seconds_count'], '2')
+        self.assertEqual(samples['trackr_image_processing_seconds_bucket{le="0.25"}'], '1')
+        self.assertEqual(samples['trackr_image_processing_seconds_bucket{le="5.0"}'], '2')
+        self.assertEqual(samples['trackr_image_jobs_total{outcome="failed"}'], '1')
+
+    def test_access(self):
+        client = Client()
+        self.assertEqual(client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer scraper').status_code, 200)
+        #Not the admin's token, nor a wrong or missing one.
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 404)
+        self.assertEqual(client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer scrapers').status_code, 404)
+        self.assertEqual(client.get(reverse('metrics')).status_code, 404)
+        with override_settings(METRICS={**settings.METRICS, 'TOKEN': 'scraper', 'ALLOWED_IPS': []}):
+            self.assertEqual(client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer scraper').status_code, 404)
+        with override_settings(METRICS={**settings.METRICS, 'TOKEN': None}):
+            self.assertEqual(client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer None').status_code, 404)
+
+    def test_forked_auth_cache_lookups(self):
+        self.client.get(reverse('admin-batch'))
+        self.assertTrue(profile_cache.hits + profile_cache.misses)
+        #A preloaded worker doesn't report the lookups of its parent.
+        metrics.after_fork()
+        samples = self.get_samples()
+        self.assertEqual(samples['trackr_auth_cache_lookups_total{result="hit"}'], '0')
+        self.assertEqual(samples['trackr_auth_cache_lookups_total{result="miss"}'], '0')
+
+
+class SlowQueryLog(TransactionTestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.path = os.path.join(directory, 'slow.log')
+        #Every query is slow.
+        override = override_settings(SLOW_QUERY_LOG={**settings.SLOW_QUERY_LOG, 'THRESHOLD': 0, 'FILE': self.path})
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.admin = AdminProfile.create_profile(name='admin', email='admin@test.com',
+                                                 password='password', timezone='Asia/Kolkata')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin.user)
+
+    def test_logs_view_origin_and_plan(self):
+        self.assertEqual(self.client.get(reverse('admin-search'), {'q': 'student'}).status_code, 200)
+
+        entries = slowqueries.read_entries(self.path)
+        selects = [entry for entry in entries if entry['sql'].startswith('SELECT')]
+        self.assertTrue(selects)
+        for entry in selects:
+            self.assertEqual((entry['view'], entry['method']), ('admin-search', 'GET'))
+            self.assertTrue(entry['plan'], entry['sql'])
+            origin = entry['origin'].split(os.sep, 1)
+            self.assertIn(origin[0], slowqueries.APPS)
+            self.assertFalse(origin[1].startswith(('middleware.py', 'slowqueries.py', 'profiling.py')))
+
+        out = StringIO()
+        call_command('slow_query_report', '--file', self.path, '--view', 'admin-search', stdout=out)
+        self.assertIn(f'{len(entries)} slow queries', out.getvalue())
+        self.assertIn('views: admin-search', out.getvalue())
+        self.assertIn('plan: ', out.getvalue())
+
+    def test_rotated_files_are_read(self):
+        with override_settings(SLOW_QUERY_LOG={**settings.SLOW_QUERY_LOG, 'MAX_BYTES': 2000}):
+            for _ in range(3):
+                self.client.get(reverse('admin-batch'))
+            self.assertGreater(len(slowqueries.get_log_files(self.path)), 1)
+            summary = slowqueries.summarize(slowqueries.read_entries(self.path))
+        #The same queries run by every request end up in one group each.
+        self.assertTrue(any(group['count'] == 3 and group['views'] == {'admin-batch': 3} for group in summary))
+
+    def test_params_redacted(self):
+        self.client.get(reverse('admin-search'), {'q': 'qwxz'})
+        with override_settings(SLOW_QUERY_LOG={**settings.SLOW_QUERY_LOG, 'LOG_PARAMS': True}):
+            self.client.get(reverse('admin-search'), {'q': 'zxwq'})
+
+        #Every process has a file of its own.
+        self.assertEqual(slowqueries.get_log_files(self.path), [slowqueries.get_process_file(self.path)])
+        with open(slowqueries.get_process_file(self.path)) as log:
+            text = log.read()
+        self.assertNotIn('qwxz', text)
+        self.assertIn('zxwq', text)
+        self.assertIn(['int', 'str'], [entry['params'] for entry in slowqueries.read_entries(self.path)])
+
+    def test_normalize(self):
+        self.assertEqual(slowqueries.normalize('SELECT "T3"."id" FROM "base_slot" T3\n WHERE "T3"."id" IN (%s, %s)'
+                                               " AND title LIKE %s ESCAPE '\\' LIMIT 21"),
+                         'SELECT "T3"."id" FROM "base_slot" T3 WHERE "T3"."id" IN (...) AND title LIKE ? ESCAPE ? LIMIT ?')
+
+    def test_disabled(self):
+        with override_settings(SLOW_QUERY_LOG={**settings.SLOW_QUERY_LOG, 'THRESHOLD': None, 'FILE': self.path}):
+            self.client.get(reverse('admin-batch'))
+        self.assertFalse(slowqueries.get_log_files(self.path))
 
-# Create your tests here.
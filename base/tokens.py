@@ -0,0 +1,145 @@
+"""
+Stateless signed access tokens, built on the same signing primitive
+used for faculty invites. A token embeds the user id, role & profile id,
+so it is validated without reading the authtoken table.
+
+Revoked tokens are kept in a small RevokedToken table which every process
+mirrors in memory (refreshed every REVOCATION_REFRESH_INTERVAL seconds).
+"""
+
+import time
+import uuid
+import threading
+from datetime import datetime
+
+from django.conf import settings
+from django.core import signing
+from django.db import transaction
+from django.utils import timezone
+
+
+SALT = 'trackr.access-token'
+
+
+class AccessToken:
+
+    def __init__(self, *, key, user_id, role, profile_id, jti, issued):
+        self.key = key
+        self.user_id = user_id
+        self.role = role
+        self.profile_id = profile_id
+        self.jti = jti
+        self.issued = issued
+        self.user = None
+
+    def __str__(self):
+        return self.key
+
+    @staticmethod
+    def is_signed(key):
+        #DB tokens are plain hex, signed tokens always contain the ':' separator.
+        return ':' in key
+
+    @property
+    def expires(self):
+        return self.issued + settings.ACCESS_TOKEN_MAX_AGE
+
+    @classmethod
+    def issue(cls, user, profile):
+        payload = {'u': user.id, 'r': user.user_type,
+                   'p': profile and profile.pk,
+                   'j': uuid.uuid4().hex, 'i': int(time.time())}
+        return signing.dumps(payload, salt=SALT)
+
+    @classmethod
+    def parse(cls, key):
+        """
+        Raises signing.BadSignature (or SignatureExpired) for invalid tokens.
+        """
+        payload = signing.loads(key, salt=SALT, max_age=settings.ACCESS_TOKEN_MAX_AGE)
+        try:
+            return cls(key=key, user_id=payload['u'], role=payload['r'], profile_id=payload['p'],
+                       jti=payload['j'], issued=datetime.fromtimestamp(payload['i'], tz=timezone.utc))
+        except (KeyError, TypeError, ValueError):
+            raise signing.BadSignature('Malformed token payload.')
+
+    def is_revoked(self):
+        return deny_list.is_revoked(self)
+
+    def delete(self):
+        """
+        Mirrors Token.delete() so logout works the same for both formats.
+        """
+        from .models import RevokedToken
+        from .authentication import profile_cache
+
+        RevokedToken.objects.create(jti=self.jti, expires=self.expires)
+        deny_list.add(jti=self.jti)
+        profile_cache.invalidate_token(self.key)
+
+
+class DenyList:
+    """
+    In memory copy of the non-expired RevokedToken rows,
+    entries either revoke a single token (jti) or every token of
+    a user issued before 'revoked_before'.
+    """
+    def __init__(self):
+        self.jtis = set()
+        self.users = {}
+        self.loaded_at = None
+        self.lock = threading.Lock()
+
+    def add(self, *, jti=None, user_id=None, revoked_before=None):
+        with self.lock:
+            if jti is not None:
+                self.jtis.add(jti)
+            if user_id is not None:
+                self.users[user_id] = max(revoked_before, self.users.get(user_id, revoked_before))
+
+    def refresh(self):
+        from .models import RevokedToken
+
+        jtis, users = set(), {}
+        for jti, user_id, revoked_before in RevokedToken.objects.filter(expires__gt=timezone.now())\
+                                              .values_list('jti', 'user_id', 'revoked_before'):
+            if jti is not None:
+                jtis.add(jti)
+            if user_id is not None:
+                users[user_id] = max(revoked_before, users.get(user_id, revoked_before))
+
+        with self.lock:
+            self.jtis, self.users = jtis, users
+            self.loaded_at = time.monotonic()
+
+    def is_revoked(self, token):
+        loaded_at = self.loaded_at
+        if loaded_at is None or time.monotonic() - loaded_at > settings.REVOCATION_REFRESH_INTERVAL:
+            self.refresh()
+
+        if token.jti in self.jtis:
+            return True
+        revoked_before = self.users.get(token.user_id)
+        return revoked_before is not None and token.issued <= revoked_before
+
+
+deny_list = DenyList()
+
+
+def revoke_user_tokens(sender, instance, **kwargs):
+    """
+    Connected to CustomUser post_delete, revokes every signed token issued so far
+    once the deletion commits. Nothing is issued while SIGNED_ACCESS_TOKENS is off.
+    """
+    from .models import RevokedToken
+
+    if not settings.SIGNED_ACCESS_TOKENS:
+        return
+    userId = instance.pk
+
+    def revoke():
+        now = timezone.now()
+        RevokedToken.objects.create(user_id=userId, revoked_before=now, expires=now + settings.ACCESS_TOKEN_MAX_AGE)
+        deny_list.add(user_id=userId, revoked_before=now)
+
+    transaction.on_commit(revoke)
@@ -1,4 +1,5 @@
 from datetime import date,datetime
+from urllib.parse import quote
 
 from django.utils import timezone
 from django.core.exceptions import ObjectDoesNotExist
@@ -72,18 +73,30 @@ def get_user_profile(user):
 
     user_type = user.user_type
     try:
+        #Tenant is fetched along with the profile since timezone always comes from the admin.
         if user_type == user.ADMIN:
             profile = AdminProfile.objects.get(user=user)
         elif user_type == user.FACULTY:
-            profile = FacultyProfile.objects.get(user=user)
+            profile = FacultyProfile.objects.select_related('admin').get(user=user)
         elif user_type == user.STUDENT:
-            profile = StudentProfile.objects.get(user=user)
+            profile = StudentProfile.objects.select_related('batch__admin').get(user=user)
         else:
             raise ObjectDoesNotExist
 
     except ObjectDoesNotExist:            
         return None
 
+    profile.user = user
+    return profile
+
+def get_request_profile(request):
+    """
+    Profile already resolved by the authentication class,
+    falls back to a lookup when it isn't available (i.e force authenticated requests).
+    """
+    profile = getattr(request, 'profile', None)
+    if profile is None:
+        profile = get_user_profile(request.user)
     return profile
 
 def unique_email_validator(email):
@@ -107,10 +120,67 @@ class PasswordMinLengthValidator(MinimumLengthValidator):
         return password
 
 
+def get_media_base(request):
+    """
+    Absolute media URL prefix, computed once per request.
+    MEDIA_BASE_URL (i.e a CDN) takes precedence over the request's host.
+    """
+    base = getattr(request,'_media_base',None)
+    if base is None:
+        from django.conf import settings
+
+        base = settings.MEDIA_BASE_URL or request.build_absolute_uri(settings.MEDIA_URL)
+        if not base.endswith('/'):
+            base += '/'
+        request._media_base = base
+    return base
+
+def get_media_url(request,name):
+    #Same escaping as FileSystemStorage.url(), without its urljoin.
+    return get_media_base(request) + quote(name,safe="/~!*()'")
+
 def get_image(request,image):
-    return (request.build_absolute_uri(image.url) 
+    return (get_media_url(request,image.name)
             if bool(image) else None)
 
+def get_avatar_size(request,default):
+    """
+    '?avatar=<size>' overrides the size picked by the serializer,
+    unknown sizes are rounded up to the next generated one.
+    """
+    from django.conf import settings
+
+    requested = getattr(request,'query_params',{}).get('avatar','')
+    requested = int(requested) if requested.isdigit() else default
+    for size in settings.AVATAR_SIZES:
+        if size >= requested:
+            return size
+    return settings.AVATAR_SIZES[-1]
+
+def get_avatar_format(request):
+    """
+    '?avatar_format=webp|jpg' overrides AVATAR_FORMAT. Not picked from the Accept header,
+    the JSON with the URL would then differ by a header caches don't vary on.
+    """
+    from django.conf import settings
+    from base.images import AVATAR_FORMATS
+
+    requested = getattr(request,'query_params',{}).get('avatar_format','')
+    return requested if requested in AVATAR_FORMATS else settings.AVATAR_FORMAT
+
+def get_avatar(request,user,size):
+    """
+    URL of the square avatar variant closest to 'size' in the format picked
+    by get_avatar_format. Users without variants fall back to the thumbnail.
+    """
+    from base.images import avatar_name
+
+    if not user.avatar_key:
+        return get_image(request,user.thumbnail)
+
+    size = get_avatar_size(request,size)
+    return get_media_url(request,avatar_name(user.user_type,user.avatar_key,size,get_avatar_format(request)))
+
 #TODO: can this be used in more places?
 def get_time_difference(time1,time2):
     commonDate = date.today()
@@ -1,7 +1,12 @@
+import hmac
 from datetime import time
 from collections import defaultdict
 
+from django.conf import settings
 from django.db.models import Q
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.http import Http404, HttpResponse
+from django.views.static import serve
 from rest_framework.views import APIView
 from rest_framework.generics import ListAPIView
 from rest_framework.authtoken.models import Token
@@ -12,8 +17,12 @@ from rest_framework import status
 from rest_framework.parsers import FormParser,MultiPartParser
 
 from .serializers import UserSerializer,ActivitySerializer,UserImageSerializer
-from base.models import Activity, CustomUser,Broadcast, Message
-from base.utils import get_elapsed_string,get_user_profile,get_image
+from base.models import Activity, CustomUser,Broadcast, Message,ArchivedBroadcast
+from base.utils import get_elapsed_string,get_request_profile,get_user_profile,get_image,get_avatar
+from base.tokens import AccessToken
+from base.images import queue_profile_image
+from base import metrics
+from base.storage import IMMUTABLE_CACHE_CONTROL, is_immutable
 from AdminUser.models import AdminProfile
 from FacultyUser.models import FacultyProfile
 from StudentUser.models import StudentProfile
@@ -24,6 +33,7 @@ class CommonLoginView(APIView):
 
     serializer_class = UserSerializer
     permission_classes = [AllowAny]
+    max_queries = 3
 
     def post(self,request):
         data = self.serializer_class(data=request.data)
@@ -42,8 +52,12 @@ class CommonLoginView(APIView):
         except AssertionError as e:
             raise ValidationError(str(e))
 
-        token,_ = Token.objects.get_or_create(user=base_user)
-        user_info = {'token':token.key,'role':base_user.user_type}
+        if settings.SIGNED_ACCESS_TOKENS:
+            token = AccessToken.issue(base_user,get_user_profile(base_user))
+        else:
+            token,_ = Token.objects.get_or_create(user=base_user)
+            token = token.key
+        user_info = {'token':token,'role':base_user.user_type}
 
         return Response({'status':1,'data':user_info},status=status.HTTP_200_OK)
 
@@ -51,6 +65,7 @@ class CommonLoginView(APIView):
 class CommonLogoutView(APIView):
 
     permission_classes = [IsAuthenticated]
+    max_queries = 3
 
     def delete(self,request):
         try:
@@ -63,10 +78,11 @@ class CommonLogoutView(APIView):
 class UserProfileView(APIView):
     #TODO:Change from UTC when showing
     permission_classes = [IsAuthenticated]
+    max_queries = 2
 
     def get(self, request):  
         user = request.user
-        profile = get_user_profile(user)
+        profile = get_request_profile(request)
         showDetail = request.query_params.get('detail', '').lower() == 'true'
 
         userInfo = defaultdict(dict)
@@ -100,39 +116,41 @@ class UserProfileView(APIView):
 class UploadProfileImageView(APIView):
     parser_classes = [MultiPartParser, FormParser]
     permission_classes = [IsAuthenticated]
+    max_queries = 5
     serializer_class = UserImageSerializer
 
+    def initialize_request(self, request, *args, **kwargs):
+        #Uploads are always streamed to a temporary file instead of being held in memory.
+        request.upload_handlers = [TemporaryFileUploadHandler(request)]
+        return super().initialize_request(request, *args, **kwargs)
+
     def post(self,request):
         serializer = UserImageSerializer(data=request.data, instance=request.user)
-        oldImg = request.user.profile_image
-        oldThumbnail = request.user.thumbnail
-
         serializer.is_valid(raise_exception=True)
 
-        #Delete old Images if any.
-        for img in (oldImg,oldThumbnail):
-            if bool(img):
-                img.delete()
-
-        serializer.save()
-        return Response({'status':1,'data':get_image(request,request.user.profile_image)},status=status.HTTP_201_CREATED)
+        #Resizing is done by the 'process_images' worker, placeholder is shown till then.
+        queue_profile_image(request.user,serializer.validated_data['profile_image'])
+        return Response({'status':1,'data':get_image(request,request.user.profile_image)},status=status.HTTP_202_ACCEPTED)
 
 
 class ToggleNotificationView(APIView):
     permission_classes = [IsAuthenticated]
+    max_queries = 8
 
     def post(self,request):
         user = request.user
         if user.user_type not in {CustomUser.FACULTY,CustomUser.STUDENT}:
             raise ValidationError('Only applicable to Faculty/Student users!')
 
-        profile = get_user_profile(user)
+        #The cached profile might be stale, only the fresh row is written back & only this column.
+        cached = get_request_profile(request)
+        profile = type(cached).objects.select_for_update().get(pk=cached.pk)
 
         if not profile.is_active():
             raise ValidationError('Your Account has been deleted by the admin!')
 
         profile.receive_email_notification = not profile.receive_email_notification
-        profile.save()
+        profile.save(update_fields=['receive_email_notification'])
 
         return Response({'status':1,'data':profile.receive_email_notification},
                         status=status.HTTP_200_OK)
@@ -141,6 +159,7 @@ class ToggleNotificationView(APIView):
 
 class ShowActivity(ListAPIView):
     permission_classes = [IsAuthenticated]
+    max_queries = 5
     pagination_class = EnhancedPagination
     serializer_class = ActivitySerializer
 
@@ -167,6 +186,7 @@ class ShowBroadcast(APIView):
     SENT = 'SENT'
     RECEIVED = 'RECEIVED'
     permission_classes = [IsAuthenticated]
+    max_queries = 8
 
     def serialize(self,queryset):
         """
@@ -181,7 +201,7 @@ class ShowBroadcast(APIView):
                 receivers = []
                 for message in broadcast.message_set.all():
                     receiver = message.receiver
-                    img = get_image(self.request,receiver.thumbnail)
+                    img = get_avatar(self.request,receiver,32)
                     receivers.append({'email':receiver.email,
                                       'type':receiver.user_type,
                                       'image':img,
@@ -192,10 +212,13 @@ class ShowBroadcast(APIView):
                 serialized['type'] = self.RECEIVED
                 sender = broadcast.sender
                 profile_info = {'email': sender.email, 'type': sender.user_type,
-                                'image': get_image(self.request,sender.thumbnail)}
+                                'image': get_avatar(self.request,sender,64)}
                 serialized['sentBy'] = profile_info
-                serialized['sentTo'] = broadcast.message_set.count()
-                serialized['read'] = broadcast.message_set.get(receiver=self.request.user).read
+                #Messages are prefetched, counting & finding the user's one don't query again.
+                messages = broadcast.message_set.all()
+                serialized['sentTo'] = len(messages)
+                serialized['read'] = next(message.read for message in messages
+                                          if message.receiver_id == self.request.user.id)
 
             serialized['text'] = broadcast.text
             serialized['created'] = get_elapsed_string(broadcast.created)
@@ -203,9 +226,75 @@ class ShowBroadcast(APIView):
 
         return jsonData
 
+    def serialize_archived(self,queryset):
+        """
+        Same structure as serialize() but for ArchivedBroadcast rows,
+        receivers of the whole page are fetched in a single query.
+        """
+        currentUser = self.request.user
+        allReceivers = {}
+        for archived in queryset:
+            archived.receiverInfo = archived.get_receivers()
+            if archived.sender_id == currentUser.id:
+                allReceivers.update(archived.receiverInfo)
+        allReceivers = CustomUser.objects.in_bulk(list(allReceivers))
+
+        jsonData = []
+        for archived in queryset:
+            serialized = {}
+            if archived.sender_id == currentUser.id:
+                serialized['type'] = self.SENT
+                receivers = []
+                for receiverId,read in archived.receiverInfo.items():
+                    receiver = allReceivers.get(receiverId)
+                    #Receiver account might have been deleted since.
+                    if receiver is None:
+                        continue
+                    receivers.append({'email':receiver.email,
+                                      'type':receiver.user_type,
+                                      'image':get_avatar(self.request,receiver,32),
+                                      'read':read})
+                serialized['receivers'] = receivers
+            else:
+                serialized['type'] = self.RECEIVED
+                sender = archived.sender
+                serialized['sentBy'] = {'email': sender.email, 'type': sender.user_type,
+                                        'image': get_avatar(self.request,sender,64)}
+                serialized['sentTo'] = archived.sent_to
+                serialized['read'] = archived.receiverInfo.get(currentUser.id,True)
+
+            serialized['text'] = archived.text
+            serialized['created'] = get_elapsed_string(archived.created)
+            jsonData.append(serialized)
+
+        return jsonData
+
+    def get_archived(self,request,filter_by_type):
+        """
+        Pages into broadcasts that were moved to the archive by the retention command.
+        Archived broadcasts are read only i.e read status is not updated.
+        """
+        currentUser = request.user
+        sent = Q(sender=currentUser)
+        received = Q(**ArchivedBroadcast.receiver_lookup(currentUser))
+
+        if currentUser.user_type == CustomUser.ADMIN or filter_by_type == self.SENT:
+            lookup = sent
+        elif currentUser.user_type == CustomUser.STUDENT or filter_by_type == self.RECEIVED:
+            lookup = received
+        else:
+            lookup = sent | received
+
+        all_archived = ArchivedBroadcast.objects.filter(lookup).select_related('sender')\
+                        .order_by('-created')
+        pagination = EnhancedPagination()
+        all_archived = pagination.paginate_queryset(all_archived, request)
+        return pagination.get_paginated_response(self.serialize_archived(all_archived))
+
     def get(self,request):     
         currentUser = request.user
         filter_by_type = request.query_params.get('filter','').upper()
+        showArchived = request.query_params.get('archived', '').lower() == 'true'
    
         if filter_by_type:
             if currentUser.user_type != CustomUser.FACULTY:
@@ -214,6 +303,12 @@ class ShowBroadcast(APIView):
             if filter_by_type not in {self.SENT,self.RECEIVED}:
                 raise ValidationError('Filter parameter can only either be SENT/RECEIVED !')
 
+        if currentUser.user_type not in {CustomUser.ADMIN,CustomUser.FACULTY,CustomUser.STUDENT}:
+            raise ValidationError("Corrupt User!")
+
+        if showArchived:
+            return self.get_archived(request,filter_by_type)
+
         if currentUser.user_type == CustomUser.ADMIN:
             all_broadcasts = currentUser.sent_broadcasts.all()
 
@@ -252,6 +347,7 @@ class ShowBroadcast(APIView):
 
 class MarkActivityAsReadView(APIView):
     permission_classes = [IsAuthenticated]
+    max_queries = 4
 
     def post(self,request):
         unread = Activity.objects.filter(user=request.user,read=False)
@@ -269,6 +365,7 @@ class MarkActivityAsReadView(APIView):
 class MarkBroadcastAsReadView(APIView):
     #TODO:Broadcast for deleted users
     permission_classes = [IsAuthenticated]
+    max_queries = 4
 
     def post(self,request):
         user = request.user
@@ -289,7 +386,25 @@ class MarkBroadcastAsReadView(APIView):
         return Response({'status':1,'data':msg},status=status.HTTP_200_OK)
 
 
-
-
-
-
+def serve_media(request, path, document_root=None, show_indexes=False):
+    """
+    Development media server, content addressed files are marked as immutable.
+    Production servers should send the same header for hashed names under MEDIA_URL.
+    """
+    response = serve(request, path, document_root, show_indexes)
+    if is_immutable(path):
+        response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    return response
+
+
+def metrics_view(request):
+    """
+    Metrics of every process in the Prometheus text format, only for METRICS['ALLOWED_IPS']
+    sending 'Authorization: Bearer <METRICS['TOKEN']>'. Disabled while TOKEN isn't set.
+    """
+    token = settings.METRICS['TOKEN']
+    authorization = request.META.get('HTTP_AUTHORIZATION', '')
+    if (token is None or request.META.get('REMOTE_ADDR') not in settings.METRICS['ALLOWED_IPS'] or
+            not hmac.compare_digest(authorization.encode(), f'Bearer {token}'.encode())):
+        raise Http404
+    return HttpResponse(metrics.render(), content_type=metrics.CONTENT_TYPE)
@@ -20,6 +20,81 @@ CORS_ALLOW_ALL_ORIGINS = True
 
 FACULTY_INVITE_MAX_AGE = timedelta(days=7)
 
+#Activities logged with background=True are written by a worker thread after commit.
+ACTIVITY_BACKGROUND_FLUSH = False
+
+#Retention policies applied by the 'apply_retention' command, None disables a policy.
+#MAX_AGE : delete everything older than this.
+#READ_OLDER_THAN : delete read rows older than this.
+#MAX_PER_USER : only keep the latest N rows of every user.
+ACTIVITY_RETENTION = {'MAX_AGE': timedelta(days=365),
+                      'READ_OLDER_THAN': timedelta(days=90),
+                      'MAX_PER_USER': 1000}
+MESSAGE_RETENTION = {'MAX_AGE': None,
+                     'READ_OLDER_THAN': None,
+                     'MAX_PER_USER': 2000}
+#Broadcasts older than this are moved to the compact ArchivedBroadcast table.
+BROADCAST_ARCHIVE_AFTER = timedelta(days=90)
+#Rows deleted per transaction, keeps the SQLite write lock short.
+RETENTION_CHUNK_SIZE = 500
+
+#Token -> profile cache used by CachedTokenAuthentication, ALIAS is one of CACHES.
+#Invalidations only reach the workers sharing it (i.e memcached when there's more than one host),
+#the others keep stale entries for up to TTL seconds.
+AUTH_CACHE = {'ALIAS': 'auth',
+              'TTL': 60}
+
+#Issue stateless signed access tokens on login instead of DB tokens,
+#DB tokens keep working either way.
+SIGNED_ACCESS_TOKENS = False
+ACCESS_TOKEN_MAX_AGE = timedelta(days=7)
+#Seconds after which every process reloads the revoked token list.
+REVOCATION_REFRESH_INTERVAL = 30
+
+#Shown until the 'process_images' worker is done with an upload (relative to MEDIA_ROOT).
+PROFILE_IMAGE_PLACEHOLDER = 'profile_images/placeholder.png'
+#Process pool size of the 'process_images' worker.
+IMAGE_WORKERS = 2
+#Jobs claimed by a worker but unfinished after this long are claimed again (i.e the worker crashed).
+IMAGE_JOB_TIMEOUT = timedelta(minutes=10)
+#Uploads exceeding either limit are rejected from their header, before any decoding.
+MAX_IMAGE_SIDE = 12000
+MAX_IMAGE_PIXELS = 64 * 10**6
+#Square avatar variants generated for every upload, API clients can pick one with '?avatar=<size>'.
+AVATAR_SIZES = (32, 64, 128, 300)
+#Format of the avatar URLs ('jpg' or 'webp'), API clients can pick the other one with '?avatar_format=<format>'.
+AVATAR_FORMAT = 'jpg'
+
+#Fraction of requests timed by ProfilingMiddleware (SQL, authentication, permissions, serializers &
+#rendering) & reported in a Server-Timing header to INTERNAL_IPS & staff users, 0 disables it.
+PROFILING_SAMPLE_RATE = 0.05
+#Also log every profiled request as a JSON line to the 'base.profiling' logger (needs LOGGING to show INFO).
+PROFILING_LOG = False
+
+#Metrics served at /metrics in the Prometheus text format (see base/metrics.py).
+#DIRECTORY : shared directory every process (WSGI workers, 'process_images') writes its metrics to, needed
+#            with more than one process. Empty it on every deploy. None keeps the metrics of this process only.
+#FLUSH_INTERVAL : seconds between two writes of a process.
+#ALLOWED_IPS : clients allowed to read the endpoint, everyone else gets a 404. Behind a reverse proxy
+#              REMOTE_ADDR is the proxy's, so block /metrics/ at the proxy as well.
+#TOKEN : the scraper sends 'Authorization: Bearer <TOKEN>' (Prometheus' bearer_token), the endpoint
+#        is disabled while it's None.
+METRICS = {'DIRECTORY': None,
+           'FLUSH_INTERVAL': 5,
+           'ALLOWED_IPS': ['127.0.0.1'],
+           'TOKEN': None}
+
+#Queries of a request taking atleast THRESHOLD seconds are logged to FILE along with their view, origin
+#& query plan (see base/slowqueries.py & the 'slow_query_report' command), None disables it.
+#Every process writes FILE with its pid appended (slow_queries-<pid>.log), rotated once it reaches
+#MAX_BYTES keeping BACKUP_COUNT older files. Bind parameters (tokens, password hashes, emails)
+#are only written with LOG_PARAMS, otherwise just their types.
+SLOW_QUERY_LOG = {'THRESHOLD': 0.1,
+                  'FILE': os.path.join(BASE_DIR, 'slow_queries.log'),
+                  'MAX_BYTES': 10 * 1024 * 1024,
+                  'BACKUP_COUNT': 5,
+                  'LOG_PARAMS': False}
+
 WEEKDAYS = ['Monday', 'Tuesday','Wednesday', 'Thursday', 'Friday', 'Saturday',"Sunday"]
 
 # Application definition
@@ -53,6 +128,9 @@ INTERNAL_IPS = [
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
+    'base.middleware.ProfilingMiddleware',
+    'base.middleware.MetricsMiddleware',
+    'base.middleware.SlowQueryMiddleware',
     'debug_toolbar.middleware.DebugToolbarMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -61,6 +139,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'base.middleware.ActivityBufferMiddleware',
 ]
 
 ROOT_URLCONF = 'trackr.urls'
@@ -84,6 +163,27 @@ TEMPLATES = [
 WSGI_APPLICATION = 'trackr.wsgi.application'
 
 
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'auth': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'trackr-auth',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+
+#Workers of a host only share the 'auth' cache when TRACKR_AUTH_CACHE_DIR is set,
+#it should be a directory only the user running the app can read.
+if os.environ.get('TRACKR_AUTH_CACHE_DIR'):
+    CACHES['auth'] = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ['TRACKR_AUTH_CACHE_DIR'],
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
+
+
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
@@ -129,11 +229,13 @@ STATIC_URL = '/static/'
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 MEDIA_URL = '/media/'
+#Absolute prefix of every media URL in API responses (i.e a CDN), defaults to the request's host + MEDIA_URL.
+MEDIA_BASE_URL = None
 
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication'
+        'base.authentication.CachedTokenAuthentication'
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated'
@@ -4,6 +4,8 @@ from django.conf.urls.static import static
 from django.conf import settings
 import debug_toolbar
 
+from base.views import metrics_view, serve_media
+
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -12,6 +14,7 @@ urlpatterns = [
     path('api/student/', include('StudentUser.urls')),
     path('api/', include('base.urls')),
     path('__debug__/', include(debug_toolbar.urls)),
+    path('metrics', metrics_view, name='metrics'),
 ]
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    urlpatterns += static(settings.MEDIA_URL, view=serve_media, document_root=settings.MEDIA_ROOT)